@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Benchmark job status reads while a batch job writes its results
+Runs the same workload against a rollback-journal and a WAL database; no Google API calls
+
+The writer records user results through CachedUserStatusBuffer like a job in
+a `python -m worker` process. Reader processes poll job status like the API
+does, and a scan process repeatedly reads every cached user of the job like
+a failed-users listing. In rollback-journal mode each commit waits for open
+reads to finish and blocks new ones; in WAL mode neither side waits.
+
+Usage: python benchmark_db_concurrency.py [--users 3000] [--readers 2] [--flush-every 10] [--api-latency-ms 0.5]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+# Point the session at a scratch database before it is imported
+scratch_dir = tempfile.mkdtemp(prefix='dea-bench-')
+os.environ['DATABASE_PATH'] = os.path.join(scratch_dir, 'bench.db')
+
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from database.session import create_sqlite_engine
+from database.models import Base, BatchJob, CachedUser
+from services.user_cache_service import UserCacheService, CachedUserStatusBuffer
+
+JOB_UUID = 'bench-job'
+
+
+def open_database(path, journal_mode):
+    engine = create_sqlite_engine(path, journal_mode=journal_mode)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def seed(path, journal_mode, total_users):
+    engine, session_factory = open_database(path, journal_mode)
+    Base.metadata.create_all(bind=engine)
+    db = session_factory()
+    try:
+        db.add(BatchJob(job_uuid=JOB_UUID, job_type='attribute_injection', status='running', total_users=total_users))
+        db.execute(insert(CachedUser), [
+            {'job_uuid': JOB_UUID, 'email': f'user{i}@example.com', 'ou_path': '/Bench', 'user_data': '{}', 'status': 'pending'}
+            for i in range(total_users)
+        ])
+        db.commit()
+        UserCacheService(db, None).rebuild_status_counts([JOB_UUID])
+        return [row.id for row in db.query(CachedUser.id).order_by(CachedUser.id)]
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def run_reader(path, journal_mode, scan, stop, results):
+    """Poll job status, or scan all cached users of the job, until the writer finishes"""
+    engine, session_factory = open_database(path, journal_mode)
+    latencies = []
+    errors = 0
+    while not stop.is_set():
+        db = session_factory()
+        start = time.perf_counter()
+        try:
+            if scan:
+                db.query(CachedUser.email, CachedUser.status, CachedUser.error_message).filter(
+                    CachedUser.job_uuid == JOB_UUID
+                ).all()
+            else:
+                db.query(BatchJob).filter(BatchJob.job_uuid == JOB_UUID).first()
+                UserCacheService(db, None).get_user_count(JOB_UUID)
+            latencies.append(time.perf_counter() - start)
+        except OperationalError:
+            errors += 1
+        finally:
+            db.close()
+    engine.dispose()
+    results.put((scan, latencies, errors))
+
+
+def run_writer(path, journal_mode, user_ids, flush_every, api_latency):
+    """Record every user as processed after a simulated API call, flushing every flush_every results"""
+    engine, session_factory = open_database(path, journal_mode)
+    db = session_factory()
+    start = time.perf_counter()
+    error = None
+    try:
+        status_buffer = CachedUserStatusBuffer(db, JOB_UUID, flush_interval=3600, max_pending=flush_every)
+        for offset in range(0, len(user_ids), flush_every):
+            batch = user_ids[offset:offset + flush_every]
+            status_buffer.mark_processing(batch)
+            for user_id in batch:
+                time.sleep(api_latency)
+                status_buffer.record(user_id, 'success')
+        status_buffer.flush()
+    except OperationalError as e:
+        error = str(e.orig)
+    finally:
+        db.close()
+        engine.dispose()
+    return time.perf_counter() - start, error
+
+
+def run_mode(journal_mode, args):
+    path = os.path.join(scratch_dir, f'{journal_mode.lower()}.db')
+    user_ids = seed(path, journal_mode, args.users)
+
+    stop = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    readers = [
+        multiprocessing.Process(target=run_reader, args=(path, journal_mode, scan, stop, results))
+        for scan in [False] * args.readers + [True] * args.scanners
+    ]
+    for reader in readers:
+        reader.start()
+    time.sleep(1)  # Let the readers connect before the clock starts
+
+    seconds, error = run_writer(path, journal_mode, user_ids, args.flush_every, args.api_latency_ms / 1000)
+    stop.set()
+    collected = [results.get() for _ in readers]
+    for reader in readers:
+        reader.join()
+
+    latencies = sorted(latency for scan, values, _ in collected if not scan for latency in values)
+    errors = sum(count for _, _, count in collected)
+    p50 = latencies[len(latencies) // 2] if latencies else 0
+    p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0
+    print(f"{journal_mode:<8} writer {args.users / seconds:>7,.0f} results/sec ({seconds:6.2f}s)"
+          f"{'  FAILED: ' + error if error else ''}")
+    print(f"{'':<8} status {len(latencies) / seconds:>7,.0f} reads/sec  p50 {p50 * 1000:6.2f}ms  "
+          f"p99 {p99 * 1000:7.2f}ms  max {latencies[-1] * 1000 if latencies else 0:7.2f}ms  locked errors {errors}")
+    return p99, error is None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark status reads during job writes")
+    parser.add_argument('--users', type=int, default=3000)
+    parser.add_argument('--readers', type=int, default=2)
+    parser.add_argument('--scanners', type=int, default=1)
+    parser.add_argument('--flush-every', type=int, default=10)
+    parser.add_argument('--api-latency-ms', type=float, default=0.5)
+    args = parser.parse_args()
+
+    print(f"Scratch directory: {scratch_dir}")
+    print(f"{args.users} user results ({args.api_latency_ms}ms simulated API call each), committed every "
+          f"{args.flush_every}; {args.readers} status reader and {args.scanners} scan processes")
+
+    before, _ = run_mode('DELETE', args)
+    after, writer_ok = run_mode('WAL', args)
+
+    if not writer_ok:
+        sys.exit(1)
+    if after:
+        print(f"Status read p99 during writes: {before / after:.1f}x lower with WAL")
+
+
+if __name__ == "__main__":
+    main()
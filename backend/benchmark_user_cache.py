@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark CachedUser population: per-object ORM adds vs the bulk insert path
+Runs against a throwaway SQLite database with synthetic users; no Google API calls
+
+Usage: python benchmark_user_cache.py [--users 100000] [--ous 4]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+# Point the session at a scratch database before it is imported
+os.environ['DATABASE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='dea-bench-'), 'bench.db')
+
+from database.session import SessionLocal, init_db
+from database.models import BatchJob, CachedUser
+from services.user_cache_service import UserCacheService
+
+
+class FakeGoogleService:
+    """Serves synthetic OU listings in place of GoogleWorkspaceService"""
+
+    def __init__(self, users_by_ou):
+        self.users_by_ou = users_by_ou
+
+    def is_authenticated(self):
+        return True
+
+    def list_users_in_ou(self, ou_path, user_fields=None):
+        return self.users_by_ou[ou_path]
+
+
+def make_users(total_users, ou_count):
+    users_by_ou = {f'/Bench/OU{i}': [] for i in range(ou_count)}
+    ou_paths = list(users_by_ou)
+    for i in range(total_users):
+        ou_path = ou_paths[i % ou_count]
+        users_by_ou[ou_path].append({
+            'id': str(100000000 + i),
+            'primaryEmail': f'user{i}@example.com',
+            'name': {'fullName': f'User {i}'},
+            'orgUnitPath': ou_path
+        })
+    return users_by_ou
+
+
+def create_job(db, job_uuid):
+    db.add(BatchJob(job_uuid=job_uuid, job_type='attribute_injection', status='pending'))
+    db.commit()
+
+
+def orm_path(db, job_uuid, users_by_ou):
+    """The previous implementation: one CachedUser object per user, committed per OU"""
+    seen = set()
+    for ou_path, users in users_by_ou.items():
+        for user in users:
+            email = user.get('primaryEmail')
+            if email in seen:
+                continue
+            seen.add(email)
+            db.add(CachedUser(
+                job_uuid=job_uuid,
+                email=email,
+                ou_path=user.get('orgUnitPath', ou_path),
+                user_data=json.dumps(user),
+                status='pending'
+            ))
+        db.commit()
+
+
+def timed(label, total_users, run):
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    rate = total_users / elapsed if elapsed > 0 else 0
+    print(f"{label:<12} {total_users:>8} rows in {elapsed:7.2f}s  {rate:>10,.0f} rows/sec")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CachedUser population")
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--ous', type=int, default=4)
+    args = parser.parse_args()
+
+    init_db()
+    users_by_ou = make_users(args.users, args.ous)
+    ou_paths = list(users_by_ou)
+    print(f"Database: {os.environ['DATABASE_PATH']}")
+
+    db = SessionLocal()
+    try:
+        create_job(db, 'bench-orm')
+        before = timed('ORM adds', args.users, lambda: orm_path(db, 'bench-orm', users_by_ou))
+
+        create_job(db, 'bench-bulk')
+        service = UserCacheService(db, FakeGoogleService(users_by_ou))
+        os.environ['USER_INDEX_MIN_OUS'] = str(args.ous + 1)  # Per-OU listing path
+        after = timed('Bulk insert', args.users, lambda: service.fetch_and_cache_users('bench-bulk', ou_paths))
+
+        cached = db.query(CachedUser).filter(CachedUser.job_uuid == 'bench-bulk').count()
+        if cached != args.users:
+            print(f"Bulk path cached {cached} rows, expected {args.users}")
+            sys.exit(1)
+
+        print(f"Speedup: {after / before:.1f}x")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""PostgreSQL bulk loading with COPY"""
+from typing import Dict, Iterable, List
+
+from sqlalchemy import Table, text
+from sqlalchemy.orm import Session
+
+
+def copy_insert_ignoring_conflicts(db: Session, table: Table, rows: List[Dict], conflict_columns: List[str]) -> int:
+    """
+    Load rows with COPY into a staging table, then insert them skipping duplicates
+
+    COPY has no ON CONFLICT clause, so rows are streamed into a temporary
+    table first (dropped at commit) and moved with one INSERT ... SELECT ...
+    ON CONFLICT DO NOTHING. Runs in the session's transaction. COPY skips
+    the ORM, so the table's Python-side column defaults are filled in here
+    for columns the rows leave out, as an ORM or Core insert would.
+
+    Args:
+        db: Session bound to a PostgreSQL database (psycopg 3 driver)
+        table: Target table
+        rows: Row dicts, all with the same keys
+        conflict_columns: Columns of the unique index duplicates are detected on
+
+    Returns:
+        Number of rows actually inserted
+    """
+    if not rows:
+        return 0
+
+    connection = db.connection()
+    quote = connection.dialect.identifier_preparer.quote
+    defaults = _python_defaults(table, rows[0].keys())
+    columns = list(rows[0].keys()) + list(defaults)
+    column_list = ', '.join(quote(column) for column in columns)
+    target = quote(table.name)
+    staging = quote(f"_copy_{table.name}")
+
+    connection.execute(text(f"DROP TABLE IF EXISTS {staging}"))
+    connection.execute(text(
+        f"CREATE TEMPORARY TABLE {staging} ON COMMIT DROP AS SELECT {column_list} FROM {target} WITH NO DATA"
+    ))
+
+    cursor = connection.connection.driver_connection.cursor()
+    try:
+        with cursor.copy(f"COPY {staging} ({column_list}) FROM STDIN") as copy:
+            for row in rows:
+                copy.write_row(tuple({**defaults, **row}[column] for column in columns))
+    finally:
+        cursor.close()
+
+    result = connection.execute(text(
+        f"INSERT INTO {target} ({column_list}) SELECT {column_list} FROM {staging} "
+        f"ON CONFLICT ({', '.join(quote(column) for column in conflict_columns)}) DO NOTHING"
+    ))
+    return result.rowcount
+
+
+def _python_defaults(table: Table, present: Iterable[str]) -> Dict:
+    """Values of the Python-side scalar and callable defaults of the columns not in present"""
+    defaults = {}
+    for column in table.columns:
+        default = column.default
+        if column.name in present or default is None:
+            continue
+        if default.is_scalar:
+            defaults[column.name] = default.arg
+        elif default.is_callable:
+            defaults[column.name] = default.arg(None)  # Wrapped by SQLAlchemy to take an execution context
+    return defaults
@@ -1,6 +1,6 @@
 """SQLAlchemy models for DEA Toolbox"""
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Float, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -60,6 +60,25 @@ class CachedUser(Base):
     error_message = Column(Text, nullable=True)
     processed_at = Column(DateTime, nullable=True)
 
+    __table_args__ = (
+        # One row per user per job; bulk loads skip duplicates against this index
+        Index('ix_cached_users_job_email', 'job_uuid', 'email', unique=True),
+    )
+
+
+class JobStatusCount(Base):
+    """Number of a job's cached users in each status, maintained with every status write"""
+    __tablename__ = 'job_status_counts'
+
+    id = Column(Integer, primary_key=True)
+    job_uuid = Column(String(36), ForeignKey('batch_jobs.job_uuid'), nullable=False, index=True)
+    status = Column(String(20), nullable=False)  # 'pending', 'processing', 'success', 'failed'
+    count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index('ix_job_status_counts_job_status', 'job_uuid', 'status', unique=True),
+    )
+
 
 class BatchOperation(Base):
     """Tracks individual batch executions within a job"""
@@ -116,3 +135,78 @@ class GroupSyncOperation(Base):
     error_message = Column(Text, nullable=True)
     started_at = Column(DateTime, nullable=True)
     completed_at = Column(DateTime, nullable=True)
+
+
+class AliasExtractionCheckpoint(Base):
+    """Resume point of an alias extraction job, saved every few pages"""
+    __tablename__ = 'alias_extraction_checkpoints'
+
+    id = Column(Integer, primary_key=True)
+    job_uuid = Column(String(36), ForeignKey('batch_jobs.job_uuid'), unique=True, nullable=False, index=True)
+    page_token = Column(Text, nullable=False)  # users().list nextPageToken of the first page not yet written
+    output_offset = Column(Integer, nullable=False)  # Size of the partial output at the checkpoint
+    layout = Column(String(10), nullable=False)  # 'wide' or 'long'
+    total_users = Column(Integer, default=0)
+    users_with_aliases = Column(Integer, default=0)
+    max_aliases = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class DirectoryUser(Base):
+    """Local mirror of a Google Workspace user, refreshed incrementally by etag"""
+    __tablename__ = 'directory_users'
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String(64), unique=True, nullable=False, index=True)  # Directory API immutable user ID
+    email = Column(String(255), nullable=False, index=True)
+    org_unit_path = Column(String(500), nullable=False, index=True)
+    etag = Column(String(255), nullable=True)  # Resource etag; changes whenever the user changes
+    aliases = Column(Text, nullable=True)  # JSON array of alias emails
+    user_data = Column(Text, nullable=True)  # JSON with the user resource
+    synced_at = Column(DateTime, default=datetime.utcnow)
+
+
+class DirectoryMirrorState(Base):
+    """Bookkeeping for the directory mirror (single row)"""
+    __tablename__ = 'directory_mirror_state'
+
+    id = Column(Integer, primary_key=True)
+    total_users = Column(Integer, default=0)
+    last_full_sync_at = Column(DateTime, nullable=True)
+    last_refresh_at = Column(DateTime, nullable=True)  # Last full sync or etag delta refresh
+    last_refresh_stats = Column(Text, nullable=True)  # JSON with added, updated, removed, unchanged
+    watch_channel_id = Column(String(64), nullable=True)  # users().watch push channel
+    watch_resource_id = Column(String(255), nullable=True)
+    watch_token = Column(String(64), nullable=True)  # Shared secret echoed in X-Goog-Channel-Token
+    watch_expiration = Column(DateTime, nullable=True)
+    notifications_applied = Column(Integer, default=0)
+
+
+class QueuedTask(Base):
+    """Durable background task, leased by one worker at a time"""
+    __tablename__ = 'job_queue'
+
+    id = Column(Integer, primary_key=True)
+    task_type = Column(String(50), nullable=False)  # 'batch_job', 'alias_extraction', 'group_sync', 'sync_all_run', 'directory_mirror_refresh'
+    task_key = Column(String(64), nullable=True, index=True)  # job_uuid or run_id the task works on
+    payload = Column(Text, nullable=True)  # JSON keyword arguments for the task handler
+    status = Column(String(20), nullable=False, index=True)  # 'queued', 'leased', 'completed', 'failed'
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    lease_owner = Column(String(255), nullable=True)  # Worker ID holding the lease
+    lease_expires_at = Column(DateTime, nullable=True, index=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    result = Column(Text, nullable=True)  # JSON returned by the handler
+    error_message = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+
+
+class OUCacheInvalidation(Base):
+    """OU membership cache invalidation, replayed by the cache of every API and worker process"""
+    __tablename__ = 'ou_cache_invalidations'
+
+    id = Column(Integer, primary_key=True)
+    ou_path = Column(String(500), nullable=True)  # None clears the whole cache
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
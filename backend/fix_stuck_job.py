@@ -2,10 +2,14 @@
 """
 Fix stuck jobs that are in 'running' state but not actually processing
 This can happen if the backend is killed while a job is running
+
+Jobs run through the job queue are reset automatically once their worker's
+lease expires; this script is only needed for jobs started before that.
 """
 import sys
 from database.session import SessionLocal
 from database.models import BatchJob, CachedUser
+from services.user_cache_service import UserCacheService
 from sqlalchemy import func
 
 def fix_stuck_jobs():
@@ -43,16 +47,10 @@ def fix_stuck_jobs():
 
             print(f"  User statuses: {dict(user_counts)}")
 
-            # Reset any users in 'processing' state back to 'pending'
-            processing_users = db.query(CachedUser).filter(
-                CachedUser.job_uuid == job.job_uuid,
-                CachedUser.status == 'processing'
-            ).all()
-
-            if processing_users:
-                print(f"  Resetting {len(processing_users)} users from 'processing' to 'pending'")
-                for user in processing_users:
-                    user.status = 'pending'
+            # Reset any users in 'processing' state back to 'pending' (keeps status counters in step)
+            reset_count = UserCacheService(db, None).reset_processing_users([job.job_uuid])
+            if reset_count:
+                print(f"  Resetting {reset_count} users from 'processing' to 'pending'")
 
             # Reset job to pending
             job.status = 'pending'
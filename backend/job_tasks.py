@@ -0,0 +1,337 @@
+"""
+Background job handlers
+Run by JobWorker, in the API process or in separate `python -m worker` processes
+"""
+import os
+import time
+import threading
+from datetime import datetime
+from typing import List, Optional
+
+from services.batch_processor import BatchProcessor
+from services.group_sync_processor import GroupSyncProcessor
+from services.sync_scheduler import SyncAllScheduler
+from services.service_manager import ServiceManager
+from services.directory_mirror import DirectoryMirror
+from services.sharded_alias_scan import ShardedAliasExtractor
+from services.progress_events import publish_job_progress
+from services.lease import LeaseLost, check_lease
+
+
+def process_batch_job(job_uuid: str, cancel_event: Optional[threading.Event] = None):
+    """Background task to process a batch job"""
+    from database.session import SessionLocal
+    import traceback
+
+    print(f"[process_batch_job] Starting background task for job {job_uuid}")
+    db = SessionLocal()
+    try:
+        # Use ServiceManager to get service (auto-recovers if None)
+        print(f"[process_batch_job] Getting service from ServiceManager...")
+        google_service = ServiceManager.get_service()
+
+        if google_service and google_service.is_authenticated():
+            print(f"[process_batch_job] Google service available and authenticated, creating batch processor")
+            processor = BatchProcessor(db, google_service, cancel_event=cancel_event)
+            print(f"[process_batch_job] Calling process_job...")
+            result = processor.process_job(job_uuid)
+            print(f"[process_batch_job] process_job completed successfully")
+            return result
+        else:
+            print(f"[process_batch_job] ERROR: Service not authenticated!")
+            _fail_job(db, job_uuid, "Google service not available or not authenticated")
+            raise Exception("Google service not available or not authenticated")
+    except LeaseLost:
+        print(f"[process_batch_job] Lease lost, stopped job {job_uuid}")
+        raise
+    except Exception as e:
+        # BatchProcessor has marked the job failed; re-raise so the queue fails the task too
+        print(f"[process_batch_job] ❌ EXCEPTION in background task for job {job_uuid}: {str(e)}")
+        traceback.print_exc()
+        raise
+    finally:
+        print(f"[process_batch_job] Closing database session for job {job_uuid}")
+        db.close()
+
+
+def process_alias_extraction_job(job_uuid: str, cancel_event: Optional[threading.Event] = None):
+    """Background task to process an alias extraction job, resuming from its last checkpoint if it has one"""
+    from database.session import SessionLocal
+    from database.models import BatchJob, AliasExtractionCheckpoint
+    import traceback
+
+    print(f"[process_alias_extraction_job] Starting alias extraction for job {job_uuid}")
+    db = SessionLocal()
+
+    try:
+        # Get the job
+        job = db.query(BatchJob).filter(BatchJob.job_uuid == job_uuid).first()
+        if not job:
+            print(f"[process_alias_extraction_job] ERROR: Job {job_uuid} not found")
+            raise Exception(f"Job {job_uuid} not found")
+
+        # Update job status to running
+        job.status = 'running'
+        job.started_at = datetime.now()
+        db.commit()
+        publish_job_progress(job)
+
+        # Get Google service
+        print(f"[process_alias_extraction_job] Getting service from ServiceManager...")
+        google_service = ServiceManager.get_service()
+
+        if not google_service or not google_service.is_authenticated():
+            print(f"[process_alias_extraction_job] ERROR: Service not authenticated!")
+            raise Exception("Google service not available or not authenticated")
+
+        # Progress callback: streamed on every call, committed per interval (and with each checkpoint)
+        commit_interval = float(os.getenv("STATUS_FLUSH_INTERVAL_SECONDS", 5))
+        last_commit = time.monotonic()
+
+        def progress_callback(total, processed, users_with_aliases):
+            nonlocal last_commit
+            check_lease(cancel_event)
+            print(f"[process_alias_extraction_job] Progress: {processed}/{total} users processed, {users_with_aliases} with aliases")
+            job.total_users = total
+            job.processed_users = processed
+            job.successful_users = users_with_aliases
+            job.progress_percentage = (processed / total * 100) if total > 0 else 0
+            publish_job_progress(job)
+            if time.monotonic() - last_commit >= commit_interval:
+                db.commit()
+                last_commit = time.monotonic()
+
+        # Read users from the directory mirror (refreshing only changed users) when enabled
+        user_pages = None
+        if DirectoryMirror.is_enabled():
+            mirror = DirectoryMirror(db, google_service, cancel_event=cancel_event)
+            mirror.ensure_fresh()
+            user_pages = mirror.iter_user_pages()
+
+        # Run the extraction
+        if user_pages is None and os.getenv("ALIAS_SCAN_MODE", "sequential") == "sharded":
+            print(f"[process_alias_extraction_job] Starting sharded extraction to {job.file_path}")
+            result = ShardedAliasExtractor(google_service).extract(
+                file_path=job.file_path,
+                progress_callback=progress_callback
+            )
+            for prefix, shard in result['shards'].items():
+                print(f"[process_alias_extraction_job] Shard '{prefix}': {shard['owned_users']} users, "
+                      f"{shard['users_with_aliases']} with aliases ({shard['scanned']} scanned)")
+        else:
+            checkpoint = db.query(AliasExtractionCheckpoint).filter(
+                AliasExtractionCheckpoint.job_uuid == job_uuid
+            ).first()
+
+            def checkpoint_callback(state):
+                nonlocal checkpoint
+                check_lease(cancel_event)
+                if checkpoint is None:
+                    checkpoint = AliasExtractionCheckpoint(job_uuid=job_uuid)
+                    db.add(checkpoint)
+                for key, value in state.items():
+                    setattr(checkpoint, key, value)
+                db.commit()
+
+            resume = None
+            if checkpoint is not None and user_pages is None:
+                resume = {
+                    'page_token': checkpoint.page_token,
+                    'output_offset': checkpoint.output_offset,
+                    'layout': checkpoint.layout,
+                    'total_users': checkpoint.total_users,
+                    'users_with_aliases': checkpoint.users_with_aliases,
+                    'max_aliases': checkpoint.max_aliases
+                }
+                print(f"[process_alias_extraction_job] Resuming from checkpoint after {checkpoint.total_users} users")
+
+            print(f"[process_alias_extraction_job] Starting streaming extraction to {job.file_path}")
+            result = google_service.extract_aliases_streaming(
+                file_path=job.file_path,
+                progress_callback=progress_callback,
+                user_pages=user_pages,
+                resume=resume,
+                checkpoint_callback=checkpoint_callback
+            )
+
+            if checkpoint is not None:
+                db.delete(checkpoint)
+
+        # Update job with final results
+        job.status = 'completed'
+        job.total_users = result['total_users']
+        job.processed_users = result['total_users']
+        job.successful_users = result['users_with_aliases']
+        job.progress_percentage = 100.0
+        job.completed_at = datetime.now()
+        db.commit()
+        publish_job_progress(job)
+
+        print(f"[process_alias_extraction_job] Completed successfully: {result['users_with_aliases']} users with aliases")
+        return result
+
+    except LeaseLost:
+        # The job was reset for another worker; leave its status and checkpoint to that worker
+        print(f"[process_alias_extraction_job] Lease lost, stopped job {job_uuid}")
+        raise
+
+    except Exception as e:
+        print(f"[process_alias_extraction_job] ❌ EXCEPTION: {str(e)}")
+        traceback.print_exc()
+
+        # Mark job as failed, then let the queue fail the task
+        db.rollback()
+        _fail_job(db, job_uuid, str(e))
+        raise
+    finally:
+        print(f"[process_alias_extraction_job] Closing database session for job {job_uuid}")
+        db.close()
+
+
+def process_group_sync_job(job_uuid: str, cancel_event: Optional[threading.Event] = None):
+    """Background task to process a group sync job"""
+    from database.session import SessionLocal
+    import traceback
+
+    print(f"[process_group_sync_job] Starting group sync for job {job_uuid}")
+    db = SessionLocal()
+
+    try:
+        # Get Google service
+        print(f"[process_group_sync_job] Getting service from ServiceManager...")
+        google_service = ServiceManager.get_service()
+
+        if not google_service or not google_service.is_authenticated():
+            print(f"[process_group_sync_job] ERROR: Service not authenticated!")
+            raise Exception("Google service not available or not authenticated")
+
+        # Create processor and run the job
+        processor = GroupSyncProcessor(db, google_service, cancel_event=cancel_event)
+        result = processor.process_job(job_uuid)
+
+        print(f"[process_group_sync_job] Completed successfully")
+        return result
+
+    except LeaseLost:
+        print(f"[process_group_sync_job] Lease lost, stopped job {job_uuid}")
+        raise
+
+    except Exception as e:
+        print(f"[process_group_sync_job] ❌ EXCEPTION: {str(e)}")
+        traceback.print_exc()
+
+        # Mark job as failed (unless the processor already did), then let the queue fail the task
+        db.rollback()
+        _fail_job(db, job_uuid, str(e))
+        raise
+    finally:
+        print(f"[process_group_sync_job] Closing database session for job {job_uuid}")
+        db.close()
+
+
+def process_sync_all_run(run_id: str, job_uuids: Optional[List[str]] = None,
+                         cancel_event: Optional[threading.Event] = None):
+    """Background task to process all jobs of a sync-all run concurrently"""
+    from database.session import SessionLocal
+    from database.models import BatchJob
+    import traceback
+
+    print(f"[process_sync_all_run] Starting sync-all run {run_id}")
+
+    try:
+        google_service = ServiceManager.get_service()
+
+        if not google_service or not google_service.is_authenticated():
+            raise Exception("Google service not available or not authenticated")
+
+        # Runs queued before they were stored as jobs only exist in the task payload
+        db = SessionLocal()
+        try:
+            if SyncAllScheduler.get_run(db, run_id) is None:
+                SyncAllScheduler.new_run(db, job_uuids or [], run_id=run_id)
+        finally:
+            db.close()
+
+        return SyncAllScheduler(google_service, cancel_event=cancel_event).run(run_id)
+
+    except LeaseLost:
+        print(f"[process_sync_all_run] Lease lost, stopped run {run_id}")
+        raise
+
+    except Exception as e:
+        print(f"[process_sync_all_run] ❌ EXCEPTION: {str(e)}")
+        traceback.print_exc()
+
+        # Mark the run and its jobs that never started as failed so they don't stay pending forever
+        db = SessionLocal()
+        try:
+            run = SyncAllScheduler.get_run(db, run_id) or {}
+            jobs = db.query(BatchJob).filter(
+                BatchJob.job_uuid.in_(run.get('job_uuids', [])),
+                BatchJob.status == 'pending'
+            ).all()
+            jobs += db.query(BatchJob).filter(
+                BatchJob.job_uuid == run_id,
+                BatchJob.status.in_(['pending', 'running'])
+            ).all()
+            for job in jobs:
+                job.status = 'failed'
+                job.error_message = str(e)
+                job.completed_at = datetime.now()
+            db.commit()
+            for job in jobs:
+                publish_job_progress(job)
+        except Exception as mark_error:
+            print(f"[process_sync_all_run] Could not mark pending jobs failed: {str(mark_error)}")
+        finally:
+            db.close()
+        raise
+
+
+def refresh_directory_mirror(full: bool = False, cancel_event: Optional[threading.Event] = None):
+    """Background task to refresh the directory mirror"""
+    from database.session import SessionLocal
+    import traceback
+
+    db = SessionLocal()
+    try:
+        mirror = DirectoryMirror(db, ServiceManager.get_service(), cancel_event=cancel_event)
+        stats = mirror.full_sync() if full else mirror.refresh()
+        print(f"[refresh_directory_mirror] Completed: {stats}")
+        return stats
+    except LeaseLost:
+        print(f"[refresh_directory_mirror] Lease lost, stopped refresh")
+        raise
+    except Exception as e:
+        print(f"[refresh_directory_mirror] ❌ EXCEPTION: {str(e)}")
+        traceback.print_exc()
+        raise
+    finally:
+        db.close()
+
+
+def _fail_job(db, job_uuid: str, error: str) -> None:
+    """Mark a job failed unless it already finished, and publish it to progress streams"""
+    from database.models import BatchJob
+
+    try:
+        job = db.query(BatchJob).filter(BatchJob.job_uuid == job_uuid).first()
+        if job and job.status in ('pending', 'running'):
+            job.status = 'failed'
+            job.error_message = error
+            job.completed_at = datetime.now()
+            db.commit()
+            publish_job_progress(job)
+    except Exception as e:
+        # The task error is what gets reported; don't mask it with this one
+        print(f"[job_tasks] Could not mark job {job_uuid} failed: {str(e)}")
+
+
+# Task type -> handler, as enqueued by the API
+TASK_HANDLERS = {
+    'batch_job': process_batch_job,
+    'alias_extraction': process_alias_extraction_job,
+    'group_sync': process_group_sync_job,
+    'sync_all_run': process_sync_all_run,
+    'directory_mirror_refresh': refresh_directory_mirror
+}
@@ -1,6 +1,7 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, BackgroundTasks
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, Response
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import Optional, List
@@ -9,17 +10,44 @@ import os
 from dotenv import load_dotenv
 import json
 import uuid
+import time
 from datetime import datetime
 
+# Measured against STARTUP_TIME_BUDGET_SECONDS: process start -> first request served
+_process_started = time.monotonic()
+
 from services.google_workspace import GoogleWorkspaceService
 from services.credential_service import CredentialService
 from services.batch_processor import BatchProcessor
+from services.user_cache_service import UserCacheService
 from services.group_sync_processor import GroupSyncProcessor
+from services.sync_scheduler import SyncAllScheduler
 from services.service_manager import ServiceManager
-from database.session import init_db, get_db
+from services.rate_limiter import get_rate_controller
+from services.ou_cache import get_ou_cache
+from services.http_pool import get_http_pool
+from services.discovery import load_discovery_document, get_discovery_stats
+from services.directory_mirror import DirectoryMirror
+from services.async_directory import close_http_client, get_async_client
+from services.job_queue import JobQueue, JobWorker, enqueue_task
+from services.progress_events import stream_job_progress
+from job_tasks import TASK_HANDLERS
+from database.session import init_db, get_db, get_database_info
 
 load_dotenv()
 
+startup_timings = {
+    'budget_seconds': float(os.getenv("STARTUP_TIME_BUDGET_SECONDS", 5)),
+    'database_init_seconds': None,
+    'discovery_load_seconds': None,
+    'credential_restore_seconds': None,
+    'startup_seconds': None,
+    'first_request_served_seconds': None,
+    'within_budget': None
+}
+
+job_worker: Optional[JobWorker] = None
+
 app = FastAPI(
     title="DEA Toolbox API",
     description="Tools for AD administrators to manage SAML and SSO integrations",
@@ -30,12 +58,24 @@ app = FastAPI(
 @app.on_event("startup")
 async def startup_event():
     """Initialize database tables and restore credentials from database"""
-    global google_service
+    global google_service, job_worker
 
+    phase_start = time.monotonic()
     init_db()
+    _backfill_status_counts()
+    startup_timings['database_init_seconds'] = round(time.monotonic() - phase_start, 3)
     print("✓ Database initialized")
 
+    # Load the Directory API discovery document before any service is built
+    phase_start = time.monotonic()
+    try:
+        load_discovery_document()
+    except Exception as e:
+        print(f"⚠️  Could not load discovery document: {str(e)}")
+    startup_timings['discovery_load_seconds'] = round(time.monotonic() - phase_start, 3)
+
     # Try to restore credentials from database
+    phase_start = time.monotonic()
     try:
         from database.session import SessionLocal
         db = SessionLocal()
@@ -87,6 +127,54 @@ async def startup_event():
     except Exception as e:
         print(f"⚠️  Could not restore credentials: {str(e)}")
 
+    startup_timings['credential_restore_seconds'] = round(time.monotonic() - phase_start, 3)
+
+    # Run queued jobs in this process too, unless dedicated `python -m worker` processes do
+    if os.getenv("EMBEDDED_JOB_WORKER", "true").lower() in ("1", "true", "yes"):
+        job_worker = JobWorker(TASK_HANDLERS)
+        job_worker.start_in_thread()
+        print("✓ Embedded job worker started")
+    startup_timings['startup_seconds'] = round(time.monotonic() - _process_started, 3)
+    print(f"✓ Startup completed in {startup_timings['startup_seconds']:.2f}s")
+
+
+@app.middleware("http")
+async def record_first_request(request: Request, call_next):
+    """Record when the first request is served and check it against the startup budget"""
+    response = await call_next(request)
+
+    if startup_timings['first_request_served_seconds'] is None:
+        elapsed = round(time.monotonic() - _process_started, 3)
+        startup_timings['first_request_served_seconds'] = elapsed
+        startup_timings['within_budget'] = elapsed <= startup_timings['budget_seconds']
+        if not startup_timings['within_budget']:
+            print(f"⚠️  First request served {elapsed:.2f}s after start, over the "
+                  f"{startup_timings['budget_seconds']:.1f}s startup budget")
+
+    return response
+
+def _backfill_status_counts():
+    """Build job_status_counts for jobs cached before the counters existed"""
+    from database.session import SessionLocal
+    db = SessionLocal()
+    try:
+        backfilled = UserCacheService(db, None).backfill_status_counts()
+        if backfilled:
+            print(f"✓ Status counters built for {backfilled} existing jobs")
+    except Exception as e:
+        print(f"⚠️  Could not backfill job status counters: {str(e)}")
+    finally:
+        db.close()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the embedded job worker and close pooled connections of the async Directory client"""
+    if job_worker is not None:
+        job_worker.stop()
+
+    await close_http_client()
+
 # CORS Configuration
 origins = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://localhost:5173").split(",")
 
@@ -101,6 +189,13 @@ app.add_middleware(
 # Global service instance
 google_service: Optional[GoogleWorkspaceService] = None
 
+# Progress streams must reach the client unbuffered (X-Accel-Buffering disables nginx buffering)
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+# Queue task type that reruns each restartable job type; group syncs and sync-all runs are stored
+# as BatchJobs too but have their own handlers and payloads
+RESTART_TASK_TYPES = {'attribute_injection': 'batch_job', 'alias_extraction': 'alias_extraction'}
+
 
 class StatusResponse(BaseModel):
     authenticated: bool
@@ -136,12 +231,140 @@ async def database_health(db: Session = Depends(get_db)):
         return {
             "status": "healthy",
             "database": "connected",
-            "type": "sqlite"
+            **get_database_info()
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
+@app.get("/api/metrics/rate-limiter")
+async def rate_limiter_metrics():
+    """Get the adaptive API rate controller state shared by all processors"""
+    return get_rate_controller().get_stats()
+
+
+@app.get("/api/metrics/ou-cache")
+async def ou_cache_metrics():
+    """Get hit/miss counters of the shared OU membership cache"""
+    return get_ou_cache().get_stats()
+
+
+@app.get("/api/metrics/startup")
+async def startup_metrics():
+    """Get startup phase timings, the startup budget and the discovery document source"""
+    return {
+        **startup_timings,
+        'discovery': get_discovery_stats()
+    }
+
+
+@app.get("/api/metrics/job-queue")
+async def job_queue_metrics(db: Session = Depends(get_db)):
+    """Get queued task counts and the leases held by job workers"""
+    return JobQueue(db).get_stats()
+
+
+@app.get("/api/metrics/http-pool")
+async def http_pool_metrics():
+    """Get connection reuse counters of the shared Directory API transport pool"""
+    return get_http_pool().get_stats()
+
+
+@app.post("/api/cache/ou-memberships/invalidate")
+async def invalidate_ou_cache(request: dict = None):
+    """Invalidate cached OU listings (one OU and its related paths, or everything)"""
+    ou_path = (request or {}).get("ou_path")
+    removed = get_ou_cache().invalidate(ou_path)
+    return {
+        "success": True,
+        "ou_path": ou_path,
+        "entries_removed": removed
+    }
+
+
+@app.get("/api/metrics/directory-mirror")
+async def directory_mirror_metrics(db: Session = Depends(get_db)):
+    """Get size, freshness and watch channel state of the directory mirror"""
+    return DirectoryMirror(db, None).get_stats()
+
+
+@app.post("/api/directory/mirror/refresh")
+async def refresh_directory_mirror(request: dict = None):
+    """Refresh the directory mirror in the background (etag delta, or full sync with full=true)"""
+    try:
+        google_service = ServiceManager.get_service()
+
+        if not google_service.is_authenticated():
+            raise HTTPException(status_code=401, detail="Not authenticated")
+
+        full = bool((request or {}).get("full", False))
+        enqueue_task('directory_mirror_refresh', full=full)
+
+        return {
+            "success": True,
+            "message": f"Directory mirror {'full sync' if full else 'refresh'} started"
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/directory/watch")
+async def start_directory_watch(request: dict, db: Session = Depends(get_db)):
+    """Register a users().watch channel pushing changes to the given HTTPS webhook address"""
+    address = request.get("address") or os.getenv("DIRECTORY_WATCH_ADDRESS")
+    if not address:
+        raise HTTPException(status_code=400, detail="address is required (e.g. https://toolbox.example.com/api/directory/notifications)")
+
+    try:
+        google_service = ServiceManager.get_service()
+        channel = DirectoryMirror(db, google_service).start_watch(address)
+        return {"success": True, **channel}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.delete("/api/directory/watch")
+async def stop_directory_watch(db: Session = Depends(get_db)):
+    """Stop the active users().watch channel"""
+    try:
+        google_service = ServiceManager.get_service()
+        stopped = DirectoryMirror(db, google_service).stop_watch()
+        return {"success": True, "stopped": stopped}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/directory/notifications")
+async def directory_notification(request: Request, db: Session = Depends(get_db)):
+    """
+    Webhook receiving users().watch push notifications; applies each change to the mirror
+    The mirror's database and API calls block, so they run in the threadpool
+    """
+    mirror = DirectoryMirror(db, None)
+    channel_id = request.headers.get("X-Goog-Channel-ID")
+    token = request.headers.get("X-Goog-Channel-Token")
+    if not await run_in_threadpool(mirror.verify_channel, channel_id, token):
+        raise HTTPException(status_code=403, detail="Unknown notification channel")
+
+    event = request.headers.get("X-Goog-Resource-State", "")
+    if event == "sync":
+        return {"success": True, "action": "ignored"}
+
+    try:
+        resource = await request.json()
+    except Exception:
+        resource = {}
+
+    try:
+        mirror.google_service = await run_in_threadpool(ServiceManager.get_service)
+        action = await run_in_threadpool(mirror.apply_notification, event, resource)
+        return {"success": True, "action": action}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/api/status", response_model=StatusResponse)
 async def get_status():
     """Check if Google Workspace API is authenticated"""
@@ -468,7 +691,7 @@ async def extract_aliases():
                 detail="Not authenticated. Please authenticate first."
             )
 
-        result = google_service.extract_aliases_to_csv()
+        result = await get_async_client(google_service).extract_aliases_to_csv()
 
         return AliasExtractionResponse(
             success=True,
@@ -504,7 +727,7 @@ async def get_organizational_units():
         if not google_service.is_authenticated():
             raise HTTPException(status_code=401, detail="Not authenticated")
 
-        org_units = google_service.get_organizational_units()
+        org_units = await get_async_client(google_service).get_organizational_units()
         return {"organizational_units": org_units}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -530,7 +753,7 @@ async def inject_attribute(request: dict):
         if value is None or value == "":
             raise HTTPException(status_code=400, detail="Value is required")
 
-        result = google_service.inject_attribute_to_users(ou_paths, attribute, value)
+        result = await get_async_client(google_service).inject_attribute_to_users(ou_paths, attribute, value)
         return {
             "success": True,
             "message": f"Attribute injected successfully",
@@ -543,7 +766,7 @@ async def inject_attribute(request: dict):
 # Batch Processing Endpoints (Async)
 
 @app.post("/api/batch/extract-aliases")
-async def batch_extract_aliases(background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def batch_extract_aliases(db: Session = Depends(get_db)):
     """
     Create a batch job to extract aliases asynchronously
     Returns immediately with job UUID for status tracking
@@ -578,8 +801,8 @@ async def batch_extract_aliases(background_tasks: BackgroundTasks, db: Session =
         db.commit()
         db.refresh(job)
 
-        # Start background processing
-        background_tasks.add_task(_process_alias_extraction_job, job_uuid)
+        # Queue for a job worker
+        JobQueue(db).enqueue('alias_extraction', {'job_uuid': job_uuid}, task_key=job_uuid)
 
         return {
             "success": True,
@@ -592,7 +815,7 @@ async def batch_extract_aliases(background_tasks: BackgroundTasks, db: Session =
 
 
 @app.post("/api/batch/inject-attribute")
-async def batch_inject_attribute(request: dict, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def batch_inject_attribute(request: dict, db: Session = Depends(get_db)):
     """
     Create a batch job to inject attribute asynchronously
     Returns immediately with job UUID for status tracking
@@ -624,11 +847,8 @@ async def batch_inject_attribute(request: dict, background_tasks: BackgroundTask
             value=value
         )
 
-        # Start background processing
-        background_tasks.add_task(
-            _process_batch_job,
-            job_uuid=job.job_uuid
-        )
+        # Queue for a job worker
+        JobQueue(db).enqueue('batch_job', {'job_uuid': job.job_uuid}, task_key=job.job_uuid)
 
         return {
             "success": True,
@@ -657,9 +877,32 @@ async def get_batch_job_status(job_uuid: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail=str(e))
 
 
+@app.get("/api/batch/jobs/{job_uuid}/events")
+async def batch_job_events(job_uuid: str, request: Request):
+    """
+    Stream progress of a batch job as Server-Sent Events
+    Sends the current state, then a "progress" event per update until the job completes or fails
+    """
+    return StreamingResponse(
+        stream_job_progress(job_uuid, request.is_disconnected),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+
+@app.get("/api/batch/events")
+async def batch_events(request: Request):
+    """Stream progress of every pending or running batch job as Server-Sent Events"""
+    return StreamingResponse(
+        stream_job_progress(None, request.is_disconnected),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+
 @app.get("/api/batch/jobs")
-async def list_batch_jobs(limit: int = 50, db: Session = Depends(get_db)):
-    """List all batch jobs ordered by creation date"""
+async def list_batch_jobs(limit: int = 50, before_id: Optional[int] = None, db: Session = Depends(get_db)):
+    """List batch jobs newest first; pass next_before_id back as before_id for the next page"""
     try:
         google_service = ServiceManager.get_service()
 
@@ -667,8 +910,7 @@ async def list_batch_jobs(limit: int = 50, db: Session = Depends(get_db)):
             raise HTTPException(status_code=401, detail="Not authenticated")
 
         processor = BatchProcessor(db, google_service)
-        jobs = processor.get_all_jobs(limit=limit)
-        return {"jobs": jobs}
+        return processor.list_jobs(limit=limit, before_id=before_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -689,11 +931,29 @@ async def get_failed_users(job_uuid: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/batch/status-counts/verify")
+async def verify_status_counts(request: dict = None, db: Session = Depends(get_db)):
+    """
+    Rebuild job status counters from cached_users and report any drift
+    Checks one job when job_uuid is given, otherwise every job
+    """
+    try:
+        job_uuid = (request or {}).get("job_uuid")
+        corrections = UserCacheService(db, None).rebuild_status_counts([job_uuid] if job_uuid else None)
+        return {
+            "consistent": not corrections,
+            "corrections": corrections
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/api/batch/jobs/{job_uuid}/restart")
-async def restart_batch_job(job_uuid: str, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def restart_batch_job(job_uuid: str, db: Session = Depends(get_db)):
     """
     Restart a pending or failed batch job
-    Returns immediately and processes the job in the background
+    Returns immediately and processes the job in the background; alias
+    extraction jobs resume from their last checkpoint
     """
     try:
         google_service = ServiceManager.get_service()
@@ -702,12 +962,19 @@ async def restart_batch_job(job_uuid: str, background_tasks: BackgroundTasks, db
             raise HTTPException(status_code=401, detail="Not authenticated")
 
         # Get the job
-        from database.models import BatchJob, CachedUser
+        from database.models import BatchJob
         job = db.query(BatchJob).filter(BatchJob.job_uuid == job_uuid).first()
 
         if not job:
             raise HTTPException(status_code=404, detail=f"Job {job_uuid} not found")
 
+        task_type = RESTART_TASK_TYPES.get(job.job_type)
+        if task_type is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Cannot restart '{job.job_type}' jobs here. Only attribute injection and alias extraction jobs can be restarted."
+            )
+
         # Only restart pending or failed jobs
         if job.status not in ['pending', 'failed']:
             raise HTTPException(
@@ -716,13 +983,7 @@ async def restart_batch_job(job_uuid: str, background_tasks: BackgroundTasks, db
             )
 
         # Reset any users in 'processing' state back to 'pending'
-        processing_users = db.query(CachedUser).filter(
-            CachedUser.job_uuid == job_uuid,
-            CachedUser.status == 'processing'
-        ).all()
-
-        for user in processing_users:
-            user.status = 'pending'
+        UserCacheService(db, google_service).reset_processing_users([job_uuid])
 
         # Reset job to pending state if it was failed
         if job.status == 'failed':
@@ -732,8 +993,8 @@ async def restart_batch_job(job_uuid: str, background_tasks: BackgroundTasks, db
 
         db.commit()
 
-        # Add the job to background tasks
-        background_tasks.add_task(_process_batch_job, job_uuid)
+        # Queue the job for a worker again
+        JobQueue(db).enqueue(task_type, {'job_uuid': job_uuid}, task_key=job_uuid)
 
         return {
             "message": "Job restart initiated",
@@ -748,7 +1009,7 @@ async def restart_batch_job(job_uuid: str, background_tasks: BackgroundTasks, db
 
 
 @app.post("/api/batch/sync-ou-groups")
-async def sync_ou_groups(request: dict, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def sync_ou_groups(request: dict, db: Session = Depends(get_db)):
     """
     Create a saved configuration and sync job for OU to Group synchronization
     Returns immediately with job UUID and config UUID for status tracking
@@ -791,11 +1052,8 @@ async def sync_ou_groups(request: dict, background_tasks: BackgroundTasks, db: S
         # Create job from config
         job = processor.create_sync_job(config.config_uuid)
 
-        # Start background processing
-        background_tasks.add_task(
-            _process_group_sync_job,
-            job_uuid=job.job_uuid
-        )
+        # Queue for a job worker
+        JobQueue(db).enqueue('group_sync', {'job_uuid': job.job_uuid}, task_key=job.job_uuid)
 
         return {
             "success": True,
@@ -829,7 +1087,7 @@ async def get_group_sync_configs(db: Session = Depends(get_db)):
 
 
 @app.post("/api/group-sync/configs/{config_uuid}/sync")
-async def resync_config(config_uuid: str, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def resync_config(config_uuid: str, db: Session = Depends(get_db)):
     """Re-run sync for a saved configuration"""
     try:
         google_service = ServiceManager.get_service()
@@ -842,11 +1100,8 @@ async def resync_config(config_uuid: str, background_tasks: BackgroundTasks, db:
         # Create job from config
         job = processor.create_sync_job(config_uuid)
 
-        # Start background processing
-        background_tasks.add_task(
-            _process_group_sync_job,
-            job_uuid=job.job_uuid
-        )
+        # Queue for a job worker
+        JobQueue(db).enqueue('group_sync', {'job_uuid': job.job_uuid}, task_key=job.job_uuid)
 
         return {
             "success": True,
@@ -988,8 +1243,8 @@ async def import_configs(file: UploadFile = File(...), db: Session = Depends(get
 
 
 @app.post("/api/group-sync/configs/sync-all")
-async def sync_all_configs(background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    """Sync all saved configurations sequentially"""
+async def sync_all_configs(db: Session = Depends(get_db)):
+    """Sync all saved configurations concurrently, sharing one directory snapshot"""
     try:
         google_service = ServiceManager.get_service()
 
@@ -1010,21 +1265,31 @@ async def sync_all_configs(background_tasks: BackgroundTasks, db: Session = Depe
             try:
                 job = processor.create_sync_job(config['config_uuid'])
                 job_uuids.append(job.job_uuid)
-
-                # Start background processing for this job
-                background_tasks.add_task(
-                    _process_group_sync_job,
-                    job_uuid=job.job_uuid
-                )
             except Exception as e:
                 print(f"[sync_all_configs] Failed to create job for config {config['config_uuid']}: {str(e)}")
 
+        if not job_uuids:
+            # Nothing to run; don't queue an empty run
+            return {
+                "success": False,
+                "message": "No sync jobs could be created",
+                "total_configs": len(configs),
+                "jobs_created": 0,
+                "job_uuids": [],
+                "run_id": None
+            }
+
+        # Run all jobs in one scheduled run with a bounded worker pool
+        run_id = SyncAllScheduler.new_run(db, job_uuids)
+        JobQueue(db).enqueue('sync_all_run', {'run_id': run_id, 'job_uuids': job_uuids}, task_key=run_id)
+
         return {
             "success": True,
             "message": f"Created {len(job_uuids)} sync jobs",
             "total_configs": len(configs),
             "jobs_created": len(job_uuids),
-            "job_uuids": job_uuids
+            "job_uuids": job_uuids,
+            "run_id": run_id
         }
 
     except HTTPException:
@@ -1033,163 +1298,18 @@ async def sync_all_configs(background_tasks: BackgroundTasks, db: Session = Depe
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def _process_batch_job(job_uuid: str):
-    """Background task to process a batch job"""
-    from database.session import SessionLocal
-    import traceback
-
-    print(f"[_process_batch_job] Starting background task for job {job_uuid}")
-    db = SessionLocal()
-    try:
-        # Use ServiceManager to get service (auto-recovers if None)
-        print(f"[_process_batch_job] Getting service from ServiceManager...")
-        google_service = ServiceManager.get_service()
+@app.get("/api/group-sync/runs/{run_id}")
+async def get_sync_all_run(run_id: str, db: Session = Depends(get_db)):
+    """Get progress and aggregate throughput of a sync-all run"""
+    run = SyncAllScheduler.get_run(db, run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail=f"Run {run_id} not found")
 
-        if google_service and google_service.is_authenticated():
-            print(f"[_process_batch_job] Google service available and authenticated, creating batch processor")
-            processor = BatchProcessor(db, google_service)
-            print(f"[_process_batch_job] Calling process_job...")
-            processor.process_job(job_uuid)
-            print(f"[_process_batch_job] process_job completed successfully")
-        else:
-            print(f"[_process_batch_job] ERROR: Service not authenticated!")
-            raise Exception("Google service not available or not authenticated")
-    except Exception as e:
-        print(f"[_process_batch_job] ❌ EXCEPTION in background task for job {job_uuid}: {str(e)}")
-        traceback.print_exc()
-    finally:
-        print(f"[_process_batch_job] Closing database session for job {job_uuid}")
-        db.close()
-
-
-def _process_alias_extraction_job(job_uuid: str):
-    """Background task to process an alias extraction job"""
-    from database.session import SessionLocal
-    from database.models import BatchJob
-    import traceback
-
-    print(f"[_process_alias_extraction_job] Starting alias extraction for job {job_uuid}")
-    db = SessionLocal()
-
-    try:
-        # Get the job
-        job = db.query(BatchJob).filter(BatchJob.job_uuid == job_uuid).first()
-        if not job:
-            print(f"[_process_alias_extraction_job] ERROR: Job {job_uuid} not found")
-            return
-
-        # Update job status to running
-        job.status = 'running'
-        job.started_at = datetime.now()
-        db.commit()
-
-        # Get Google service
-        print(f"[_process_alias_extraction_job] Getting service from ServiceManager...")
-        google_service = ServiceManager.get_service()
-
-        if not google_service or not google_service.is_authenticated():
-            print(f"[_process_alias_extraction_job] ERROR: Service not authenticated!")
-            job.status = 'failed'
-            job.error_message = "Google service not available or not authenticated"
-            job.completed_at = datetime.now()
-            db.commit()
-            return
-
-        # Progress callback
-        def progress_callback(total, processed, users_with_aliases):
-            print(f"[_process_alias_extraction_job] Progress: {processed}/{total} users processed, {users_with_aliases} with aliases")
-            job.total_users = total
-            job.processed_users = processed
-            job.successful_users = users_with_aliases
-            job.progress_percentage = (processed / total * 100) if total > 0 else 0
-            db.commit()
-
-        # Run the extraction
-        print(f"[_process_alias_extraction_job] Starting streaming extraction to {job.file_path}")
-        result = google_service.extract_aliases_streaming(
-            file_path=job.file_path,
-            progress_callback=progress_callback
-        )
-
-        # Update job with final results
-        job.status = 'completed'
-        job.total_users = result['total_users']
-        job.processed_users = result['total_users']
-        job.successful_users = result['users_with_aliases']
-        job.progress_percentage = 100.0
-        job.completed_at = datetime.now()
-        db.commit()
-
-        print(f"[_process_alias_extraction_job] Completed successfully: {result['users_with_aliases']} users with aliases")
-
-    except Exception as e:
-        print(f"[_process_alias_extraction_job] ❌ EXCEPTION: {str(e)}")
-        traceback.print_exc()
-
-        # Mark job as failed
-        try:
-            job = db.query(BatchJob).filter(BatchJob.job_uuid == job_uuid).first()
-            if job:
-                job.status = 'failed'
-                job.error_message = str(e)
-                job.completed_at = datetime.now()
-                db.commit()
-        except:
-            pass
-    finally:
-        print(f"[_process_alias_extraction_job] Closing database session for job {job_uuid}")
-        db.close()
-
-
-def _process_group_sync_job(job_uuid: str):
-    """Background task to process a group sync job"""
-    from database.session import SessionLocal
-    import traceback
-
-    print(f"[_process_group_sync_job] Starting group sync for job {job_uuid}")
-    db = SessionLocal()
-
-    try:
-        # Get Google service
-        print(f"[_process_group_sync_job] Getting service from ServiceManager...")
-        google_service = ServiceManager.get_service()
-
-        if not google_service or not google_service.is_authenticated():
-            print(f"[_process_group_sync_job] ERROR: Service not authenticated!")
-            # Mark job as failed
-            from database.models import BatchJob
-            job = db.query(BatchJob).filter(BatchJob.job_uuid == job_uuid).first()
-            if job:
-                job.status = 'failed'
-                job.error_message = "Google service not available or not authenticated"
-                job.completed_at = datetime.now()
-                db.commit()
-            return
-
-        # Create processor and run the job
-        processor = GroupSyncProcessor(db, google_service)
-        processor.process_job(job_uuid)
-
-        print(f"[_process_group_sync_job] Completed successfully")
-
-    except Exception as e:
-        print(f"[_process_group_sync_job] ❌ EXCEPTION: {str(e)}")
-        traceback.print_exc()
-
-        # Mark job as failed
-        try:
-            from database.models import BatchJob
-            job = db.query(BatchJob).filter(BatchJob.job_uuid == job_uuid).first()
-            if job:
-                job.status = 'failed'
-                job.error_message = str(e)
-                job.completed_at = datetime.now()
-                db.commit()
-        except:
-            pass
-    finally:
-        print(f"[_process_group_sync_job] Closing database session for job {job_uuid}")
-        db.close()
+    task = JobQueue(db).get_task_by_key(run_id)
+    if task:
+        run['queue_status'] = task.status
+        run['error_message'] = run['error_message'] or task.error_message
+    return run
 
 
 # Mount static files (frontend) - must be last to not override API routes
@@ -1,73 +1,57 @@
 """
 Migration script to make batch_jobs columns nullable for multiple job types
+Works on SQLite (DATABASE_PATH) and PostgreSQL (DATABASE_URL)
 """
-import sqlite3
-import os
+from sqlalchemy import MetaData, inspect, text
 
-db_path = os.path.join(os.path.dirname(__file__), 'data', 'dea_toolbox.db')
+from database.session import engine
+from database.models import BatchJob
 
-print(f"Migrating database: {db_path}")
+# Columns only some job types fill in
+NULLABLE_COLUMNS = ['ou_paths', 'attribute', 'value', 'file_path']
 
-conn = sqlite3.connect(db_path)
-cursor = conn.cursor()
+print(f"Migrating database: {engine.url.render_as_string(hide_password=True)}")
 
 try:
-    # Backup existing data
-    print("Backing up existing batch_jobs data...")
-    cursor.execute("SELECT * FROM batch_jobs")
-    existing_data = cursor.fetchall()
-    print(f"Found {len(existing_data)} existing jobs")
+    inspector = inspect(engine)
+    existing = {}
+    if inspector.has_table('batch_jobs'):
+        existing = {column['name']: column for column in inspector.get_columns('batch_jobs')}
+        print(f"Columns: {list(existing)}")
+    not_nullable = [name for name in NULLABLE_COLUMNS if name in existing and not existing[name]['nullable']]
+
+    if not existing:
+        print("✓ batch_jobs does not exist yet; it will be created with nullable columns on first run")
+
+    elif not not_nullable:
+        print("✓ Columns are already nullable")
+
+    elif engine.dialect.name == 'sqlite':
+        # SQLite can't alter a column's constraints: rebuild the table from the model and copy the rows over
+        print(f"Rebuilding batch_jobs with nullable {', '.join(not_nullable)}...")
+        rebuilt = BatchJob.__table__.to_metadata(MetaData(), name='batch_jobs_rebuilt')
+        rebuilt.indexes.clear()  # Created under their real names once the old table is gone
+        copied = ', '.join(name for name in existing if name in BatchJob.__table__.c)
+
+        with engine.begin() as connection:
+            rebuilt.create(bind=connection)
+            count = connection.execute(text(
+                f"INSERT INTO batch_jobs_rebuilt ({copied}) SELECT {copied} FROM batch_jobs"
+            )).rowcount
+            connection.execute(text("DROP TABLE batch_jobs"))
+            connection.execute(text("ALTER TABLE batch_jobs_rebuilt RENAME TO batch_jobs"))
+            for index in BatchJob.__table__.indexes:
+                index.create(bind=connection)
+        print(f"✓ Restored {count} jobs")
+
+    else:
+        with engine.begin() as connection:
+            for name in not_nullable:
+                print(f"Dropping NOT NULL from batch_jobs.{name}...")
+                connection.execute(text(f"ALTER TABLE batch_jobs ALTER COLUMN {name} DROP NOT NULL"))
 
-    # Get column names
-    cursor.execute("PRAGMA table_info(batch_jobs)")
-    columns = [col[1] for col in cursor.fetchall()]
-    print(f"Columns: {columns}")
-
-    # Drop the old table
-    print("Dropping old batch_jobs table...")
-    cursor.execute("DROP TABLE IF EXISTS batch_jobs")
-
-    # Create new table with nullable columns
-    print("Creating new batch_jobs table with nullable columns...")
-    cursor.execute("""
-        CREATE TABLE batch_jobs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            job_uuid VARCHAR(36) UNIQUE NOT NULL,
-            job_type VARCHAR(50) NOT NULL,
-            status VARCHAR(20) NOT NULL,
-            ou_paths TEXT,
-            attribute VARCHAR(100),
-            value TEXT,
-            file_path TEXT,
-            total_users INTEGER DEFAULT 0,
-            processed_users INTEGER DEFAULT 0,
-            successful_users INTEGER DEFAULT 0,
-            failed_users INTEGER DEFAULT 0,
-            progress_percentage REAL DEFAULT 0.0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            started_at TIMESTAMP,
-            completed_at TIMESTAMP,
-            error_message TEXT
-        )
-    """)
-
-    # Create indexes
-    print("Creating indexes...")
-    cursor.execute("CREATE INDEX idx_batch_jobs_job_uuid ON batch_jobs(job_uuid)")
-    cursor.execute("CREATE INDEX idx_batch_jobs_status ON batch_jobs(status)")
-
-    # Restore data if any existed
-    if existing_data:
-        print(f"Restoring {len(existing_data)} jobs...")
-        placeholders = ','.join(['?' for _ in columns])
-        cursor.executemany(f"INSERT INTO batch_jobs ({','.join(columns)}) VALUES ({placeholders})", existing_data)
-
-    conn.commit()
     print("✓ Migration completed successfully!")
 
 except Exception as e:
     print(f"✗ Migration failed: {e}")
-    conn.rollback()
     raise
-finally:
-    conn.close()
@@ -1,73 +1,33 @@
 """
 Migration script to add group sync columns to batch_jobs and create group_sync_operations table
+Works on SQLite (DATABASE_PATH) and PostgreSQL (DATABASE_URL)
 """
-import sqlite3
-import os
+from sqlalchemy import inspect
 
-db_path = os.path.join(os.path.dirname(__file__), 'data', 'dea_toolbox.db')
+from database.session import engine, add_missing_columns
+from database.models import BatchJob, GroupSyncOperation
 
-print(f"Migrating database: {db_path}")
-
-conn = sqlite3.connect(db_path)
-cursor = conn.cursor()
+print(f"Migrating database: {engine.url.render_as_string(hide_password=True)}")
 
 try:
-    # Check if group_name_pattern column already exists
-    cursor.execute("PRAGMA table_info(batch_jobs)")
-    columns = [col[1] for col in cursor.fetchall()]
-
-    if 'group_name_pattern' not in columns:
-        print("Adding new columns to batch_jobs table...")
+    # Add the group sync columns to batch_jobs if they are missing
+    added = add_missing_columns(BatchJob.__table__, ['group_name_pattern', 'group_description', 'created_groups'])
 
-        # Add new columns for group sync
-        cursor.execute("ALTER TABLE batch_jobs ADD COLUMN group_name_pattern VARCHAR(255)")
-        cursor.execute("ALTER TABLE batch_jobs ADD COLUMN group_description TEXT")
-        cursor.execute("ALTER TABLE batch_jobs ADD COLUMN created_groups TEXT")
-
-        print("✓ New columns added to batch_jobs")
+    if added:
+        print(f"✓ New columns added to batch_jobs: {', '.join(added)}")
     else:
         print("✓ Columns already exist in batch_jobs")
 
-    # Check if group_sync_operations table exists
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='group_sync_operations'")
-    table_exists = cursor.fetchone()
-
-    if not table_exists:
+    # Create group_sync_operations (with its indexes) if it doesn't exist
+    if not inspect(engine).has_table(GroupSyncOperation.__tablename__):
         print("Creating group_sync_operations table...")
-
-        cursor.execute("""
-            CREATE TABLE group_sync_operations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                job_uuid VARCHAR(36) NOT NULL,
-                ou_path VARCHAR(500) NOT NULL,
-                ou_name VARCHAR(255) NOT NULL,
-                group_email VARCHAR(255) NOT NULL,
-                group_name VARCHAR(255) NOT NULL,
-                status VARCHAR(20) NOT NULL,
-                total_members INTEGER DEFAULT 0,
-                synced_members INTEGER DEFAULT 0,
-                failed_members INTEGER DEFAULT 0,
-                group_created BOOLEAN DEFAULT 0,
-                error_message TEXT,
-                started_at TIMESTAMP,
-                completed_at TIMESTAMP,
-                FOREIGN KEY (job_uuid) REFERENCES batch_jobs (job_uuid)
-            )
-        """)
-
-        # Create indexes
-        cursor.execute("CREATE INDEX idx_group_sync_job_uuid ON group_sync_operations(job_uuid)")
-
+        GroupSyncOperation.__table__.create(bind=engine)
         print("✓ group_sync_operations table created")
     else:
         print("✓ group_sync_operations table already exists")
 
-    conn.commit()
     print("✓ Migration completed successfully!")
 
 except Exception as e:
     print(f"✗ Migration failed: {e}")
-    conn.rollback()
     raise
-finally:
-    conn.close()
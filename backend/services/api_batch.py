@@ -0,0 +1,136 @@
+"""
+Batched Directory API execution using HTTP batch requests
+Packs many API calls into a single round-trip and retries only the failed sub-requests
+"""
+import time
+from typing import Callable, Dict, List, Tuple, Any, Optional
+from googleapiclient.errors import HttpError
+
+from services.api_retry import APIRetryHandler
+from services.rate_limiter import AdaptiveRateController
+
+
+class BatchRequestExecutor:
+    """Executes Directory API calls through HTTP batch requests with per-item retry"""
+
+    MAX_BATCH_SIZE = 100  # Google's limit of sub-requests per batch HTTP call
+
+    def __init__(
+        self,
+        batch_factory: Callable,
+        retry_handler: Optional[APIRetryHandler] = None,
+        batch_size: int = MAX_BATCH_SIZE,
+        rate_controller: Optional[AdaptiveRateController] = None,
+        http_factory: Optional[Callable] = None
+    ):
+        """
+        Initialize batch executor
+
+        Args:
+            batch_factory: Callable accepting callback= and returning a BatchHttpRequest-like
+                object with add(request, request_id=) and execute(). Usually
+                GoogleWorkspaceService.new_batch_request, or a local fake in tests.
+            retry_handler: Retry handler used for the batch call and failed sub-requests
+            batch_size: Number of sub-requests per batch call (capped at 100)
+            rate_controller: Optional controller; each sub-request counts as one call against it
+            http_factory: Optional callable returning the HTTP transport to send batches with
+                (e.g. GoogleWorkspaceService.get_thread_http when called from worker threads)
+        """
+        self.batch_factory = batch_factory
+        self.retry_handler = retry_handler or APIRetryHandler(max_retries=5, base_delay=1.0)
+        self.batch_size = max(1, min(batch_size, self.MAX_BATCH_SIZE))
+        self.rate_controller = rate_controller
+        self.http_factory = http_factory
+
+    def execute(self, request_builders: List[Tuple[str, Callable]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Execute requests in batches, retrying only sub-requests that failed transiently
+
+        This is the only retry layer: each attempt re-sends just the items that
+        failed (a failed batch call fails all of its items), and every item's
+        outcome is fed to the rate controller once per attempt.
+
+        Args:
+            request_builders: List of (request_id, builder) tuples. Each builder returns a
+                fresh HttpRequest, so a failed sub-request can be rebuilt for retry.
+
+        Returns:
+            Dict mapping request_id to {'response': ..., 'error': ...}. Exactly one of the
+            two is set for every request_id.
+        """
+        results = {}
+        pending = list(request_builders)
+
+        for attempt in range(self.retry_handler.max_retries + 1):
+            retry_items = []
+            retry_error = None
+
+            for start in range(0, len(pending), self.batch_size):
+                chunk = pending[start:start + self.batch_size]
+                chunk_results = self._execute_chunk(chunk)
+
+                for request_id, builder in chunk:
+                    result = chunk_results[request_id]
+                    error = result['error']
+                    self.retry_handler.record_outcome(error)
+
+                    if (error is not None
+                            and attempt < self.retry_handler.max_retries
+                            and self.retry_handler.should_retry(error)):
+                        retry_items.append((request_id, builder))
+                        retry_error = error
+                    else:
+                        results[request_id] = result
+
+            if not retry_items:
+                break
+
+            delay = self.retry_handler._calculate_backoff(
+                attempt,
+                retry_error if isinstance(retry_error, HttpError) else None
+            )
+            print(f"[BatchRequest] {len(retry_items)} sub-requests failed transiently, retrying in {delay:.1f}s (attempt {attempt + 1}/{self.retry_handler.max_retries})")
+            time.sleep(delay)
+            pending = retry_items
+
+        return results
+
+    def _execute_chunk(self, chunk: List[Tuple[str, Callable]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Send one batch HTTP request and collect the per-item results
+
+        The batch is sent once: execute() retries failed items itself, so a
+        failed batch call is not re-sent here (that would repeat the items
+        that already succeeded and multiply the attempts per item).
+        """
+        chunk_results = {}
+
+        def callback(request_id, response, exception):
+            chunk_results[request_id] = {'response': response, 'error': exception}
+
+        # Sub-requests count individually against the Admin SDK quota
+        if self.rate_controller:
+            self.rate_controller.acquire(len(chunk))
+
+        try:
+            batch = self.batch_factory(callback=callback)
+            for request_id, builder in chunk:
+                batch.add(builder(), request_id=request_id)
+
+            if self.http_factory:
+                batch.execute(http=self.http_factory())
+            else:
+                batch.execute()
+        except Exception as e:
+            # The batch call itself failed - every item without a result shares the error
+            print(f"[BatchRequest] Batch call failed for {len(chunk)} sub-requests: {str(e)}")
+            for request_id, _ in chunk:
+                chunk_results.setdefault(request_id, {'response': None, 'error': e})
+
+        for request_id, _ in chunk:
+            chunk_results.setdefault(
+                request_id,
+                {'response': None, 'error': Exception("No response returned for batch sub-request")}
+            )
+
+        return chunk_results
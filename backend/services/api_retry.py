@@ -4,10 +4,12 @@ Handles transient errors, SSL issues, and connection problems with exponential b
 """
 import time
 import random
-from typing import Callable, Any
+from typing import Callable, Any, Optional
 from googleapiclient.errors import HttpError
 import ssl
 
+from services.rate_limiter import AdaptiveRateController
+
 
 class APIRetryHandler:
     """Handles API retries with exponential backoff, inspired by GAM"""
@@ -30,6 +32,13 @@ class APIRetryHandler:
         'internalError',
     }
 
+    # Error reasons that mean we are sending too fast (as opposed to permission errors)
+    RATE_LIMIT_REASONS = {
+        'rateLimitExceeded',
+        'userRateLimitExceeded',
+        'quotaExceeded',
+    }
+
     # SSL errors that should trigger retry
     SSL_ERRORS = (
         ssl.SSLError,
@@ -38,16 +47,23 @@ class APIRetryHandler:
         BrokenPipeError,
     )
 
-    def __init__(self, max_retries: int = 5, base_delay: float = 1.0):
+    def __init__(
+        self,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        rate_controller: Optional[AdaptiveRateController] = None
+    ):
         """
         Initialize retry handler
 
         Args:
             max_retries: Maximum number of retry attempts
             base_delay: Base delay in seconds for exponential backoff
+            rate_controller: Optional adaptive controller fed with success/throttle signals
         """
         self.max_retries = max_retries
         self.base_delay = base_delay
+        self.rate_controller = rate_controller
 
     def execute_with_retry(self, func: Callable, *args, **kwargs) -> Any:
         """
@@ -68,10 +84,13 @@ class APIRetryHandler:
 
         for attempt in range(self.max_retries + 1):
             try:
-                return func(*args, **kwargs)
+                result = func(*args, **kwargs)
+                self.record_outcome()
+                return result
 
             except HttpError as e:
                 last_error = e
+                self.record_outcome(e)
 
                 # Check if this error should be retried
                 if not self._should_retry_http_error(e):
@@ -114,6 +133,49 @@ class APIRetryHandler:
         # This shouldn't be reached, but just in case
         raise last_error if last_error else Exception("Unknown retry error")
 
+    def record_outcome(self, error: Optional[Exception] = None) -> None:
+        """
+        Feed a call outcome to the rate controller
+
+        Args:
+            error: The error the call failed with, or None on success
+        """
+        if not self.rate_controller:
+            return
+
+        if error is None:
+            self.rate_controller.on_success()
+        elif self.is_rate_limit_error(error):
+            self.rate_controller.on_throttle()
+
+    @classmethod
+    def is_rate_limit_error(cls, error: Exception) -> bool:
+        """Check if an error is a throttling signal (429, or 403 with a rate limit reason)"""
+        if not isinstance(error, HttpError):
+            return False
+
+        if error.resp.status == 429:
+            return True
+
+        if error.resp.status == 403:
+            try:
+                error_details = error.error_details
+                if isinstance(error_details, list):
+                    return any(detail.get('reason') in cls.RATE_LIMIT_REASONS for detail in error_details)
+            except:
+                pass
+
+        return False
+
+    def should_retry(self, error: Exception) -> bool:
+        """
+        Check if an error returned outside execute_with_retry (e.g. a batch
+        sub-request result) is transient and worth retrying
+        """
+        if isinstance(error, HttpError):
+            return self._should_retry_http_error(error)
+        return isinstance(error, self.SSL_ERRORS)
+
     def _should_retry_http_error(self, error: HttpError) -> bool:
         """Check if an HTTP error should be retried"""
         status_code = error.resp.status
@@ -0,0 +1,418 @@
+"""
+asyncio-native Directory API client for async endpoints
+Sends requests through a pooled httpx.AsyncClient so tenant scans never block the event loop
+"""
+import os
+import queue
+import asyncio
+from urllib.parse import quote
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+import httplib2
+from google.auth.transport.requests import Request
+from googleapiclient.errors import HttpError
+
+from services.api_retry import APIRetryHandler
+from services.rate_limiter import get_rate_controller
+from services.ou_cache import get_ou_cache
+from services.google_workspace import (
+    GoogleWorkspaceService,
+    ALIAS_USER_FIELDS,
+    MEMBERSHIP_USER_FIELDS,
+    ORGANIZATION_ATTRIBUTES,
+    build_attribute_update,
+    format_org_unit,
+    new_alias_export_path,
+    users_list_fields
+)
+
+BASE_URL = 'https://admin.googleapis.com/admin/directory/v1'
+
+# Marks the end of the pages handed to the alias CSV writer thread
+_END_OF_PAGES = object()
+
+# Connection pool shared by every AsyncDirectoryClient; closed at app shutdown
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    """Get the shared connection pool, sized by DIRECTORY_ASYNC_MAX_CONNECTIONS (20)"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        max_connections = int(os.getenv("DIRECTORY_ASYNC_MAX_CONNECTIONS", 20))
+        _http_client = httpx.AsyncClient(
+            base_url=BASE_URL,
+            timeout=httpx.Timeout(60.0, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            )
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close the pooled connections of the async Directory clients"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+class AsyncDirectoryClient:
+    """
+    Awaitable counterparts of the GoogleWorkspaceService calls used by async endpoints
+
+    Shares credentials, the adaptive rate controller and the OU cache with the
+    blocking service; only the transport differs. Credentials go in each
+    request's headers, so every client sends through one module-level
+    connection pool that outlives re-authentication. Failed responses are raised
+    as googleapiclient HttpError so callers and APIRetryHandler treat them the
+    same way as errors from the blocking client.
+    """
+
+    def __init__(self, google_service: GoogleWorkspaceService):
+        """
+        Initialize client
+
+        Args:
+            google_service: Authenticated service whose credentials are used
+        """
+        self.google_service = google_service
+        self.retry_handler = APIRetryHandler(max_retries=5, base_delay=1.0, rate_controller=get_rate_controller())
+        self._refresh_lock: Optional[asyncio.Lock] = None
+
+    async def _auth_headers(self) -> Dict[str, str]:
+        """Get the Authorization header, refreshing the token off the event loop when needed"""
+        creds = self.google_service.creds
+        if creds is None:
+            raise Exception("Not authenticated")
+
+        if not creds.valid:
+            if self._refresh_lock is None:
+                self._refresh_lock = asyncio.Lock()
+            async with self._refresh_lock:
+                if not creds.valid:
+                    await asyncio.to_thread(creds.refresh, Request())
+
+        headers = {}
+        creds.apply(headers)
+        return headers
+
+    async def _request(self, method: str, path: str, params: Optional[Dict] = None, json_body: Optional[Dict] = None) -> Dict:
+        """
+        Send one API request paced by the shared rate controller, retrying transient errors
+
+        Returns:
+            Decoded JSON response (empty dict for empty bodies)
+        """
+        rate_controller = get_rate_controller()
+        max_retries = self.retry_handler.max_retries
+
+        for attempt in range(max_retries + 1):
+            await rate_controller.acquire_async()
+
+            try:
+                response = await _get_http_client().request(
+                    method,
+                    path,
+                    params=params,
+                    json=json_body,
+                    headers=await self._auth_headers()
+                )
+            except httpx.TransportError as e:
+                if attempt >= max_retries:
+                    raise
+                delay = self.retry_handler._calculate_backoff(attempt)
+                print(f"[AsyncDirectory] Connection error, retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries}): {type(e).__name__}")
+                await asyncio.sleep(delay)
+                continue
+
+            if response.status_code < 400:
+                self.retry_handler.record_outcome()
+                return response.json() if response.content else {}
+
+            error = self._to_http_error(response)
+            self.retry_handler.record_outcome(error)
+
+            if attempt >= max_retries or not self.retry_handler.should_retry(error):
+                raise error
+
+            delay = self.retry_handler._calculate_backoff(attempt, error)
+            print(f"[AsyncDirectory] HTTP {response.status_code} error, retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _to_http_error(response: httpx.Response) -> HttpError:
+        """Wrap an httpx error response in the googleapiclient exception type"""
+        resp = httplib2.Response({key.lower(): value for key, value in response.headers.items()})
+        resp.status = response.status_code
+        resp.reason = response.reason_phrase
+        if 'retry-after' in resp:
+            resp['Retry-After'] = resp['retry-after']
+        return HttpError(resp, response.content, uri=str(response.url))
+
+    async def iter_user_pages(
+        self,
+        projection: str = 'basic',
+        user_fields: Optional[str] = None,
+        query: Optional[str] = None,
+        order_by: Optional[str] = 'email'
+    ) -> AsyncIterator[List[Dict]]:
+        """
+        Yield users().list pages, requesting page N+1 while the caller processes page N
+
+        Args:
+            projection: Directory API projection ('basic' or 'full')
+            user_fields: Optional partial-response field set of each user
+            query: Optional users().list search query
+            order_by: Sort field, or None for the API's default order
+        """
+        params = {
+            'customer': 'my_customer',
+            'maxResults': int(os.getenv("MAX_RESULTS_PER_PAGE", 500)),
+            'projection': projection
+        }
+        if order_by:
+            params['orderBy'] = order_by
+        if query:
+            params['query'] = query
+        fields = users_list_fields(user_fields)
+        if fields:
+            params['fields'] = fields
+
+        next_page = asyncio.ensure_future(self._request('GET', '/users', params=params))
+        try:
+            while next_page is not None:
+                results = await next_page
+                next_page = None
+
+                page_token = results.get('nextPageToken')
+                if page_token:
+                    next_page = asyncio.ensure_future(
+                        self._request('GET', '/users', params={**params, 'pageToken': page_token})
+                    )
+
+                yield results.get('users', [])
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+
+    async def get_all_users(self, user_fields: Optional[str] = None) -> List[Dict]:
+        """Retrieve all users from Google Workspace"""
+        users = []
+        try:
+            async for page_users in self.iter_user_pages(user_fields=user_fields):
+                users.extend(page_users)
+            return users
+        except HttpError as error:
+            raise Exception(f"Failed to retrieve users: {error}")
+
+    async def get_organizational_units(self) -> List[Dict]:
+        """Get all organizational units from Google Workspace"""
+        try:
+            results = await self._request('GET', '/customer/my_customer/orgunits', params={'type': 'all'})
+            return [format_org_unit(org_unit) for org_unit in results.get('organizationUnits', [])]
+        except HttpError as error:
+            raise Exception(f"Error fetching organizational units: {error}")
+
+    async def extract_aliases_to_csv(self) -> Dict:
+        """
+        Extract all users with aliases and save to CSV
+
+        Pages are handed to extract_aliases_streaming, running in a worker
+        thread, through a queue a few pages deep, so each page is written as
+        it arrives and memory stays flat however large the tenant is.
+        """
+        total_users = 0
+        pages: "queue.Queue" = queue.Queue(maxsize=2)
+
+        def queued_pages():
+            while True:
+                item = pages.get()
+                if item is _END_OF_PAGES:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+
+        # CSV writing is plain file I/O; keep it off the event loop
+        writer = asyncio.ensure_future(asyncio.to_thread(
+            self.google_service.extract_aliases_streaming,
+            new_alias_export_path(),
+            None,
+            queued_pages(),
+            'wide'
+        ))
+
+        async def hand_over(item) -> None:
+            # Gives up once the writer has stopped, so a failed write can't leave us blocked on a full queue
+            while not writer.done():
+                try:
+                    await asyncio.to_thread(pages.put, item, True, 1.0)
+                    return
+                except queue.Full:
+                    continue
+
+        try:
+            async for page_users in self.iter_user_pages(user_fields=ALIAS_USER_FIELDS):
+                total_users += len(page_users)
+                await hand_over([user for user in page_users if user.get('aliases')])
+        except BaseException as error:
+            # Stop the writer (it removes its partial output) before surfacing the listing error
+            await hand_over(error)
+            await asyncio.gather(writer, return_exceptions=True)
+            if isinstance(error, HttpError):
+                raise Exception(f"Failed to retrieve users: {error}")
+            raise
+
+        await hand_over(_END_OF_PAGES)
+        result = await writer
+        result['total_users'] = total_users
+        return result
+
+    async def list_users_in_ou(self, ou_path: str, user_fields: Optional[str] = None) -> List[Dict]:
+        """
+        List user resources in an OU and its sub-OUs, through the shared OU cache
+
+        Raises:
+            HttpError if the orgUnitPath query is rejected
+        """
+        if user_fields and 'orgUnitPath' not in user_fields.split(','):
+            user_fields = f'{user_fields},orgUnitPath'
+        cache_key = f"basic|{user_fields}" if user_fields else 'basic'
+
+        cache = get_ou_cache()
+        users = cache.get(ou_path, cache_key)
+        if users is not None:
+            return users
+
+        users = []
+        async for page_users in self.iter_user_pages(
+            user_fields=user_fields,
+            query=f"orgUnitPath='{ou_path}'",
+            order_by=None
+        ):
+            for user in page_users:
+                user_ou = user.get('orgUnitPath', '')
+                if user_ou == ou_path or user_ou.startswith(ou_path + '/'):
+                    users.append(user)
+
+        cache.put(ou_path, cache_key, users)
+        return users
+
+    async def list_users_in_ous_client_side(self, ou_paths: List[str], user_fields: Optional[str] = None) -> Dict[str, List[Dict]]:
+        """Fallback: one tenant sweep dispatching each user to every selected OU containing it"""
+        if user_fields and 'orgUnitPath' not in user_fields.split(','):
+            user_fields = f'{user_fields},orgUnitPath'
+
+        users_by_ou: Dict[str, List[Dict]] = {ou_path: [] for ou_path in ou_paths}
+        selected = {ou_path.rstrip('/') or '/': ou_path for ou_path in ou_paths}
+
+        async for page_users in self.iter_user_pages(user_fields=user_fields, order_by=None):
+            for user in page_users:
+                user_ou = user.get('orgUnitPath', '') or '/'
+                while True:
+                    if user_ou in selected:
+                        users_by_ou[selected[user_ou]].append(user)
+                    if user_ou == '/':
+                        break
+                    user_ou = user_ou.rsplit('/', 1)[0] or '/'
+
+        return users_by_ou
+
+    async def inject_attribute_to_users(self, ou_paths: List[str], attribute: str, value: str) -> Dict:
+        """
+        Inject a custom attribute to users in specified OUs
+
+        Same contract as GoogleWorkspaceService.inject_attribute_to_users; up to
+        DIRECTORY_ASYNC_CONCURRENCY (default 8) users are updated at a time.
+        """
+        try:
+            all_user_emails = []
+            user_count_limit = 500  # Safety limit to prevent too large operations
+
+            users_by_ou = {}
+            fallback_ous = []
+
+            for ou_path in ou_paths:
+                try:
+                    users_by_ou[ou_path] = await self.list_users_in_ou(ou_path, user_fields=MEMBERSHIP_USER_FIELDS)
+                except HttpError as e:
+                    print(f"Query filtering failed for {ou_path}, using client-side filtering: {e}")
+                    fallback_ous.append(ou_path)
+
+            if fallback_ous:
+                users_by_ou.update(await self.list_users_in_ous_client_side(fallback_ous, user_fields=MEMBERSHIP_USER_FIELDS))
+
+            for ou_path in ou_paths:
+                for user in users_by_ou[ou_path]:
+                    all_user_emails.append(user.get('primaryEmail'))
+
+                    # Safety check
+                    if len(all_user_emails) >= user_count_limit:
+                        raise Exception(f"User limit reached ({user_count_limit}). Please select a smaller OU or contact support for batch processing.")
+
+            if len(all_user_emails) == 0:
+                return {
+                    'total_users': 0,
+                    'updated_count': 0,
+                    'failed_count': 0,
+                    'errors': ['No users found in the selected organizational units']
+                }
+
+            semaphore = asyncio.Semaphore(int(os.getenv("DIRECTORY_ASYNC_CONCURRENCY", 8)))
+
+            async def update_user(user_email: str) -> Optional[str]:
+                async with semaphore:
+                    try:
+                        existing_orgs = None
+                        if attribute in ORGANIZATION_ATTRIBUTES:
+                            user_full = await self._request(
+                                'GET', f'/users/{quote(user_email)}',
+                                params={'projection': 'full', 'fields': 'organizations'}
+                            )
+                            existing_orgs = user_full.get('organizations', [])
+
+                        await self._request(
+                            'PUT', f'/users/{quote(user_email)}',
+                            json_body=build_attribute_update(attribute, value, existing_orgs)
+                        )
+                        return None
+                    except Exception as error:
+                        error_msg = str(error)
+                        if len(error_msg) > 200:
+                            error_msg = error_msg[:200] + "..."
+                        return f"{user_email}: {error_msg}"
+
+            outcomes = await asyncio.gather(*(update_user(user_email) for user_email in all_user_emails))
+            errors = [outcome for outcome in outcomes if outcome is not None]
+
+            # Cached listings of these OUs now hold stale attribute values
+            for ou_path in ou_paths:
+                get_ou_cache().invalidate(ou_path)
+
+            return {
+                'total_users': len(all_user_emails),
+                'updated_count': len(all_user_emails) - len(errors),
+                'failed_count': len(errors),
+                'errors': errors[:10]  # Limit to first 10 errors
+            }
+
+        except Exception as error:
+            raise Exception(f"Error injecting attribute: {error}")
+
+
+def get_async_client(google_service: GoogleWorkspaceService) -> AsyncDirectoryClient:
+    """
+    Get the async client bound to a service instance
+
+    One client per service, so a new login gets a fresh client; all of them
+    share the module-level connection pool.
+    """
+    client = getattr(google_service, '_async_client', None)
+    if client is None:
+        client = AsyncDirectoryClient(google_service)
+        google_service._async_client = client
+    return client
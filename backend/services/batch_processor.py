@@ -1,30 +1,58 @@
 """Service for batch processing attribute injections"""
+import os
 import json
 import uuid
-import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from typing import List, Dict, Optional
 from sqlalchemy.orm import Session
 from googleapiclient.errors import HttpError
 
 from database.models import BatchJob, CachedUser, BatchOperation
-from services.google_workspace import GoogleWorkspaceService
-from services.user_cache_service import UserCacheService
+from services.google_workspace import GoogleWorkspaceService, build_attribute_update
+from services.user_cache_service import UserCacheService, CachedUserStatusBuffer
 from services.api_retry import APIRetryHandler
+from services.api_batch import BatchRequestExecutor
+from services.rate_limiter import get_rate_controller
+from services.ou_cache import get_ou_cache
+from services.progress_events import publish_job_progress
+from services.lease import LeaseLost, check_lease
 
 
 class BatchProcessor:
     """Handles batch processing of attribute injections with progress tracking"""
 
     BATCH_SIZE = 25  # Reduced from 50 to 25 for better rate limiting
-    API_CALL_DELAY = 0.033  # 33ms delay between API calls (~30 calls/sec, safe under 40/sec limit)
-    PROGRESS_COMMIT_INTERVAL = 5  # Commit progress every 5 users for real-time UI updates
+    BATCH_REQUEST_SIZE = 100  # Users per HTTP batch request (Google's max sub-requests per batch)
 
-    def __init__(self, db: Session, google_service: GoogleWorkspaceService):
+    # 'sequential': one users().update call per user
+    # 'batch_request': up to BATCH_REQUEST_SIZE updates packed into one HTTP batch call
+    # 'concurrent': users spread across a thread pool sharing one token-bucket limiter
+    EXECUTION_MODES = ('sequential', 'batch_request', 'concurrent')
+
+    def __init__(
+        self,
+        db: Session,
+        google_service: GoogleWorkspaceService,
+        execution_mode: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        cancel_event: Optional[threading.Event] = None
+    ):
         self.db = db
         self.google_service = google_service
+        # Set by JobWorker when the task's lease is lost; checked before each batch
+        self.cancel_event = cancel_event
         self.user_cache_service = UserCacheService(db, google_service)
-        self.retry_handler = APIRetryHandler(max_retries=5, base_delay=1.0)
+        # Shared adaptive controller paces every API call; the retry handler feeds it throttling signals
+        self.rate_controller = get_rate_controller()
+        self.retry_handler = APIRetryHandler(max_retries=5, base_delay=1.0, rate_controller=self.rate_controller)
+
+        self.execution_mode = execution_mode or os.getenv("BATCH_EXECUTION_MODE", "sequential")
+        if self.execution_mode not in self.EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode '{self.execution_mode}'. Expected one of {self.EXECUTION_MODES}")
+
+        self.max_workers = max(1, max_workers or int(os.getenv("BATCH_WORKERS", 8)))
 
     def create_job(
         self,
@@ -115,6 +143,7 @@ class BatchProcessor:
             job.status = 'running'
             job.started_at = datetime.utcnow()
             self.db.commit()
+            publish_job_progress(job)
 
             # Get all pending users
             print(f"[BatchProcessor] Fetching pending users")
@@ -124,24 +153,46 @@ class BatchProcessor:
             )
             print(f"[BatchProcessor] Found {len(users)} pending users")
 
+            # Detach the rows so commits don't expire them; results are written through the status buffer
+            for user in users:
+                self.db.expunge(user)
+            status_buffer = self.user_cache_service.status_buffer(job_uuid)
+
             if not users:
                 print(f"[BatchProcessor] No users to process, marking as completed")
                 job.status = 'completed'
                 job.completed_at = datetime.utcnow()
                 job.progress_percentage = 100.0
                 self.db.commit()
+                publish_job_progress(job)
                 return {
                     'status': 'completed',
                     'message': 'No users to process'
                 }
 
             # Split users into batches
-            batches = self._create_batches(users)
-            print(f"[BatchProcessor] Created {len(batches)} batches of up to {self.BATCH_SIZE} users each")
+            batch_size = self.BATCH_REQUEST_SIZE if self.execution_mode == 'batch_request' else self.BATCH_SIZE
+            batches = self._create_batches(users, batch_size)
+            print(f"[BatchProcessor] Created {len(batches)} batches of up to {batch_size} users each ({self.execution_mode} mode)")
+
+            # Worker pool for concurrent mode - created once and reused across batches
+            worker_pool = None
+            if self.execution_mode == 'concurrent':
+                worker_pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix=f"batch-{job_uuid[:8]}"
+                )
+                print(f"[BatchProcessor] Started worker pool with {self.max_workers} workers")
 
             # Process each batch
             for batch_number, user_batch in enumerate(batches, start=1):
                 print(f"[BatchProcessor] ========== Processing batch {batch_number}/{len(batches)} ==========")
+                try:
+                    check_lease(self.cancel_event)
+                except LeaseLost:
+                    if worker_pool:
+                        worker_pool.shutdown(wait=True)
+                    raise
 
                 # Refresh credentials before each batch to prevent token expiration
                 print(f"[BatchProcessor] Refreshing credentials before batch {batch_number}")
@@ -154,22 +205,50 @@ class BatchProcessor:
 
                 print(f"[BatchProcessor] Processing {len(user_batch)} users in batch {batch_number}")
                 try:
-                    self._process_batch(
-                        job=job,
-                        batch_number=batch_number,
-                        users=user_batch
-                    )
+                    if self.execution_mode == 'batch_request':
+                        self._process_batch_request(
+                            job=job,
+                            batch_number=batch_number,
+                            users=user_batch,
+                            status_buffer=status_buffer
+                        )
+                    elif self.execution_mode == 'concurrent':
+                        self._process_batch_concurrent(
+                            job=job,
+                            batch_number=batch_number,
+                            users=user_batch,
+                            worker_pool=worker_pool,
+                            status_buffer=status_buffer
+                        )
+                    else:
+                        self._process_batch(
+                            job=job,
+                            batch_number=batch_number,
+                            users=user_batch,
+                            status_buffer=status_buffer
+                        )
                     print(f"[BatchProcessor] Batch {batch_number} completed successfully")
                 except Exception as batch_error:
                     print(f"[BatchProcessor] ERROR processing batch {batch_number}: {str(batch_error)}")
+                    if worker_pool:
+                        worker_pool.shutdown(wait=True)
                     raise
 
+            if worker_pool:
+                worker_pool.shutdown(wait=True)
+
             # Mark job as completed
             print(f"[BatchProcessor] All batches completed, marking job as completed")
             job.status = 'completed'
             job.completed_at = datetime.utcnow()
             job.progress_percentage = 100.0
             self.db.commit()
+            publish_job_progress(job)
+
+            # Cached OU listings of the updated users now hold stale attribute values
+            if job.successful_users:
+                for ou_path in json.loads(job.ou_paths) if job.ou_paths else []:
+                    get_ou_cache().invalidate(ou_path)
 
             print(f"[BatchProcessor] Job completed: {job.successful_users} successful, {job.failed_users} failed")
             return {
@@ -179,6 +258,11 @@ class BatchProcessor:
                 'failed_users': job.failed_users
             }
 
+        except LeaseLost:
+            # The job was reset for another worker; leave its status to that worker
+            print(f"[BatchProcessor] Lease lost, stopping job {job_uuid}")
+            raise
+
         except Exception as e:
             # Mark job as failed
             print(f"[BatchProcessor] FATAL ERROR: {str(e)}")
@@ -188,13 +272,15 @@ class BatchProcessor:
             job.error_message = str(e)
             job.completed_at = datetime.utcnow()
             self.db.commit()
+            publish_job_progress(job)
             raise
 
-    def _create_batches(self, users: List[CachedUser]) -> List[List[CachedUser]]:
+    def _create_batches(self, users: List[CachedUser], batch_size: Optional[int] = None) -> List[List[CachedUser]]:
         """Split users into batches"""
+        batch_size = batch_size or self.BATCH_SIZE
         batches = []
-        for i in range(0, len(users), self.BATCH_SIZE):
-            batches.append(users[i:i + self.BATCH_SIZE])
+        for i in range(0, len(users), batch_size):
+            batches.append(users[i:i + batch_size])
         return batches
 
     def _ensure_valid_credentials(self) -> None:
@@ -239,7 +325,8 @@ class BatchProcessor:
         self,
         job: BatchJob,
         batch_number: int,
-        users: List[CachedUser]
+        users: List[CachedUser],
+        status_buffer: CachedUserStatusBuffer
     ) -> None:
         """
         Process a single batch of users
@@ -248,88 +335,216 @@ class BatchProcessor:
             job: The BatchJob object
             batch_number: The batch number
             users: List of CachedUser objects to process
+            status_buffer: Buffer the per-user results are written through
         """
         print(f"[BatchProcessor] _process_batch started for batch {batch_number}")
 
-        # Create batch operation record
-        batch_op = BatchOperation(
-            job_uuid=job.job_uuid,
-            batch_number=batch_number,
-            user_emails=json.dumps([u.email for u in users]),
-            status='running',
-            started_at=datetime.utcnow()
-        )
-        self.db.add(batch_op)
-        self.db.commit()
-        print(f"[BatchProcessor] Batch operation record created")
+        batch_op = self._create_batch_operation(job, batch_number, users)
+        status_buffer.mark_processing([user.id for user in users])
 
         # Process each user in the batch
         success_count = 0
         fail_count = 0
         for idx, user in enumerate(users, 1):
             try:
-                # Mark user as processing (no commit yet)
-                user.status = 'processing'
-
                 # Inject attribute with rate limiting
+                self.rate_controller.acquire()
                 self._inject_attribute_to_user(
                     user_email=user.email,
                     attribute=job.attribute,
                     value=job.value
                 )
 
-                # Rate limiting: delay after each API call
-                time.sleep(self.API_CALL_DELAY)
-
-                # Mark user as success
-                user.status = 'success'
-                user.error_message = None
-
-                # Update job counters
-                job.successful_users += 1
+                status_buffer.record(user.id, 'success')
                 success_count += 1
 
             except Exception as e:
-                # Mark user as failed
                 error_msg = str(e)[:200]  # Limit error message length
-                user.status = 'failed'
-                user.error_message = error_msg
-
-                # Update job counters
-                job.failed_users += 1
+                status_buffer.record(user.id, 'failed', error_msg)
                 fail_count += 1
                 print(f"[BatchProcessor] User {user.email} failed: {error_msg}")
 
-            # Update progress
-            job.processed_users += 1
-            job.progress_percentage = (job.processed_users / job.total_users) * 100
-
-            # Commit progress every N users for real-time UI updates
-            if idx % self.PROGRESS_COMMIT_INTERVAL == 0:
-                self.db.commit()
-                print(f"[BatchProcessor] Batch {batch_number}: Progress committed - {idx}/{len(users)} users ({job.progress_percentage:.1f}% overall)")
-
             # Log progress every 10 users
-            elif idx % 10 == 0:
+            if idx % 10 == 0:
                 print(f"[BatchProcessor] Batch {batch_number}: Processed {idx}/{len(users)} users")
 
         # Mark batch as completed
         batch_op.status = 'completed'
         batch_op.completed_at = datetime.utcnow()
 
+        # Final flush for the batch (commits the batch operation too)
+        print(f"[BatchProcessor] Committing final batch {batch_number} to database...")
+        status_buffer.flush()
+
         print(f"[BatchProcessor] Batch {batch_number} summary: {success_count} successful, {fail_count} failed")
         print(f"[BatchProcessor] Overall progress: {job.processed_users}/{job.total_users} ({job.progress_percentage:.1f}%)")
 
-        # Final commit for the batch
-        print(f"[BatchProcessor] Committing final batch {batch_number} to database...")
+    def _create_batch_operation(
+        self,
+        job: BatchJob,
+        batch_number: int,
+        users: List[CachedUser]
+    ) -> BatchOperation:
+        """Create and commit the BatchOperation record for a batch"""
+        batch_op = BatchOperation(
+            job_uuid=job.job_uuid,
+            batch_number=batch_number,
+            user_emails=json.dumps([u.email for u in users]),
+            status='running',
+            started_at=datetime.utcnow()
+        )
+        self.db.add(batch_op)
         self.db.commit()
+        print(f"[BatchProcessor] Batch operation record created")
+        return batch_op
+
+    def _process_batch_concurrent(
+        self,
+        job: BatchJob,
+        batch_number: int,
+        users: List[CachedUser],
+        worker_pool: ThreadPoolExecutor,
+        status_buffer: CachedUserStatusBuffer
+    ) -> None:
+        """
+        Process a batch of users across the worker pool
+
+        Worker threads only make API calls, each drawing from the shared token
+        bucket. Results are recorded by the calling thread, which is the single
+        writer for the session, so SQLite never sees concurrent writes.
+
+        Args:
+            job: The BatchJob object
+            batch_number: The batch number
+            users: List of CachedUser objects to process
+            worker_pool: Thread pool running the API calls
+            status_buffer: Buffer the per-user results are written through
+        """
+        print(f"[BatchProcessor] _process_batch_concurrent started for batch {batch_number}")
+
+        batch_op = self._create_batch_operation(job, batch_number, users)
+        status_buffer.mark_processing([user.id for user in users])
+
+        futures = {}
+        for user in users:
+            future = worker_pool.submit(
+                self._inject_attribute_rate_limited,
+                user.email,
+                job.attribute,
+                job.value
+            )
+            futures[future] = user
+
+        success_count = 0
+        fail_count = 0
+        for future in as_completed(futures):
+            user = futures[future]
+            try:
+                future.result()
+                status_buffer.record(user.id, 'success')
+                success_count += 1
+            except Exception as e:
+                error_msg = str(e)[:200]  # Limit error message length
+                status_buffer.record(user.id, 'failed', error_msg)
+                fail_count += 1
+                print(f"[BatchProcessor] User {user.email} failed: {error_msg}")
+
+        # Mark batch as completed
+        batch_op.status = 'completed'
+        batch_op.completed_at = datetime.utcnow()
+        status_buffer.flush()
+
+        print(f"[BatchProcessor] Batch {batch_number} summary: {success_count} successful, {fail_count} failed")
+        print(f"[BatchProcessor] Overall progress: {job.processed_users}/{job.total_users} ({job.progress_percentage:.1f}%)")
+        print(f"[BatchProcessor] Batch {batch_number} committed successfully")
+
+    def _inject_attribute_rate_limited(self, user_email: str, attribute: str, value: str) -> None:
+        """Worker thread entry point: wait for the rate controller, then inject using this thread's transport"""
+        self.rate_controller.acquire()
+        self._inject_attribute_to_user(
+            user_email=user_email,
+            attribute=attribute,
+            value=value,
+            http=self.google_service.get_thread_http()
+        )
+
+    def _process_batch_request(
+        self,
+        job: BatchJob,
+        batch_number: int,
+        users: List[CachedUser],
+        status_buffer: CachedUserStatusBuffer
+    ) -> None:
+        """
+        Process a batch of users with a single HTTP batch request
+
+        Up to BATCH_REQUEST_SIZE users().update calls are packed into one payload.
+        Per-item results are mapped back onto each CachedUser row and only the
+        sub-requests that failed with transient errors are retried.
+
+        Args:
+            job: The BatchJob object
+            batch_number: The batch number
+            users: List of CachedUser objects to process
+            status_buffer: Buffer the per-user results are written through
+        """
+        print(f"[BatchProcessor] _process_batch_request started for batch {batch_number}")
+
+        batch_op = self._create_batch_operation(job, batch_number, users)
+        status_buffer.mark_processing([user.id for user in users])
+
+        # Same body for every user: organization attributes replace the organizations list
+        update_body = build_attribute_update(job.attribute, job.value)
+        users_by_request_id = {str(user.id): user for user in users}
+
+        def make_builder(user_email):
+            return lambda: self.google_service.service.users().update(
+                userKey=user_email,
+                body=update_body
+            )
+
+        executor = BatchRequestExecutor(
+            batch_factory=self.google_service.new_batch_request,
+            retry_handler=self.retry_handler,
+            batch_size=self.BATCH_REQUEST_SIZE,
+            rate_controller=self.rate_controller,
+            http_factory=self.google_service.get_thread_http
+        )
+        results = executor.execute([
+            (request_id, make_builder(user.email))
+            for request_id, user in users_by_request_id.items()
+        ])
+
+        success_count = 0
+        fail_count = 0
+        for request_id, user in users_by_request_id.items():
+            error = results[request_id]['error']
+
+            if error is None:
+                status_buffer.record(user.id, 'success')
+                success_count += 1
+            else:
+                prefix = "Google API error" if isinstance(error, HttpError) else "Error injecting attribute"
+                error_msg = f"{prefix}: {str(error)}"[:200]  # Limit error message length
+                status_buffer.record(user.id, 'failed', error_msg)
+                fail_count += 1
+                print(f"[BatchProcessor] User {user.email} failed: {error_msg}")
+
+        # Mark batch as completed
+        batch_op.status = 'completed'
+        batch_op.completed_at = datetime.utcnow()
+        status_buffer.flush()
+
+        print(f"[BatchProcessor] Batch {batch_number} summary: {success_count} successful, {fail_count} failed")
+        print(f"[BatchProcessor] Overall progress: {job.processed_users}/{job.total_users} ({job.progress_percentage:.1f}%)")
         print(f"[BatchProcessor] Batch {batch_number} committed successfully")
 
     def _inject_attribute_to_user(
         self,
         user_email: str,
         attribute: str,
-        value: str
+        value: str,
+        http=None
     ) -> None:
         """
         Inject attribute to a single user
@@ -338,58 +553,20 @@ class BatchProcessor:
             user_email: User's email address
             attribute: Attribute name
             value: Value to set
+            http: Optional per-thread HTTP transport (required when called from worker threads)
 
         Raises:
             Exception if injection fails
         """
         try:
-            # Handle complex organization attributes
-            if attribute in ['title', 'department', 'employeeType', 'costCenter']:
-                # Map attribute to correct field
-                field_mapping = {
-                    'title': 'title',
-                    'department': 'department',
-                    'employeeType': 'type',
-                    'costCenter': 'costCenter'
-                }
-
-                # Create organization object directly without fetching
-                update_body = {
-                    'organizations': [{
-                        field_mapping[attribute]: value,
-                        'primary': True
-                    }]
-                }
-
-            elif attribute == 'buildingId':
-                # Handle location/building
-                update_body = {
-                    'locations': [{
-                        'type': 'desk',
-                        'area': 'desk',
-                        'buildingId': value
-                    }]
-                }
-
-            elif attribute == 'manager':
-                # Handle manager as relation
-                update_body = {
-                    'relations': [{
-                        'type': 'manager',
-                        'value': value
-                    }]
-                }
-
-            else:
-                # For any other standard attribute, use directly
-                update_body = {attribute: value}
+            update_body = build_attribute_update(attribute, value)
 
             # Update the user with retry logic for SSL and transient errors
             def execute_update():
                 return self.google_service.service.users().update(
                     userKey=user_email,
                     body=update_body
-                ).execute()
+                ).execute(http=http)
 
             self.retry_handler.execute_with_retry(execute_update)
 
@@ -418,6 +595,11 @@ class BatchProcessor:
         # Get user counts by status
         user_counts = self.user_cache_service.get_user_count(job_uuid)
 
+        return self._format_job_status(job, user_counts)
+
+    @staticmethod
+    def _format_job_status(job: BatchJob, user_counts: Dict[str, int]) -> Dict:
+        """Build the status dict of a loaded job from its user counts"""
         return {
             'job_uuid': job.job_uuid,
             'job_type': job.job_type,
@@ -448,21 +630,45 @@ class BatchProcessor:
         Returns:
             List of job status dicts
         """
-        jobs = self.db.query(BatchJob).order_by(
-            BatchJob.created_at.desc()
-        ).limit(limit).all()
+        return self.list_jobs(limit=limit)['jobs']
+
+    def list_jobs(self, limit: int = 50, before_id: Optional[int] = None) -> Dict:
+        """
+        Get one page of jobs, newest first, with their user status counts
+
+        Uses two queries whatever the page size: the page of jobs (keyset
+        paginated on the primary key) and one GROUP BY over cached_users for
+        all of them.
+
+        Args:
+            limit: Maximum number of jobs to return
+            before_id: Return jobs older than this cursor (next_before_id of the previous page)
+
+        Returns:
+            Dict with the job status dicts and next_before_id (None on the last page)
+        """
+        query = self.db.query(BatchJob)
+        if before_id is not None:
+            query = query.filter(BatchJob.id < before_id)
+        jobs = query.order_by(BatchJob.id.desc()).limit(limit).all()
+
+        # Group sync jobs and sync-all runs derive their counts from job counters, not cached_users
+        counter_job_types = ('group_sync', 'sync_all')
+        counted_uuids = [job.job_uuid for job in jobs if job.job_type not in counter_job_types]
+        counts_by_job = self.user_cache_service.get_user_counts(counted_uuids)
 
         result = []
         for job in jobs:
-            # Route to appropriate processor based on job type
-            if job.job_type == 'group_sync':
+            if job.job_type in counter_job_types:
                 from services.group_sync_processor import GroupSyncProcessor
-                processor = GroupSyncProcessor(self.db, self.google_service)
-                result.append(processor.get_job_status(job.job_uuid))
+                result.append(GroupSyncProcessor.format_job_status(job))
             else:
-                result.append(self.get_job_status(job.job_uuid))
+                result.append(self._format_job_status(job, counts_by_job[job.job_uuid]))
 
-        return result
+        return {
+            'jobs': result,
+            'next_before_id': jobs[-1].id if len(jobs) == limit else None
+        }
 
     def get_failed_users(self, job_uuid: str) -> List[Dict]:
         """
@@ -0,0 +1,373 @@
+"""
+Incremental local mirror of the Google Workspace directory
+Syncs every user once, then refreshes by comparing per-user etags or applying users().watch notifications
+"""
+import os
+import json
+import uuid
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+from sqlalchemy.orm import Session
+
+from database.models import DirectoryUser, DirectoryMirrorState
+from services.google_workspace import GoogleWorkspaceService
+from services.lease import check_lease
+
+# Only one full sync / delta refresh runs at a time, whichever job triggers it
+_refresh_lock = threading.Lock()
+
+
+class DirectoryMirror:
+    """Keeps the directory_users table in step with the tenant, touching only changed users"""
+
+    # Fields mirrored per user: what group syncs and alias extraction read, plus the etag
+    MIRROR_USER_FIELDS = 'id,etag,primaryEmail,name/fullName,orgUnitPath,aliases'
+    # Partial response for delta refreshes: enough to detect changes without downloading profiles
+    ETAG_FIELDS = 'id,etag'
+    FETCH_CHUNK_SIZE = 500  # Changed users fetched (via HTTP batch) per round
+    DB_CHUNK_SIZE = 500  # Mirror rows compared or deleted per query (keeps IN lists under SQLite's limit)
+
+    def __init__(self, db: Session, google_service: GoogleWorkspaceService,
+                 cancel_event: Optional[threading.Event] = None):
+        self.db = db
+        self.google_service = google_service
+        # Set by JobWorker when a refresh task's lease is lost; checked before each page and chunk
+        self.cancel_event = cancel_event
+
+    @staticmethod
+    def is_enabled() -> bool:
+        """Check if jobs should read users from the mirror (DIRECTORY_MIRROR_ENABLED)"""
+        return os.getenv("DIRECTORY_MIRROR_ENABLED", "false").lower() in ("1", "true", "yes")
+
+    def get_state(self) -> DirectoryMirrorState:
+        """Get the mirror bookkeeping row, creating it on first use"""
+        state = self.db.query(DirectoryMirrorState).first()
+        if not state:
+            state = DirectoryMirrorState(total_users=0, notifications_applied=0)
+            self.db.add(state)
+            self.db.commit()
+        return state
+
+    def ensure_fresh(self, max_age_seconds: Optional[float] = None) -> DirectoryMirrorState:
+        """
+        Refresh the mirror if it was never synced or is older than max_age_seconds
+
+        Args:
+            max_age_seconds: Maximum accepted age; defaults to DIRECTORY_MIRROR_MAX_AGE_SECONDS (900)
+
+        Returns:
+            The mirror state after any refresh
+        """
+        if max_age_seconds is None:
+            max_age_seconds = float(os.getenv("DIRECTORY_MIRROR_MAX_AGE_SECONDS", 900))
+
+        with _refresh_lock:
+            state = self.get_state()
+            self.db.refresh(state)  # Another thread may have refreshed while we waited
+
+            if state.last_full_sync_at is None:
+                self._full_sync(state)
+            elif datetime.utcnow() - state.last_refresh_at > timedelta(seconds=max_age_seconds):
+                self._delta_refresh(state)
+
+            return state
+
+    def full_sync(self) -> Dict:
+        """Rebuild the mirror from a complete users().list sweep"""
+        with _refresh_lock:
+            return self._full_sync(self.get_state())
+
+    def refresh(self) -> Dict:
+        """Bring the mirror up to date, falling back to a full sync if it was never built"""
+        with _refresh_lock:
+            state = self.get_state()
+            if state.last_full_sync_at is None:
+                return self._full_sync(state)
+            return self._delta_refresh(state)
+
+    def _full_sync(self, state: DirectoryMirrorState) -> Dict:
+        print("[DirectoryMirror] Starting full directory sync...")
+        seen = set()
+        stats = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+
+        for page_users in self.google_service.iter_user_pages(user_fields=self.MIRROR_USER_FIELDS):
+            check_lease(self.cancel_event)
+            etags = self._stored_etags([user['id'] for user in page_users])
+            changed = []
+            for user in page_users:
+                seen.add(user['id'])
+                if user['id'] in etags and etags[user['id']] == user.get('etag'):
+                    stats['unchanged'] += 1
+                else:
+                    changed.append(user)
+
+            rows = self._rows_by_id([user['id'] for user in changed if user['id'] in etags])
+            for user in changed:
+                stats['added' if user['id'] not in etags else 'updated'] += 1
+                self._apply_user(user, rows.get(user['id']))
+
+            # Commit page by page so a large sweep does not hold one huge transaction
+            self.db.commit()
+
+        stats['removed'] = self._remove_missing(seen)
+        state.last_full_sync_at = datetime.utcnow()
+        return self._finish_refresh(state, stats)
+
+    def _delta_refresh(self, state: DirectoryMirrorState) -> Dict:
+        """
+        List only (id, etag) pairs and re-fetch the users whose etag changed
+
+        users().list has no changed-since filter, so the etag listing still
+        covers the tenant; users().watch notifications are the per-change
+        path. Stored etags are compared one page at a time, and only the
+        changed users' rows are loaded, so memory grows with the number of
+        changes (plus the set of listed ids), not with the mirror's size.
+        """
+        print("[DirectoryMirror] Starting etag delta refresh...")
+        seen = set()
+        changed_ids = []
+        known_ids = set()
+        stats = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+
+        for page_users in self.google_service.iter_user_pages(user_fields=self.ETAG_FIELDS, order_by=None):
+            check_lease(self.cancel_event)
+            etags = self._stored_etags([user['id'] for user in page_users])
+            for user in page_users:
+                seen.add(user['id'])
+                if user['id'] in etags and etags[user['id']] == user.get('etag'):
+                    stats['unchanged'] += 1
+                else:
+                    changed_ids.append(user['id'])
+                    if user['id'] in etags:
+                        known_ids.add(user['id'])
+
+        for start in range(0, len(changed_ids), self.FETCH_CHUNK_SIZE):
+            chunk = changed_ids[start:start + self.FETCH_CHUNK_SIZE]
+            check_lease(self.cancel_event)
+            results = self.google_service.get_users_batch(chunk, user_fields=self.MIRROR_USER_FIELDS)
+            rows = self._rows_by_id([user_id for user_id in chunk if user_id in known_ids])
+
+            for user_id in chunk:
+                result = results[user_id]
+                if result['error'] is not None:
+                    # Leave the old row (or no row); the next refresh sees the etag mismatch again
+                    print(f"[DirectoryMirror] Could not fetch changed user {user_id}: {str(result['error'])}")
+                    continue
+                stats['added' if user_id not in known_ids else 'updated'] += 1
+                self._apply_user(result['response'], rows.get(user_id))
+
+            self.db.commit()
+
+        stats['removed'] = self._remove_missing(seen)
+        return self._finish_refresh(state, stats)
+
+    def _stored_etags(self, user_ids: List[str]) -> Dict[str, Optional[str]]:
+        """Mirrored etags of the given users (one users().list page at most)"""
+        etags = {}
+        for start in range(0, len(user_ids), self.DB_CHUNK_SIZE):
+            chunk = user_ids[start:start + self.DB_CHUNK_SIZE]
+            etags.update(self.db.query(DirectoryUser.user_id, DirectoryUser.etag)
+                         .filter(DirectoryUser.user_id.in_(chunk)).all())
+        return etags
+
+    def _rows_by_id(self, user_ids: List[str]) -> Dict[str, DirectoryUser]:
+        """Mirror rows of the given users, for updating in place"""
+        rows = {}
+        for start in range(0, len(user_ids), self.DB_CHUNK_SIZE):
+            chunk = user_ids[start:start + self.DB_CHUNK_SIZE]
+            rows.update((row.user_id, row) for row in
+                        self.db.query(DirectoryUser).filter(DirectoryUser.user_id.in_(chunk)).all())
+        return rows
+
+    def _finish_refresh(self, state: DirectoryMirrorState, stats: Dict) -> Dict:
+        state.total_users = self.db.query(DirectoryUser).count()
+        state.last_refresh_at = datetime.utcnow()
+        state.last_refresh_stats = json.dumps(stats)
+        self.db.commit()
+
+        print(f"[DirectoryMirror] Refresh complete: {stats['added']} added, {stats['updated']} updated, "
+              f"{stats['removed']} removed, {stats['unchanged']} unchanged")
+        return stats
+
+    def _apply_user(self, user: Dict, row: Optional[DirectoryUser] = None) -> DirectoryUser:
+        """Insert or update the mirror row of a user resource (row=None inserts a new one)"""
+        if row is None:
+            row = DirectoryUser(user_id=user['id'])
+            self.db.add(row)
+
+        row.email = user.get('primaryEmail', '')
+        row.org_unit_path = user.get('orgUnitPath', '/') or '/'
+        row.etag = user.get('etag')
+        row.aliases = json.dumps(user.get('aliases', []))
+        row.user_data = json.dumps(user)
+        row.synced_at = datetime.utcnow()
+        return row
+
+    def _remove_missing(self, seen: set) -> int:
+        """Delete mirror rows for users no longer returned by the API, walking the table in id chunks"""
+        removed = 0
+        last_id = None
+        while True:
+            check_lease(self.cancel_event)
+            query = self.db.query(DirectoryUser.user_id).order_by(DirectoryUser.user_id)
+            if last_id is not None:
+                query = query.filter(DirectoryUser.user_id > last_id)
+            user_ids = [user_id for (user_id,) in query.limit(self.DB_CHUNK_SIZE).all()]
+            if not user_ids:
+                break
+            last_id = user_ids[-1]
+
+            missing = [user_id for user_id in user_ids if user_id not in seen]
+            if missing:
+                self.db.query(DirectoryUser).filter(DirectoryUser.user_id.in_(missing)).delete(synchronize_session=False)
+                removed += len(missing)
+        self.db.commit()
+        return removed
+
+    def apply_notification(self, event: str, resource: Dict) -> str:
+        """
+        Apply one users().watch push notification to the mirror
+
+        Args:
+            event: Value of the X-Goog-Resource-State header (add, update, delete, undelete, makeAdmin)
+            resource: Notification body (a user resource with at least id or primaryEmail)
+
+        Returns:
+            What was done: 'removed', 'updated' or 'ignored'
+        """
+        user_key = resource.get('id') or resource.get('primaryEmail')
+        if not user_key or event == 'sync':
+            return 'ignored'
+
+        state = self.get_state()
+
+        if event == 'delete':
+            query = self.db.query(DirectoryUser)
+            if resource.get('id'):
+                query = query.filter(DirectoryUser.user_id == resource['id'])
+            else:
+                query = query.filter(DirectoryUser.email == resource['primaryEmail'])
+            query.delete(synchronize_session=False)
+            action = 'removed'
+        else:
+            # Notification bodies are partial; fetch the current resource
+            result = self.google_service.get_users_batch([user_key], user_fields=self.MIRROR_USER_FIELDS)[user_key]
+            if result['error'] is not None:
+                raise Exception(f"Could not fetch notified user {user_key}: {str(result['error'])}")
+            user = result['response']
+            row = self.db.query(DirectoryUser).filter(DirectoryUser.user_id == user['id']).first()
+            self._apply_user(user, row)
+            action = 'updated'
+
+        state.notifications_applied = (state.notifications_applied or 0) + 1
+        self.db.commit()
+        return action
+
+    def start_watch(self, address: str, ttl_seconds: Optional[int] = None) -> Dict:
+        """
+        Register a users().watch channel that pushes changes to address
+
+        Replaces any channel opened before.
+        """
+        self.stop_watch()
+
+        ttl_seconds = ttl_seconds or int(os.getenv("DIRECTORY_WATCH_TTL_SECONDS", 21600))
+        channel_id = str(uuid.uuid4())
+        token = uuid.uuid4().hex
+        channel = self.google_service.watch_users(address, channel_id, token, ttl_seconds)
+
+        state = self.get_state()
+        state.watch_channel_id = channel_id
+        state.watch_resource_id = channel.get('resourceId')
+        state.watch_token = token
+        expiration = channel.get('expiration')
+        state.watch_expiration = datetime.utcfromtimestamp(int(expiration) / 1000) if expiration else None
+        self.db.commit()
+
+        return {
+            'channel_id': channel_id,
+            'resource_id': state.watch_resource_id,
+            'expiration': state.watch_expiration.isoformat() if state.watch_expiration else None
+        }
+
+    def stop_watch(self) -> bool:
+        """Stop the active watch channel, if any"""
+        state = self.get_state()
+        if not state.watch_channel_id:
+            return False
+
+        try:
+            self.google_service.stop_channel(state.watch_channel_id, state.watch_resource_id)
+        except Exception as e:
+            print(f"[DirectoryMirror] Could not stop watch channel {state.watch_channel_id}: {str(e)}")
+
+        state.watch_channel_id = None
+        state.watch_resource_id = None
+        state.watch_token = None
+        state.watch_expiration = None
+        self.db.commit()
+        return True
+
+    def verify_channel(self, channel_id: Optional[str], token: Optional[str]) -> bool:
+        """Check that a notification belongs to the active watch channel"""
+        state = self.get_state()
+        return bool(state.watch_channel_id) and channel_id == state.watch_channel_id and token == state.watch_token
+
+    def get_users_in_ou(self, ou_path: str) -> List[Dict]:
+        """
+        Get users in an OU and its sub-OUs from the mirror
+
+        Returns:
+            List of dicts shaped like GoogleWorkspaceService.get_users_in_ou
+        """
+        query = self.db.query(DirectoryUser)
+        if ou_path.rstrip('/'):
+            prefix = ou_path.rstrip('/')
+            query = query.filter(
+                (DirectoryUser.org_unit_path == prefix)
+                | DirectoryUser.org_unit_path.like(prefix.replace('%', r'\%').replace('_', r'\_') + '/%', escape='\\')
+            )
+
+        users = []
+        for row in query.all():
+            user = json.loads(row.user_data) if row.user_data else {}
+            users.append({
+                'email': row.email,
+                'name': user.get('name', {}).get('fullName', ''),
+                'orgUnitPath': row.org_unit_path
+            })
+        return users
+
+    def iter_user_pages(self, page_size: int = 500) -> Iterator[List[Dict]]:
+        """
+        Yield mirrored user resources in pages ordered by email
+
+        Same shape as GoogleWorkspaceService.iter_user_pages, so it can feed
+        extract_aliases_streaming without touching the API.
+        """
+        last_email = None
+        while True:
+            query = self.db.query(DirectoryUser).order_by(DirectoryUser.email)
+            if last_email is not None:
+                query = query.filter(DirectoryUser.email > last_email)
+            rows = query.limit(page_size).all()
+            if not rows:
+                break
+
+            yield [json.loads(row.user_data) for row in rows]
+            last_email = rows[-1].email
+
+    def get_stats(self) -> Dict:
+        """Get mirror size, freshness and watch channel state"""
+        state = self.get_state()
+        return {
+            'enabled': self.is_enabled(),
+            'total_users': state.total_users or 0,
+            'last_full_sync_at': state.last_full_sync_at.isoformat() if state.last_full_sync_at else None,
+            'last_refresh_at': state.last_refresh_at.isoformat() if state.last_refresh_at else None,
+            'last_refresh_stats': json.loads(state.last_refresh_stats) if state.last_refresh_stats else None,
+            'watch_active': bool(state.watch_channel_id),
+            'watch_expiration': state.watch_expiration.isoformat() if state.watch_expiration else None,
+            'notifications_applied': state.notifications_applied or 0
+        }
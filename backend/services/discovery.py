@@ -0,0 +1,140 @@
+"""
+Directory API discovery document loading
+Resolves the discovery JSON from memory, a disk cache or the copy vendored with googleapiclient, never the network at startup
+"""
+import os
+import glob
+import json
+import time
+import threading
+from typing import Dict, Optional
+
+from googleapiclient.version import __version__ as googleapiclient_version
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+SERVICE_NAME = 'admin'
+SERVICE_VERSION = 'directory_v1'
+
+_document: Optional[Dict] = None
+_document_source: Optional[str] = None
+_load_seconds: Optional[float] = None
+_lock = threading.Lock()
+
+
+def _cache_path() -> str:
+    """
+    Disk cache file, under DISCOVERY_CACHE_DIR (default ./data/discovery)
+
+    Named after the googleapiclient version, so upgrading the library
+    starts a new cache from the document it vendors instead of reading
+    the copy the previous version wrote.
+    """
+    cache_dir = os.getenv("DISCOVERY_CACHE_DIR", "./data/discovery")
+    return os.path.join(cache_dir, f"{SERVICE_NAME}.{SERVICE_VERSION}.{googleapiclient_version}.json")
+
+
+def _remove_stale_caches(path: str) -> None:
+    """Delete cache files written by other googleapiclient versions"""
+    pattern = os.path.join(os.path.dirname(path) or '.', f"{SERVICE_NAME}.{SERVICE_VERSION}.*json")
+    for stale_path in glob.glob(pattern):
+        if stale_path != path:
+            try:
+                os.remove(stale_path)
+            except OSError as e:
+                print(f"[Discovery] Could not remove stale discovery cache {stale_path}: {str(e)}")
+
+
+def _read_cache(path: str) -> Optional[Dict]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        # A truncated or unreadable cache is rebuilt from the vendored copy
+        print(f"[Discovery] Ignoring unreadable discovery cache {path}: {str(e)}")
+        return None
+
+
+def _write_cache(path: str, content: str) -> None:
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(temp_path, path)  # Readers never see a half-written file
+    except OSError as e:
+        print(f"[Discovery] Could not write discovery cache {path}: {str(e)}")
+
+
+def load_discovery_document() -> Dict:
+    """
+    Get the parsed Directory API discovery document, loading it once per process
+
+    Lookup order: memory, the disk cache, then the document vendored with
+    googleapiclient (written to the disk cache for the next start). The
+    cache is per googleapiclient version, so a library upgrade replaces
+    it; dropping a newer document into the current cache file pins it
+    without a code change.
+
+    Returns:
+        Parsed discovery document
+    """
+    global _document, _document_source, _load_seconds
+
+    with _lock:
+        if _document is not None:
+            return _document
+
+        start = time.monotonic()
+        path = _cache_path()
+        document = _read_cache(path)
+        source = 'disk_cache'
+
+        if document is None:
+            content = get_static_doc(SERVICE_NAME, SERVICE_VERSION)
+            if content is None:
+                raise Exception(f"No vendored discovery document for {SERVICE_NAME} {SERVICE_VERSION}")
+            document = json.loads(content)
+            source = 'vendored'
+            _write_cache(path, content)
+            _remove_stale_caches(path)
+
+        _document = document
+        _document_source = source
+        _load_seconds = time.monotonic() - start
+        print(f"[Discovery] Loaded {SERVICE_NAME} {SERVICE_VERSION} discovery document from {source} "
+              f"in {_load_seconds * 1000:.0f}ms")
+        return _document
+
+
+def build_directory_service(credentials):
+    """
+    Build an Admin SDK Directory API client without fetching discovery over the network
+
+    Args:
+        credentials: google.auth credentials the client is bound to
+
+    Returns:
+        googleapiclient Resource for admin directory_v1
+    """
+    try:
+        document = load_discovery_document()
+    except Exception as e:
+        # Last resort only: fetches the document from the discovery service
+        print(f"[Discovery] {str(e)}; fetching discovery document over the network")
+        return build(SERVICE_NAME, SERVICE_VERSION, credentials=credentials, static_discovery=False, cache_discovery=False)
+
+    return build_from_document(document, credentials=credentials)
+
+
+def get_discovery_stats() -> Dict:
+    """Get where the discovery document came from and how long loading took"""
+    return {
+        'loaded': _document is not None,
+        'source': _document_source,
+        'load_ms': round(_load_seconds * 1000, 1) if _load_seconds is not None else None,
+        'cache_path': _cache_path(),
+        'googleapiclient_version': googleapiclient_version
+    }
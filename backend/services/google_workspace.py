@@ -1,14 +1,25 @@
 import os
 import csv
 import json
+import threading
 from datetime import datetime
 from typing import List, Dict, Optional
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google.oauth2 import service_account
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+import google_auth_httplib2
+
+from services.api_retry import APIRetryHandler
+from services.api_batch import BatchRequestExecutor
+from services.rate_limiter import get_rate_controller
+from services.ou_cache import get_ou_cache
+from services.user_index import TenantUserIndex
+from services.page_prefetch import iter_pages
+from services.http_pool import get_http_pool
+from services.lease import LeaseLost
+from services.discovery import build_directory_service
 
 SCOPES = [
     'https://www.googleapis.com/auth/admin.directory.user',  # Read/Write users
@@ -16,6 +27,108 @@ SCOPES = [
     'https://www.googleapis.com/auth/admin.directory.group'  # Read/Write groups
 ]
 
+# Partial-response field sets for user resources, one per use case.
+# Call sites pass these as user_fields so users().list only returns what they read.
+ALIAS_USER_FIELDS = 'primaryEmail,aliases'
+MEMBERSHIP_USER_FIELDS = 'primaryEmail,orgUnitPath'
+OU_MEMBER_USER_FIELDS = 'primaryEmail,name/fullName,orgUnitPath'
+
+
+def users_list_fields(user_fields: Optional[str]) -> Optional[str]:
+    """
+    Build the fields= mask for a users().list call
+
+    Args:
+        user_fields: Comma-separated fields of each user resource, or None for the whole resource
+
+    Returns:
+        Mask keeping nextPageToken (needed for paging) and the given user fields, or None
+    """
+    if not user_fields:
+        return None
+    return f'nextPageToken,users({user_fields})'
+
+
+def _with_field(user_fields: Optional[str], field: str) -> Optional[str]:
+    """Add a field a method depends on (e.g. orgUnitPath for OU filtering) to a field set"""
+    if not user_fields or field in user_fields.split(','):
+        return user_fields
+    return f'{user_fields},{field}'
+
+
+# Attributes stored inside the user's primary organization, mapped to the organization field
+ORGANIZATION_ATTRIBUTES = {
+    'title': 'title',
+    'department': 'department',
+    'employeeType': 'type',
+    'costCenter': 'costCenter'
+}
+
+
+def build_attribute_update(attribute: str, value: str, existing_orgs: Optional[List[Dict]] = None) -> Dict:
+    """
+    Build the users().update body that sets one attribute
+
+    Args:
+        attribute: Attribute name (organization field, buildingId, manager or a top-level field)
+        value: Value to set
+        existing_orgs: The user's current organizations, for organization attributes
+
+    Returns:
+        Update body
+    """
+    # Handle complex organization attributes
+    if attribute in ORGANIZATION_ATTRIBUTES:
+        # Get existing organizations or create new one
+        existing_orgs = existing_orgs or [{}]
+
+        # Update the primary organization (first one)
+        org = existing_orgs[0]
+        org[ORGANIZATION_ATTRIBUTES[attribute]] = value
+        org['primary'] = True
+
+        return {'organizations': existing_orgs}
+
+    if attribute == 'buildingId':
+        # Handle location/building
+        return {
+            'locations': [{
+                'type': 'desk',
+                'area': 'desk',
+                'buildingId': value
+            }]
+        }
+
+    if attribute == 'manager':
+        # Handle manager as relation
+        return {
+            'relations': [{
+                'type': 'manager',
+                'value': value
+            }]
+        }
+
+    # For any other standard attribute, use directly
+    return {attribute: value}
+
+
+def new_alias_export_path() -> str:
+    """Get a timestamped CSV path in ./exports for an alias extraction"""
+    exports_dir = './exports'
+    os.makedirs(exports_dir, exist_ok=True)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return os.path.join(exports_dir, f'google_workspace_aliases_{timestamp}.csv')
+
+
+def format_org_unit(org_unit: Dict) -> Dict:
+    """Map an orgunits().list resource to the shape returned to the frontend"""
+    return {
+        'name': org_unit.get('name'),
+        'path': org_unit.get('orgUnitPath'),
+        'parent_path': org_unit.get('parentOrgUnitPath'),
+        'description': org_unit.get('description', '')
+    }
+
 
 class GoogleWorkspaceService:
     """Service to interact with Google Workspace Admin SDK"""
@@ -27,6 +140,7 @@ class GoogleWorkspaceService:
         self.creds: Optional[Credentials] = None
         self.service = None
         self.auth_type = None  # 'oauth' or 'service_account'
+        self._thread_local = threading.local()  # Per-thread HTTP transports for worker pools
 
         # Detect credential type
         if os.path.exists(credentials_path):
@@ -47,7 +161,7 @@ class GoogleWorkspaceService:
                 self._save_credentials()
 
             if self.creds and self.creds.valid:
-                self.service = build('admin', 'directory_v1', credentials=self.creds)
+                self.service = build_directory_service(self.creds)
 
         # Auto-authenticate with service account if available
         elif self.auth_type == 'service_account' and delegated_admin_email:
@@ -76,7 +190,7 @@ class GoogleWorkspaceService:
             )
             self._save_credentials()
 
-            self.service = build('admin', 'directory_v1', credentials=self.creds)
+            self.service = build_directory_service(self.creds)
             self.auth_type = 'oauth'
 
         except Exception as e:
@@ -102,7 +216,7 @@ class GoogleWorkspaceService:
             self.delegated_admin_email = delegated_admin_email
 
             # Build service
-            self.service = build('admin', 'directory_v1', credentials=self.creds)
+            self.service = build_directory_service(self.creds)
             self.auth_type = 'service_account'
 
         except Exception as e:
@@ -123,6 +237,69 @@ class GoogleWorkspaceService:
         # OAuth credentials need to check validity
         return self.creds.valid
 
+    def get_thread_http(self) -> google_auth_httplib2.AuthorizedHttp:
+        """
+        Get an authorized HTTP transport owned by the calling thread
+
+        httplib2 connections are not thread-safe, so worker threads must pass
+        their own transport to request.execute(http=...) instead of sharing
+        the one bound to self.service. The underlying connection is leased
+        from the process-wide pool, so its keep-alive sockets outlive this
+        service instance and are reused by later jobs.
+        """
+        if not self.is_authenticated():
+            raise Exception("Not authenticated")
+
+        raw_http = get_http_pool().get()
+        http = getattr(self._thread_local, 'http', None)
+        if http is None or http.credentials is not self.creds or http.http is not raw_http:
+            http = google_auth_httplib2.AuthorizedHttp(self.creds, http=raw_http)
+            self._thread_local.http = http
+        return http
+
+    def execute_request(self, request, http=None):
+        """
+        Execute an API request paced by the shared adaptive rate controller
+
+        Waits for the controller before sending and reports the outcome back,
+        so throttling responses slow down every processor in the process.
+
+        Args:
+            request: googleapiclient HttpRequest to execute
+            http: Optional HTTP transport; defaults to the calling thread's own transport
+                so background jobs running in parallel never share a connection
+
+        Returns:
+            The API response
+        """
+        rate_controller = get_rate_controller()
+        rate_controller.acquire()
+
+        try:
+            result = request.execute(http=http or self.get_thread_http())
+        except HttpError as error:
+            if APIRetryHandler.is_rate_limit_error(error):
+                rate_controller.on_throttle()
+            raise
+
+        rate_controller.on_success()
+        return result
+
+    def new_batch_request(self, callback=None):
+        """
+        Create an HTTP batch request for the Directory API
+
+        Args:
+            callback: Function(request_id, response, exception) called per sub-request
+
+        Returns:
+            BatchHttpRequest bound to the Directory API batch endpoint
+        """
+        if not self.is_authenticated():
+            raise Exception("Not authenticated")
+
+        return self.service.new_batch_http_request(callback=callback)
+
     def get_admin_info(self) -> Dict[str, str]:
         """Get information about the authenticated admin"""
         if not self.is_authenticated():
@@ -163,11 +340,12 @@ class GoogleWorkspaceService:
             if not email:
                 try:
                     # Get the customer ID first
-                    results = self.service.users().list(
+                    results = self.execute_request(self.service.users().list(
                         customer='my_customer',
                         maxResults=1,
-                        orderBy='email'
-                    ).execute()
+                        orderBy='email',
+                        fields=users_list_fields('primaryEmail')
+                    ))
 
                     users = results.get('users', [])
                     if users:
@@ -201,38 +379,82 @@ class GoogleWorkspaceService:
                 "domain": "Connected"
             }
 
-    def get_all_users(self) -> List[Dict]:
-        """Retrieve all users from Google Workspace"""
+    def get_all_users(self, user_fields: Optional[str] = None) -> List[Dict]:
+        """
+        Retrieve all users from Google Workspace
+
+        Args:
+            user_fields: Optional partial-response field set (e.g. ALIAS_USER_FIELDS)
+        """
         if not self.is_authenticated():
             raise Exception("Not authenticated")
 
         users = []
-        page_token = None
-        max_results = int(os.getenv("MAX_RESULTS_PER_PAGE", 500))
 
         try:
-            while True:
-                results = self.service.users().list(
-                    customer='my_customer',
-                    maxResults=max_results,
-                    orderBy='email',
-                    pageToken=page_token
-                ).execute()
-
-                users.extend(results.get('users', []))
-
-                page_token = results.get('nextPageToken')
-                if not page_token:
-                    break
+            for page_users in self.iter_user_pages(user_fields=user_fields):
+                users.extend(page_users)
 
             return users
 
         except HttpError as error:
             raise Exception(f"Failed to retrieve users: {error}")
 
+    def iter_user_pages(
+        self,
+        projection: str = 'basic',
+        user_fields: Optional[str] = None,
+        query: Optional[str] = None,
+        order_by: Optional[str] = 'email',
+        start_page_token: Optional[str] = None,
+        with_page_tokens: bool = False
+    ):
+        """
+        Yield the tenant's users one users().list page at a time
+
+        Args:
+            projection: Directory API projection ('basic' or 'full')
+            user_fields: Optional partial-response field set of each user (e.g. 'id,etag');
+                sent as a fields= mask so the API returns only those fields
+            query: Optional users().list search query (e.g. "orgUnitPath='/Sales'")
+            order_by: Sort field, or None for the API's default order
+            start_page_token: nextPageToken to resume from (as yielded with with_page_tokens)
+            with_page_tokens: Yield (users, next_page_token) tuples instead of user lists,
+                so callers can checkpoint their position
+
+        Returns:
+            Iterator over lists of user resources; following pages are prefetched in the background
+        """
+        if not self.is_authenticated():
+            raise Exception("Not authenticated")
+
+        fields = users_list_fields(user_fields)
+
+        def fetch_page(page_token):
+            params = {
+                'customer': 'my_customer',
+                'maxResults': int(os.getenv("MAX_RESULTS_PER_PAGE", 500)),
+                'projection': projection
+            }
+            if order_by:
+                params['orderBy'] = order_by
+            if query:
+                params['query'] = query
+            if fields:
+                params['fields'] = fields
+            if page_token:
+                params['pageToken'] = page_token
+
+            results = self.execute_request(self.service.users().list(**params))
+            users = results.get('users', [])
+            next_page_token = results.get('nextPageToken')
+            return ((users, next_page_token) if with_page_tokens else users), next_page_token
+
+        return iter_pages(fetch_page, start_page_token=start_page_token)
+
     def extract_aliases_to_csv(self) -> Dict:
         """Extract all users with aliases and save to CSV"""
-        users = self.get_all_users()
+        users = self.get_all_users(user_fields=ALIAS_USER_FIELDS)
 
         # Prepare data
         users_with_aliases = []
@@ -250,14 +472,8 @@ class GoogleWorkspaceService:
                 users_with_aliases.append(user_data)
                 max_aliases = max(max_aliases, len(aliases))
 
-        # Create exports directory if it doesn't exist
-        exports_dir = './exports'
-        os.makedirs(exports_dir, exist_ok=True)
-
-        # Generate filename with timestamp
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'google_workspace_aliases_{timestamp}.csv'
-        file_path = os.path.join(exports_dir, filename)
+        # Timestamped file in the exports directory
+        file_path = new_alias_export_path()
 
         # Write to CSV
         with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
@@ -288,14 +504,33 @@ class GoogleWorkspaceService:
             'max_aliases': max_aliases
         }
 
-    def extract_aliases_streaming(self, file_path: str, progress_callback=None) -> Dict:
+    def extract_aliases_streaming(self, file_path: str, progress_callback=None, user_pages=None, layout: Optional[str] = None,
+                                  resume: Optional[Dict] = None, checkpoint_callback=None) -> Dict:
         """
         Extract aliases with streaming CSV writing and progress tracking.
         Suitable for large environments (millions of users).
 
+        Rows are written as pages arrive, so memory stays flat regardless of
+        tenant size. The 'wide' layout (one column per alias) spills rows to a
+        temp file next to the output, then copies them into the final CSV once
+        the widest row, and so the header, is known. The 'long' layout writes
+        one (email, alias) row per alias in a single pass.
+
+        When reading from the API with a checkpoint_callback, the output is
+        flushed every ALIAS_CHECKPOINT_PAGES pages (default 10) and the callback
+        receives the nextPageToken, the output offset and the counters so far.
+        Passing that dict back as resume cuts the output back to the offset and
+        continues from the token; the partial output is kept on failure for
+        that purpose. A resume token the API no longer accepts starts over.
+
         Args:
             file_path: Path where CSV should be written
             progress_callback: Optional callback function(total, processed, users_with_aliases)
+            user_pages: Optional iterable of user pages to read instead of the API
+                (e.g. DirectoryMirror.iter_user_pages())
+            layout: 'wide' or 'long'; defaults to ALIAS_EXPORT_LAYOUT (wide)
+            resume: Optional checkpoint, as passed to checkpoint_callback, to continue from
+            checkpoint_callback: Optional callback function(checkpoint)
 
         Returns:
             Dict with extraction stats
@@ -303,92 +538,121 @@ class GoogleWorkspaceService:
         if not self.is_authenticated():
             raise Exception("Not authenticated")
 
-        import time
-
-        total_users = 0
-        users_with_aliases_count = 0
-        page_token = None
-        max_results = int(os.getenv("MAX_RESULTS_PER_PAGE", 500))
-        max_alias_columns = 0
+        layout = (layout or os.getenv("ALIAS_EXPORT_LAYOUT", "wide")).lower()
+        if layout not in ('wide', 'long'):
+            raise Exception(f"Unknown alias export layout: {layout}")
 
-        # Track all users with aliases for dynamic column sizing
-        # We'll do two passes: first to determine max aliases, second to write
-        # For very large datasets, we could skip this and use a fixed number
-        temp_users = []
+        checkpointing = user_pages is None and checkpoint_callback is not None
+        checkpoint_pages = max(1, int(os.getenv("ALIAS_CHECKPOINT_PAGES", 10)))
 
-        try:
-            # First pass: collect users and determine max alias count
-            print(f"Starting alias extraction (streaming mode)...")
+        # Ensure directory exists
+        output_dir = os.path.dirname(file_path) or '.'
+        os.makedirs(output_dir, exist_ok=True)
 
-            while True:
-                try:
-                    results = self.service.users().list(
-                        customer='my_customer',
-                        maxResults=max_results,
-                        orderBy='email',
-                        pageToken=page_token
-                    ).execute()
+        # Wide layout: ragged rows go to a spill file until the header width is known
+        write_path = file_path if layout == 'long' else file_path + '.partial'
 
-                    page_users = results.get('users', [])
+        if resume and (not checkpointing or resume.get('layout') != layout
+                       or not os.path.exists(write_path) or os.path.getsize(write_path) < resume['output_offset']):
+            print("Alias extraction checkpoint does not match the partial output, starting over")
+            resume = None
 
-                    for user in page_users:
-                        total_users += 1
-                        aliases = user.get('aliases', [])
+        total_users = resume['total_users'] if resume else 0
+        users_with_aliases_count = resume['users_with_aliases'] if resume else 0
+        max_alias_columns = resume['max_aliases'] if resume else 0
+        stale_resume = False
 
-                        if aliases:
-                            users_with_aliases_count += 1
-                            temp_users.append({
-                                'email': user.get('primaryEmail', ''),
-                                'aliases': aliases
+        try:
+            if resume:
+                print(f"Resuming alias extraction after {total_users} users ({layout} layout)...")
+            else:
+                print(f"Starting alias extraction (streaming mode, {layout} layout)...")
+
+            if user_pages is None:
+                pages = self.iter_user_pages(
+                    user_fields=ALIAS_USER_FIELDS,
+                    start_page_token=resume['page_token'] if resume else None,
+                    with_page_tokens=True
+                )
+            else:
+                pages = ((page_users, None) for page_users in user_pages)
+
+            with open(write_path, 'r+' if resume else 'w', newline='', encoding='utf-8') as outfile:
+                if resume:
+                    # Drop anything written after the checkpoint; those pages are fetched again
+                    outfile.seek(resume['output_offset'])
+                    outfile.truncate()
+
+                writer = csv.writer(outfile)
+                if layout == 'long' and not resume:
+                    writer.writerow(['Current Email', 'Alias'])
+
+                pages_read = 0
+                try:
+                    for page_users, next_page_token in pages:
+                        pages_read += 1
+                        for user in page_users:
+                            total_users += 1
+                            aliases = user.get('aliases', [])
+
+                            if aliases:
+                                users_with_aliases_count += 1
+                                max_alias_columns = max(max_alias_columns, len(aliases))
+                                email = user.get('primaryEmail', '')
+
+                                if layout == 'long':
+                                    writer.writerows([email, alias] for alias in aliases)
+                                else:
+                                    writer.writerow([email] + aliases)
+
+                            # Progress callback every 100 users
+                            if progress_callback and total_users % 100 == 0:
+                                progress_callback(total_users, total_users, users_with_aliases_count)
+
+                        if checkpointing and next_page_token and pages_read % checkpoint_pages == 0:
+                            outfile.flush()
+                            checkpoint_callback({
+                                'page_token': next_page_token,
+                                'output_offset': outfile.tell(),
+                                'layout': layout,
+                                'total_users': total_users,
+                                'users_with_aliases': users_with_aliases_count,
+                                'max_aliases': max_alias_columns
                             })
-                            max_alias_columns = max(max_alias_columns, len(aliases))
-
-                        # Progress callback every 100 users
-                        if progress_callback and total_users % 100 == 0:
-                            progress_callback(total_users, total_users, users_with_aliases_count)
-
-                    page_token = results.get('nextPageToken')
-                    if not page_token:
-                        break
-
-                    # Rate limiting: 33ms delay between API calls (~30 calls/sec)
-                    time.sleep(0.033)
 
                 except HttpError as error:
-                    raise Exception(f"Failed to retrieve users: {error}")
+                    if not (resume and pages_read == 0 and error.resp.status == 400):
+                        raise Exception(f"Failed to retrieve users: {error}")
+                    stale_resume = True
+
+            if stale_resume:
+                # Page tokens expire; the checkpoint is unusable
+                print("Alias extraction checkpoint page token was rejected, starting over")
+                return self.extract_aliases_streaming(
+                    file_path,
+                    progress_callback=progress_callback,
+                    layout=layout,
+                    checkpoint_callback=checkpoint_callback
+                )
 
             # Final progress update after collection
             if progress_callback:
                 progress_callback(total_users, total_users, users_with_aliases_count)
 
-            print(f"Collected {total_users} users, {users_with_aliases_count} with aliases")
-
-            # Second pass: write to CSV
-            print(f"Writing to CSV: {file_path}")
-
-            # Ensure directory exists
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            print(f"Streamed {total_users} users, {users_with_aliases_count} with aliases")
 
-            with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
-                # Create headers
-                headers = ['Current Email'] + [f'Alias {i+1}' for i in range(max_alias_columns)]
+            if layout == 'wide':
+                # Copy the spilled rows under the now-known header, padding each to full width
+                print(f"Writing to CSV: {file_path}")
+                with open(write_path, 'r', newline='', encoding='utf-8') as spillfile, \
+                        open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
+                    writer = csv.writer(csvfile)
+                    writer.writerow(['Current Email'] + [f'Alias {i+1}' for i in range(max_alias_columns)])
 
-                writer = csv.writer(csvfile)
-                writer.writerow(headers)
+                    for row in csv.reader(spillfile):
+                        writer.writerow(row + [''] * (max_alias_columns + 1 - len(row)))
 
-                # Write each user
-                for user_data in temp_users:
-                    row = [user_data['email']]
-                    aliases = user_data['aliases']
-
-                    # Add aliases
-                    for i in range(max_alias_columns):
-                        if i < len(aliases):
-                            row.append(aliases[i])
-                        else:
-                            row.append('')
-
-                    writer.writerow(row)
+                os.remove(write_path)
 
             print(f"CSV written successfully: {users_with_aliases_count} users with aliases")
 
@@ -396,10 +660,15 @@ class GoogleWorkspaceService:
                 'file_path': file_path,
                 'total_users': total_users,
                 'users_with_aliases': users_with_aliases_count,
-                'max_aliases': max_alias_columns
+                'max_aliases': max_alias_columns,
+                'layout': layout
             }
 
         except Exception as error:
+            if layout == 'wide' and not checkpointing and os.path.exists(write_path):
+                os.remove(write_path)
+            if isinstance(error, LeaseLost):
+                raise  # The job was re-queued; job handlers must see it unwrapped so they don't fail the job
             raise Exception(f"Failed to extract aliases: {error}")
 
     def get_organizational_units(self) -> List[Dict]:
@@ -409,18 +678,13 @@ class GoogleWorkspaceService:
 
         try:
             org_units = []
-            results = self.service.orgunits().list(
+            results = self.execute_request(self.service.orgunits().list(
                 customerId='my_customer',
                 type='all'
-            ).execute()
+            ))
 
             for org_unit in results.get('organizationUnits', []):
-                org_units.append({
-                    'name': org_unit.get('name'),
-                    'path': org_unit.get('orgUnitPath'),
-                    'parent_path': org_unit.get('parentOrgUnitPath'),
-                    'description': org_unit.get('description', '')
-                })
+                org_units.append(format_org_unit(org_unit))
 
             return org_units
 
@@ -437,71 +701,30 @@ class GoogleWorkspaceService:
             all_user_emails = []
             user_count_limit = 500  # Safety limit to prevent too large operations
 
+            users_by_ou = {}
+            fallback_ous = []
+
             for ou_path in ou_paths:
-                # Try to get users directly from the OU using orgUnitPath parameter
-                # This is more efficient than listing all users
-                page_token = None
-                users_found = 0
+                try:
+                    # Get users directly from the OU using orgUnitPath query filtering
+                    # (served from the shared OU cache when a fresh listing exists)
+                    users_by_ou[ou_path] = self.list_users_in_ou(ou_path, user_fields=MEMBERSHIP_USER_FIELDS)
+                except HttpError as e:
+                    # If query filtering doesn't work, fall back to listing all users
+                    # and filtering client-side (one sweep shared by every failing OU)
+                    print(f"Query filtering failed for {ou_path}, using client-side filtering: {e}")
+                    fallback_ous.append(ou_path)
+
+            if fallback_ous:
+                users_by_ou.update(self.list_users_in_ous_client_side(fallback_ous, user_fields=MEMBERSHIP_USER_FIELDS))
 
-                while True:
-                    try:
-                        # Try using query parameter with orgUnitPath
-                        # This approach works for some Google Workspace instances
-                        params = {
-                            'customer': 'my_customer',
-                            'maxResults': 100,  # Smaller batches for faster response
-                            'projection': 'basic',
-                            'query': f'orgUnitPath={ou_path}'  # Try direct OU filtering
-                        }
-                        if page_token:
-                            params['pageToken'] = page_token
-
-                        results = self.service.users().list(**params).execute()
-
-                        # Add all users from the result
-                        for user in results.get('users', []):
-                            all_user_emails.append(user.get('primaryEmail'))
-                            users_found += 1
-
-                            # Safety check
-                            if len(all_user_emails) >= user_count_limit:
-                                raise Exception(f"User limit reached ({user_count_limit}). Please select a smaller OU or contact support for batch processing.")
-
-                        page_token = results.get('nextPageToken')
-                        if not page_token:
-                            break
-
-                    except HttpError as e:
-                        # If query filtering doesn't work, fall back to listing all users
-                        # and filtering client-side (less efficient but works)
-                        print(f"Query filtering failed, using client-side filtering: {e}")
-
-                        page_token = None
-                        while True:
-                            params = {
-                                'customer': 'my_customer',
-                                'maxResults': 100,
-                                'projection': 'basic'
-                            }
-                            if page_token:
-                                params['pageToken'] = page_token
-
-                            results = self.service.users().list(**params).execute()
-
-                            # Filter users by OU path
-                            for user in results.get('users', []):
-                                user_ou = user.get('orgUnitPath', '')
-                                if user_ou == ou_path or user_ou.startswith(ou_path + '/'):
-                                    all_user_emails.append(user.get('primaryEmail'))
-                                    users_found += 1
-
-                                    if len(all_user_emails) >= user_count_limit:
-                                        raise Exception(f"User limit reached ({user_count_limit}). Please select a smaller OU or contact support for batch processing.")
-
-                            page_token = results.get('nextPageToken')
-                            if not page_token:
-                                break
-                        break  # Exit the outer while loop
+            for ou_path in ou_paths:
+                for user in users_by_ou[ou_path]:
+                    all_user_emails.append(user.get('primaryEmail'))
+
+                    # Safety check
+                    if len(all_user_emails) >= user_count_limit:
+                        raise Exception(f"User limit reached ({user_count_limit}). Please select a smaller OU or contact support for batch processing.")
 
             if len(all_user_emails) == 0:
                 return {
@@ -518,63 +741,25 @@ class GoogleWorkspaceService:
             # Update each user with the new attribute
             for user_email in all_user_emails:
                 try:
+                    existing_orgs = None
+
                     # Handle complex organization attributes
-                    if attribute in ['title', 'department', 'employeeType', 'costCenter']:
-                        # Fetch full user profile to get existing organizations
-                        user_full = self.service.users().get(
+                    if attribute in ORGANIZATION_ATTRIBUTES:
+                        # Fetch the user's existing organizations
+                        user_full = self.execute_request(self.service.users().get(
                             userKey=user_email,
-                            projection='full'
-                        ).execute()
-
-                        # Get existing organizations or create new one
+                            projection='full',
+                            fields='organizations'
+                        ))
                         existing_orgs = user_full.get('organizations', [])
-                        if not existing_orgs:
-                            existing_orgs = [{}]
-
-                        # Update the primary organization (first one)
-                        org = existing_orgs[0]
-
-                        # Map attribute to correct field
-                        field_mapping = {
-                            'title': 'title',
-                            'department': 'department',
-                            'employeeType': 'type',
-                            'costCenter': 'costCenter'
-                        }
-
-                        org[field_mapping[attribute]] = value
-                        org['primary'] = True
-
-                        update_body = {'organizations': existing_orgs}
-
-                    elif attribute == 'buildingId':
-                        # Handle location/building
-                        update_body = {
-                            'locations': [{
-                                'type': 'desk',
-                                'area': 'desk',
-                                'buildingId': value
-                            }]
-                        }
-
-                    elif attribute == 'manager':
-                        # Handle manager as relation
-                        update_body = {
-                            'relations': [{
-                                'type': 'manager',
-                                'value': value
-                            }]
-                        }
 
-                    else:
-                        # For any other standard attribute, use directly
-                        update_body = {attribute: value}
+                    update_body = build_attribute_update(attribute, value, existing_orgs)
 
                     # Update the user
-                    self.service.users().update(
+                    self.execute_request(self.service.users().update(
                         userKey=user_email,
                         body=update_body
-                    ).execute()
+                    ))
 
                     updated_count += 1
 
@@ -591,6 +776,10 @@ class GoogleWorkspaceService:
                         error_msg = error_msg[:200] + "..."
                     errors.append(f"{user_email}: {error_msg}")
 
+            # Cached listings of these OUs now hold stale attribute values
+            for ou_path in ou_paths:
+                get_ou_cache().invalidate(ou_path)
+
             return {
                 'total_users': len(all_user_emails),
                 'updated_count': updated_count,
@@ -628,7 +817,7 @@ class GoogleWorkspaceService:
                 'description': description
             }
 
-            result = self.service.groups().insert(body=group_body).execute()
+            result = self.execute_request(self.service.groups().insert(body=group_body))
             print(f"[GoogleWorkspaceService] Created group: {group_email}")
             return result
 
@@ -654,7 +843,7 @@ class GoogleWorkspaceService:
             raise Exception("Not authenticated")
 
         try:
-            result = self.service.groups().get(groupKey=group_email).execute()
+            result = self.execute_request(self.service.groups().get(groupKey=group_email))
             return result
         except HttpError as error:
             if error.resp.status == 404:
@@ -687,10 +876,10 @@ class GoogleWorkspaceService:
                 'role': role
             }
 
-            result = self.service.members().insert(
+            result = self.execute_request(self.service.members().insert(
                 groupKey=group_email,
                 body=member_body
-            ).execute()
+            ))
 
             return result
 
@@ -703,6 +892,103 @@ class GoogleWorkspaceService:
         except Exception as error:
             raise Exception(f"Failed to add member: {error}")
 
+    def add_group_members_batch(self, group_email: str, member_emails: List[str], role: str = 'MEMBER') -> Dict[str, Dict]:
+        """
+        Add many members to a Google Group using HTTP batch requests
+
+        Args:
+            group_email: Email address of the group
+            member_emails: Email addresses of the members to add
+            role: Role of the members ('MEMBER', 'MANAGER', 'OWNER')
+
+        Returns:
+            Dict mapping member email to {'email', 'status', 'error'} where status is
+            'added', 'already_exists' (HTTP 409) or 'failed'
+        """
+        def make_builder(member_email):
+            return lambda: self.service.members().insert(
+                groupKey=group_email,
+                body={'email': member_email, 'role': role}
+            )
+
+        return self._execute_membership_batch(
+            member_emails,
+            make_builder,
+            success_status='added',
+            tolerated_status=409,
+            tolerated_result='already_exists'
+        )
+
+    def remove_group_members_batch(self, group_email: str, member_emails: List[str]) -> Dict[str, Dict]:
+        """
+        Remove many members from a Google Group using HTTP batch requests
+
+        Args:
+            group_email: Email address of the group
+            member_emails: Email addresses of the members to remove
+
+        Returns:
+            Dict mapping member email to {'email', 'status', 'error'} where status is
+            'removed', 'not_found' (HTTP 404) or 'failed'
+        """
+        def make_builder(member_email):
+            return lambda: self.service.members().delete(
+                groupKey=group_email,
+                memberKey=member_email
+            )
+
+        return self._execute_membership_batch(
+            member_emails,
+            make_builder,
+            success_status='removed',
+            tolerated_status=404,
+            tolerated_result='not_found'
+        )
+
+    def _execute_membership_batch(
+        self,
+        member_emails: List[str],
+        make_builder,
+        success_status: str,
+        tolerated_status: int,
+        tolerated_result: str
+    ) -> Dict[str, Dict]:
+        """
+        Run membership mutations through BatchRequestExecutor and map per-item results
+
+        A tolerated HTTP status (409 on insert, 404 on delete) means the membership is
+        already in the desired state, so it is reported without failing the batch.
+        """
+        if not self.is_authenticated():
+            raise Exception("Not authenticated")
+
+        rate_controller = get_rate_controller()
+        executor = BatchRequestExecutor(
+            batch_factory=self.new_batch_request,
+            retry_handler=APIRetryHandler(max_retries=5, base_delay=1.0, rate_controller=rate_controller),
+            rate_controller=rate_controller,
+            http_factory=self.get_thread_http
+        )
+
+        # Sub-request IDs must be unique strings; use the position in the list
+        results = executor.execute([
+            (str(idx), make_builder(member_email))
+            for idx, member_email in enumerate(member_emails)
+        ])
+
+        outcome = {}
+        for idx, member_email in enumerate(member_emails):
+            error = results[str(idx)]['error']
+
+            if error is None:
+                outcome[member_email] = {'email': member_email, 'status': success_status, 'error': None}
+            elif isinstance(error, HttpError) and error.resp.status == tolerated_status:
+                outcome[member_email] = {'email': member_email, 'status': tolerated_result, 'error': None}
+            else:
+                outcome[member_email] = {'email': member_email, 'status': 'failed', 'error': str(error)}
+
+        return outcome
+
     def get_group_members(self, group_email: str) -> List[str]:
         """
         Get all members of a Google Group
@@ -716,24 +1002,22 @@ class GoogleWorkspaceService:
         if not self.is_authenticated():
             raise Exception("Not authenticated")
 
-        try:
-            members = []
-            page_token = None
+        def fetch_page(page_token):
+            params = {'groupKey': group_email, 'fields': 'nextPageToken,members(email)'}
+            if page_token:
+                params['pageToken'] = page_token
 
-            while True:
-                params = {'groupKey': group_email}
-                if page_token:
-                    params['pageToken'] = page_token
+            result = self.execute_request(self.service.members().list(**params))
+            return result.get('members', []), result.get('nextPageToken')
 
-                result = self.service.members().list(**params).execute()
+        try:
+            members = []
 
-                for member in result.get('members', []):
+            # Next pages are prefetched while the current one is collected
+            for page_members in iter_pages(fetch_page):
+                for member in page_members:
                     members.append(member.get('email'))
 
-                page_token = result.get('nextPageToken')
-                if not page_token:
-                    break
-
             return members
 
         except HttpError as error:
@@ -761,10 +1045,10 @@ class GoogleWorkspaceService:
             raise Exception("Not authenticated")
 
         try:
-            self.service.members().delete(
+            self.execute_request(self.service.members().delete(
                 groupKey=group_email,
                 memberKey=member_email
-            ).execute()
+            ))
 
             print(f"[GoogleWorkspaceService] Removed member: {member_email} from {group_email}")
             return {'email': member_email, 'status': 'removed'}
@@ -778,51 +1062,235 @@ class GoogleWorkspaceService:
         except Exception as error:
             raise Exception(f"Failed to remove member: {error}")
 
-    def get_users_in_ou(self, ou_path: str) -> List[Dict]:
+    def list_users_in_ou(
+        self,
+        ou_path: str,
+        projection: str = 'basic',
+        use_cache: bool = True,
+        user_fields: Optional[str] = None
+    ) -> List[Dict]:
         """
-        Get all users in a specific Organizational Unit
+        List raw user resources in an Organizational Unit and its sub-OUs
+
+        Listings are shared through the process-wide OU cache, keyed by OU path
+        and field set, so several jobs referencing the same OU download it once.
 
         Args:
             ou_path: Path to the organizational unit (e.g., /Sales)
+            projection: Directory API projection ('basic' or 'full')
+            use_cache: Set to False to bypass the cache and force a fresh listing
+            user_fields: Optional partial-response field set (orgUnitPath is always included)
 
         Returns:
-            List of dicts with user information (email, name, orgUnitPath)
+            List of user resources as returned by users().list
+
+        Raises:
+            HttpError if the orgUnitPath query is rejected
         """
         if not self.is_authenticated():
             raise Exception("Not authenticated")
 
-        try:
-            users = []
-            page_token = None
-
-            while True:
-                params = {
-                    'customer': 'my_customer',
-                    'maxResults': int(os.getenv("MAX_RESULTS_PER_PAGE", 500)),
-                    'projection': 'basic',
-                    'query': f"orgUnitPath='{ou_path}'"
-                }
-                if page_token:
-                    params['pageToken'] = page_token
+        user_fields = _with_field(user_fields, 'orgUnitPath')
+        cache_key = f"{projection}|{user_fields}" if user_fields else projection
 
-                result = self.service.users().list(**params).execute()
+        def fetch():
+            users = []
 
-                for user in result.get('users', []):
+            for page_users in self.iter_user_pages(
+                projection=projection,
+                user_fields=user_fields,
+                query=f"orgUnitPath='{ou_path}'",
+                order_by=None
+            ):
+                for user in page_users:
                     # Only include users directly in this OU or its sub-OUs
                     user_ou = user.get('orgUnitPath', '')
                     if user_ou == ou_path or user_ou.startswith(ou_path + '/'):
-                        users.append({
-                            'email': user.get('primaryEmail'),
-                            'name': user.get('name', {}).get('fullName', ''),
-                            'orgUnitPath': user_ou
-                        })
+                        users.append(user)
 
-                page_token = result.get('nextPageToken')
-                if not page_token:
-                    break
+            return users
 
+        if not use_cache:
+            users = fetch()
+            get_ou_cache().put(ou_path, cache_key, users)
             return users
 
+        return get_ou_cache().get_or_fetch(ou_path, cache_key, fetch)
+
+    def list_users_in_ous_client_side(
+        self,
+        ou_paths: List[str],
+        projection: str = 'basic',
+        user_fields: Optional[str] = None
+    ) -> Dict[str, List[Dict]]:
+        """
+        Fallback: list every user in the tenant once and dispatch each to the selected OUs containing it
+
+        Used when orgUnitPath query filtering is rejected. All failing OUs share
+        a single sweep instead of re-listing the tenant once per OU.
+
+        Args:
+            ou_paths: The OU paths to filter by
+            projection: Directory API projection ('basic' or 'full')
+            user_fields: Optional partial-response field set (orgUnitPath is always included)
+
+        Returns:
+            Dict mapping each OU path to the user resources in it or its sub-OUs
+        """
+        users_by_ou: Dict[str, List[Dict]] = {ou_path: [] for ou_path in ou_paths}
+        selected = {ou_path.rstrip('/') or '/': ou_path for ou_path in ou_paths}
+
+        for page_users in self.iter_user_pages(
+            projection=projection,
+            user_fields=_with_field(user_fields, 'orgUnitPath'),
+            order_by=None
+        ):
+            # Walk up each user's OU path and add it to every selected ancestor (include sub-OUs)
+            for user in page_users:
+                user_ou = user.get('orgUnitPath', '') or '/'
+                while True:
+                    if user_ou in selected:
+                        users_by_ou[selected[user_ou]].append(user)
+                    if user_ou == '/':
+                        break
+                    user_ou = user_ou.rsplit('/', 1)[0] or '/'
+
+        return users_by_ou
+
+    def build_user_index(self, projection: str = 'basic', user_fields: Optional[str] = None) -> TenantUserIndex:
+        """
+        List every user in the tenant once and index them by orgUnitPath
+
+        One paged sweep replaces a separate orgUnitPath query per selected OU;
+        the returned index resolves any number of OUs in memory.
+
+        Args:
+            projection: Directory API projection ('basic' or 'full')
+            user_fields: Optional partial-response field set (orgUnitPath is always included)
+
+        Returns:
+            TenantUserIndex holding every user resource
+        """
+        if not self.is_authenticated():
+            raise Exception("Not authenticated")
+
+        index = TenantUserIndex(projection=projection)
+
+        for page_users in self.iter_user_pages(
+            projection=projection,
+            user_fields=_with_field(user_fields, 'orgUnitPath'),
+            order_by=None
+        ):
+            index.add_all(page_users)
+
+        return index
+
+    def get_users_batch(
+        self,
+        user_keys: List[str],
+        projection: str = 'basic',
+        user_fields: Optional[str] = None
+    ) -> Dict[str, Dict]:
+        """
+        Fetch several user resources through HTTP batch requests
+
+        Args:
+            user_keys: User IDs or primary emails
+            projection: Directory API projection ('basic' or 'full')
+            user_fields: Optional partial-response field set of each user
+
+        Returns:
+            Dict mapping each user key to {'response': user or None, 'error': exception or None}
+        """
+        if not self.is_authenticated():
+            raise Exception("Not authenticated")
+
+        rate_controller = get_rate_controller()
+        executor = BatchRequestExecutor(
+            batch_factory=self.new_batch_request,
+            retry_handler=APIRetryHandler(max_retries=5, base_delay=1.0, rate_controller=rate_controller),
+            rate_controller=rate_controller,
+            http_factory=self.get_thread_http
+        )
+
+        def make_builder(user_key):
+            if user_fields:
+                return lambda: self.service.users().get(userKey=user_key, projection=projection, fields=user_fields)
+            return lambda: self.service.users().get(userKey=user_key, projection=projection)
+
+        results = executor.execute([
+            (str(idx), make_builder(user_key))
+            for idx, user_key in enumerate(user_keys)
+        ])
+
+        return {user_key: results[str(idx)] for idx, user_key in enumerate(user_keys)}
+
+    def watch_users(self, address: str, channel_id: str, token: str, ttl_seconds: int = 21600) -> Dict:
+        """
+        Open a users().watch push channel delivering user changes to a webhook
+
+        Args:
+            address: HTTPS URL that receives the notifications
+            channel_id: Unique ID for the channel
+            token: Secret echoed back in the X-Goog-Channel-Token header
+            ttl_seconds: Requested channel lifetime
+
+        Returns:
+            The channel resource (id, resourceId, expiration)
+        """
+        if not self.is_authenticated():
+            raise Exception("Not authenticated")
+
+        try:
+            return self.execute_request(self.service.users().watch(
+                customer='my_customer',
+                body={
+                    'id': channel_id,
+                    'type': 'web_hook',
+                    'address': address,
+                    'token': token,
+                    'params': {'ttl': str(ttl_seconds)}
+                }
+            ))
+        except HttpError as error:
+            raise Exception(f"Failed to watch users: {error}")
+
+    def stop_channel(self, channel_id: str, resource_id: str) -> None:
+        """Stop a push notification channel opened by watch_users"""
+        if not self.is_authenticated():
+            raise Exception("Not authenticated")
+
+        try:
+            self.execute_request(self.service.channels().stop(
+                body={'id': channel_id, 'resourceId': resource_id}
+            ))
+        except HttpError as error:
+            if error.resp.status != 404:
+                raise Exception(f"Failed to stop channel: {error}")
+
+    def get_users_in_ou(self, ou_path: str) -> List[Dict]:
+        """
+        Get all users in a specific Organizational Unit
+
+        Args:
+            ou_path: Path to the organizational unit (e.g., /Sales)
+
+        Returns:
+            List of dicts with user information (email, name, orgUnitPath)
+        """
+        if not self.is_authenticated():
+            raise Exception("Not authenticated")
+
+        try:
+            return [
+                {
+                    'email': user.get('primaryEmail'),
+                    'name': user.get('name', {}).get('fullName', ''),
+                    'orgUnitPath': user.get('orgUnitPath', '')
+                }
+                for user in self.list_users_in_ou(ou_path, user_fields=OU_MEMBER_USER_FIELDS)
+            ]
+
         except HttpError as error:
             raise Exception(f"Failed to get users in OU: {error}")
         except Exception as error:
@@ -1,23 +1,33 @@
 """Service for batch processing OU to Group synchronization"""
+import os
 import json
-import uuid
 import time
+import uuid
+import threading
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 from sqlalchemy.orm import Session
 
 from database.models import BatchJob, GroupSyncConfig
 from services.google_workspace import GoogleWorkspaceService
+from services.directory_mirror import DirectoryMirror
+from services.progress_events import publish_job_progress
+from services.lease import LeaseLost, check_lease
 
 
 class GroupSyncProcessor:
     """Handles batch processing of OU to Group synchronization with progress tracking"""
 
-    API_CALL_DELAY = 0.033  # 33ms delay between API calls (~30 calls/sec)
+    MEMBERSHIP_BATCH_SIZE = 100  # Member inserts/deletes per HTTP batch request
 
-    def __init__(self, db: Session, google_service: GoogleWorkspaceService):
+    def __init__(self, db: Session, google_service: GoogleWorkspaceService, directory_snapshot=None,
+                 cancel_event: Optional[threading.Event] = None):
         self.db = db
         self.google_service = google_service
+        # Optional DirectorySnapshot shared across configs in a sync-all run (each OU listed once)
+        self.directory_snapshot = directory_snapshot
+        # Set by JobWorker when the task's lease is lost; checked before each OU listing and member chunk
+        self.cancel_event = cancel_event
 
     def create_or_update_config(
         self,
@@ -164,6 +174,7 @@ class GroupSyncProcessor:
             job.status = 'running'
             job.started_at = datetime.utcnow()
             self.db.commit()
+            publish_job_progress(job)
 
             # Parse OU paths and group info
             ou_paths = json.loads(job.ou_paths) if job.ou_paths else []
@@ -176,6 +187,7 @@ class GroupSyncProcessor:
                 job.completed_at = datetime.utcnow()
                 job.progress_percentage = 100.0
                 self.db.commit()
+                publish_job_progress(job)
                 return {'status': 'completed', 'message': 'No OUs to process'}
 
             print(f"[GroupSyncProcessor] Syncing {len(ou_paths)} OUs to group {group_email}")
@@ -192,14 +204,14 @@ class GroupSyncProcessor:
                     group_name=group_name,
                     description=group_description
                 )
-                time.sleep(self.API_CALL_DELAY)
 
             # Step 2: Collect all users from all OUs
             all_users = []
             for idx, ou_path in enumerate(ou_paths, 1):
                 print(f"[GroupSyncProcessor] Getting users from OU {idx}/{len(ou_paths)}: {ou_path}")
+                check_lease(self.cancel_event)
                 try:
-                    users = self.google_service.get_users_in_ou(ou_path)
+                    users = self._get_users_in_ou(ou_path)
                     all_users.extend(users)
                     print(f"[GroupSyncProcessor] Found {len(users)} users in {ou_path}")
                 except Exception as e:
@@ -211,36 +223,18 @@ class GroupSyncProcessor:
 
             job.total_users = total_users
             self.db.commit()
+            publish_job_progress(job)
 
             print(f"[GroupSyncProcessor] Total unique users to sync: {total_users}")
 
-            # Step 3: Add each user to the group
-            synced = 0
-            failed = 0
-
-            for idx, user in enumerate(unique_users, 1):
-                try:
-                    self.google_service.add_group_member(
-                        group_email=group_email,
-                        member_email=user['email']
-                    )
-                    synced += 1
-                    job.successful_users += 1
-                    job.processed_users += 1
-
-                    # Rate limiting
-                    time.sleep(self.API_CALL_DELAY)
-
-                except Exception as e:
-                    failed += 1
-                    job.failed_users += 1
-                    job.processed_users += 1
-                    print(f"[GroupSyncProcessor] Failed to add {user['email']}: {str(e)}")
-
-                # Update progress periodically
-                if idx % 10 == 0 or idx == total_users:
-                    job.progress_percentage = (idx / total_users) * 100
-                    self.db.commit()
+            # Step 3: Add users to the group in batched requests
+            synced, failed = self._apply_membership_changes(
+                job=job,
+                group_email=group_email,
+                member_emails=sorted(user['email'] for user in unique_users),
+                operation='add',
+                total_operations=total_users
+            )
 
             # Mark job as completed
             job.created_groups = json.dumps([group_email])
@@ -265,6 +259,7 @@ class GroupSyncProcessor:
                 config.total_syncs += 1
 
             self.db.commit()
+            publish_job_progress(job)
 
             print(f"[GroupSyncProcessor] Job completed: {synced} members added, {failed} failed")
             return {
@@ -275,12 +270,18 @@ class GroupSyncProcessor:
                 'created_groups': [group_email]
             }
 
+        except LeaseLost:
+            # The job was reset for another worker; leave its status to that worker
+            print(f"[GroupSyncProcessor] Lease lost, stopping job {job_uuid}")
+            raise
+
         except Exception as e:
             print(f"[GroupSyncProcessor] FATAL ERROR: {str(e)}")
             job.status = 'failed'
             job.error_message = str(e)
             job.completed_at = datetime.utcnow()
             self.db.commit()
+            publish_job_progress(job)
             raise
 
     def smart_sync(self, config_uuid: str, job_uuid: str) -> Dict:
@@ -320,6 +321,7 @@ class GroupSyncProcessor:
             job.status = 'running'
             job.started_at = datetime.utcnow()
             self.db.commit()
+            publish_job_progress(job)
 
             # Parse config data
             ou_paths = json.loads(config.ou_paths) if config.ou_paths else []
@@ -334,7 +336,6 @@ class GroupSyncProcessor:
                     group_name=config.group_name,
                     description=config.group_description or ""
                 )
-                time.sleep(self.API_CALL_DELAY)
 
             # Step 2: Get current group members
             print(f"[GroupSyncProcessor] Getting current group members...")
@@ -346,8 +347,9 @@ class GroupSyncProcessor:
             expected_members = set()
             for idx, ou_path in enumerate(ou_paths, 1):
                 print(f"[GroupSyncProcessor] Getting users from OU {idx}/{len(ou_paths)}: {ou_path}")
+                check_lease(self.cancel_event)
                 try:
-                    users = self.google_service.get_users_in_ou(ou_path)
+                    users = self._get_users_in_ou(ou_path)
                     for user in users:
                         expected_members.add(user['email'])
                     print(f"[GroupSyncProcessor] Found {len(users)} users in {ou_path}")
@@ -366,57 +368,25 @@ class GroupSyncProcessor:
             total_operations = len(to_add) + len(to_remove)
             job.total_users = total_operations
             self.db.commit()
+            publish_job_progress(job)
 
-            # Step 5: Add new members
-            added = 0
-            add_failed = 0
-
-            for idx, member_email in enumerate(to_add, 1):
-                try:
-                    self.google_service.add_group_member(
-                        group_email=group_email,
-                        member_email=member_email
-                    )
-                    added += 1
-                    job.successful_users += 1
-                    job.processed_users += 1
-                    time.sleep(self.API_CALL_DELAY)
-                except Exception as e:
-                    add_failed += 1
-                    job.failed_users += 1
-                    job.processed_users += 1
-                    print(f"[GroupSyncProcessor] Failed to add {member_email}: {str(e)}")
-
-                # Update progress
-                if idx % 10 == 0 or idx == len(to_add):
-                    progress = (job.processed_users / total_operations) * 100 if total_operations > 0 else 0
-                    job.progress_percentage = progress
-                    self.db.commit()
-
-            # Step 6: Remove members no longer in OUs
-            removed = 0
-            remove_failed = 0
-
-            for idx, member_email in enumerate(to_remove, 1):
-                try:
-                    self.google_service.remove_group_member(
-                        group_email=group_email,
-                        member_email=member_email
-                    )
-                    removed += 1
-                    job.successful_users += 1
-                    job.processed_users += 1
-                    time.sleep(self.API_CALL_DELAY)
-                except Exception as e:
-                    remove_failed += 1
-                    job.failed_users += 1
-                    job.processed_users += 1
-                    print(f"[GroupSyncProcessor] Failed to remove {member_email}: {str(e)}")
+            # Step 5: Add new members in batched requests
+            added, add_failed = self._apply_membership_changes(
+                job=job,
+                group_email=group_email,
+                member_emails=sorted(to_add),
+                operation='add',
+                total_operations=total_operations
+            )
 
-                # Update progress
-                progress = (job.processed_users / total_operations) * 100 if total_operations > 0 else 0
-                job.progress_percentage = progress
-                self.db.commit()
+            # Step 6: Remove members no longer in OUs in batched requests
+            removed, remove_failed = self._apply_membership_changes(
+                job=job,
+                group_email=group_email,
+                member_emails=sorted(to_remove),
+                operation='remove',
+                total_operations=total_operations
+            )
 
             # Step 7: Update config and job with results
             sync_stats = {
@@ -439,6 +409,7 @@ class GroupSyncProcessor:
             job.completed_at = datetime.utcnow()
             job.progress_percentage = 100.0
             self.db.commit()
+            publish_job_progress(job)
 
             print(f"[GroupSyncProcessor] Smart sync completed: +{added} -{removed} ={len(unchanged)}")
             return {
@@ -450,14 +421,94 @@ class GroupSyncProcessor:
                 'sync_stats': sync_stats
             }
 
+        except LeaseLost:
+            print(f"[GroupSyncProcessor] Lease lost, stopping smart sync job {job_uuid}")
+            raise
+
         except Exception as e:
             print(f"[GroupSyncProcessor] FATAL ERROR in smart_sync: {str(e)}")
             job.status = 'failed'
             job.error_message = str(e)
             job.completed_at = datetime.utcnow()
             self.db.commit()
+            publish_job_progress(job)
             raise
 
+    def _get_users_in_ou(self, ou_path: str) -> List[Dict]:
+        """
+        Get users in an OU, through the run's shared snapshot when one is set,
+        otherwise from the incremental directory mirror when it is enabled
+        """
+        if self.directory_snapshot is not None:
+            return self.directory_snapshot.get_users_in_ou(ou_path)
+
+        if DirectoryMirror.is_enabled():
+            mirror = DirectoryMirror(self.db, self.google_service, cancel_event=self.cancel_event)
+            mirror.ensure_fresh()
+            return mirror.get_users_in_ou(ou_path)
+
+        return self.google_service.get_users_in_ou(ou_path)
+
+    def _apply_membership_changes(
+        self,
+        job: BatchJob,
+        group_email: str,
+        member_emails: List[str],
+        operation: str,
+        total_operations: int
+    ) -> Tuple[int, int]:
+        """
+        Add or remove group members in chunks of HTTP batch requests
+
+        Members that are already present (409) or already gone (404) count as
+        successful. Progress is published to stream subscribers after every
+        chunk and committed every STATUS_FLUSH_INTERVAL_SECONDS (5); the
+        caller's final commit writes the rest.
+
+        Args:
+            job: The BatchJob tracking progress
+            group_email: Email address of the group
+            member_emails: Member emails to add or remove
+            operation: 'add' or 'remove'
+            total_operations: Total operations in the job, for progress percentage
+
+        Returns:
+            Tuple of (successful, failed) counts
+        """
+        successful = 0
+        failed = 0
+        commit_interval = float(os.getenv("STATUS_FLUSH_INTERVAL_SECONDS", 5))
+        last_commit = time.monotonic()
+
+        for start in range(0, len(member_emails), self.MEMBERSHIP_BATCH_SIZE):
+            chunk = member_emails[start:start + self.MEMBERSHIP_BATCH_SIZE]
+            check_lease(self.cancel_event)
+
+            if operation == 'add':
+                results = self.google_service.add_group_members_batch(group_email, chunk)
+            else:
+                results = self.google_service.remove_group_members_batch(group_email, chunk)
+
+            for member_email in chunk:
+                result = results[member_email]
+                if result['status'] == 'failed':
+                    failed += 1
+                    job.failed_users += 1
+                    print(f"[GroupSyncProcessor] Failed to {operation} {member_email}: {result['error']}")
+                else:
+                    successful += 1
+                    job.successful_users += 1
+                job.processed_users += 1
+
+            job.progress_percentage = (job.processed_users / total_operations) * 100 if total_operations > 0 else 0
+            publish_job_progress(job)
+            if time.monotonic() - last_commit >= commit_interval:
+                self.db.commit()
+                last_commit = time.monotonic()
+            print(f"[GroupSyncProcessor] {operation.capitalize()} progress: {start + len(chunk)}/{len(member_emails)} members")
+
+        return successful, failed
+
     def get_all_configs(self) -> List[Dict]:
         """
         Get all saved group sync configurations
@@ -655,6 +706,11 @@ class GroupSyncProcessor:
         if not job:
             raise Exception(f"Job {job_uuid} not found")
 
+        return self.format_job_status(job)
+
+    @staticmethod
+    def format_job_status(job: BatchJob) -> Dict:
+        """Build the status dict of a loaded group sync job (no further queries)"""
         # Calculate user status counts
         # Group sync doesn't use cached_users table, so we derive from job counters
         pending = max(0, job.total_users - job.processed_users)
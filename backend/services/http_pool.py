@@ -0,0 +1,107 @@
+"""
+Shared HTTP transport layer for the Directory API
+Keeps keep-alive connections alive across service instances and jobs
+"""
+import os
+import threading
+import weakref
+from typing import Dict, List, Optional
+
+import httplib2
+
+
+class _Lease:
+    """A pooled connection held by one thread; handed back to the pool when the thread ends"""
+
+    def __init__(self, pool: "HttpConnectionPool", http: httplib2.Http):
+        self.http = http
+        weakref.finalize(self, pool.release, http)
+
+
+class HttpConnectionPool:
+    """
+    Process-wide pool of httplib2.Http objects
+
+    httplib2.Http is not thread-safe, so each thread leases one for as long as
+    it lives. When the thread exits, its connection (with any open keep-alive
+    sockets) goes back to the pool for the next thread instead of being
+    discarded, so new jobs and new GoogleWorkspaceService instances skip the
+    TLS handshake.
+    """
+
+    def __init__(self, max_idle: int = 32, timeout: Optional[float] = None):
+        """
+        Initialize pool
+
+        Args:
+            max_idle: Idle connections kept for reuse; extra returned connections are closed
+            timeout: Socket timeout in seconds for new connections
+        """
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self._idle: List[httplib2.Http] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.created = 0
+        self.reused = 0
+        self.closed = 0
+
+    def get(self) -> httplib2.Http:
+        """Get the connection leased by the calling thread, leasing one on first use"""
+        lease = getattr(self._local, 'lease', None)
+        if lease is None:
+            lease = _Lease(self, self._acquire())
+            self._local.lease = lease
+        return lease.http
+
+    def _acquire(self) -> httplib2.Http:
+        with self._lock:
+            if self._idle:
+                self.reused += 1
+                # Most recently returned first: its sockets are the least likely to have timed out
+                return self._idle.pop()
+            self.created += 1
+        return httplib2.Http(timeout=self.timeout)
+
+    def release(self, http: httplib2.Http) -> None:
+        """Return a connection to the pool (called when its leasing thread ends)"""
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(http)
+                return
+            self.closed += 1
+        http.close()
+
+    def get_stats(self) -> Dict:
+        """Get connection reuse counters for monitoring"""
+        with self._lock:
+            return {
+                'idle': len(self._idle),
+                'max_idle': self.max_idle,
+                'created': self.created,
+                'reused': self.reused,
+                'closed': self.closed
+            }
+
+
+_http_pool: Optional[HttpConnectionPool] = None
+_http_pool_lock = threading.Lock()
+
+
+def get_http_pool() -> HttpConnectionPool:
+    """
+    Get the process-wide HTTP connection pool
+
+    Sized from HTTP_POOL_MAX_IDLE (default 32); HTTP_TIMEOUT_SECONDS (default 120)
+    sets the socket timeout.
+    """
+    global _http_pool
+
+    with _http_pool_lock:
+        if _http_pool is None:
+            _http_pool = HttpConnectionPool(
+                max_idle=int(os.getenv("HTTP_POOL_MAX_IDLE", 32)),
+                timeout=float(os.getenv("HTTP_TIMEOUT_SECONDS", 120))
+            )
+        return _http_pool
+
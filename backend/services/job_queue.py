@@ -0,0 +1,386 @@
+"""
+Durable SQLite-backed job queue
+Tasks are claimed atomically by workers holding a heartbeat-renewed lease; expired leases are re-queued
+"""
+import os
+import json
+import time
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database.models import QueuedTask, BatchJob
+from database.session import SessionLocal
+from services.user_cache_service import UserCacheService
+from services.lease import LeaseLost
+
+# Task types whose task_key is a BatchJob UUID
+JOB_TASK_TYPES = ('batch_job', 'alias_extraction', 'group_sync')
+
+
+def default_lease_seconds() -> float:
+    """Lease length; a worker that misses heartbeats for this long loses its task (JOB_LEASE_SECONDS)"""
+    return float(os.getenv("JOB_LEASE_SECONDS", 60))
+
+
+class JobQueue:
+    """Enqueues, leases and settles queued tasks"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def enqueue(self, task_type: str, payload: Optional[Dict] = None, task_key: Optional[str] = None,
+                max_attempts: Optional[int] = None) -> QueuedTask:
+        """
+        Add a task to the queue
+
+        Args:
+            task_type: Handler name the worker dispatches on
+            payload: Keyword arguments passed to the handler
+            task_key: job_uuid or run_id the task works on, for lookups
+            max_attempts: Leases allowed before the task is failed; defaults to JOB_MAX_ATTEMPTS (3)
+
+        Returns:
+            The queued task
+        """
+        task = QueuedTask(
+            task_type=task_type,
+            task_key=task_key,
+            payload=json.dumps(payload or {}),
+            status='queued',
+            attempts=0,
+            max_attempts=max_attempts or int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+        )
+        self.db.add(task)
+        self.db.commit()
+        self.db.refresh(task)
+        return task
+
+    def claim(self, worker_id: str, lease_seconds: Optional[float] = None) -> Optional[QueuedTask]:
+        """
+        Lease the oldest queued task
+
+        On PostgreSQL the candidate is selected FOR UPDATE SKIP LOCKED, so
+        concurrent workers each lock a different row instead of contending
+        for the oldest one. The lease itself is a conditional UPDATE (status
+        still 'queued'), which is what keeps claims exclusive on SQLite,
+        where FOR UPDATE is not supported: when workers race for the same
+        row exactly one wins and the others move on to the next candidate.
+
+        Returns:
+            The leased task, or None if the queue is empty
+        """
+        lease_seconds = lease_seconds or default_lease_seconds()
+
+        while True:
+            candidate = self.db.query(QueuedTask.id).filter(
+                QueuedTask.status == 'queued'
+            ).order_by(QueuedTask.id).with_for_update(skip_locked=True).first()
+            if candidate is None:
+                return None
+
+            now = datetime.utcnow()
+            claimed = self.db.query(QueuedTask).filter(
+                QueuedTask.id == candidate.id,
+                QueuedTask.status == 'queued'
+            ).update({
+                QueuedTask.status: 'leased',
+                QueuedTask.lease_owner: worker_id,
+                QueuedTask.lease_expires_at: now + timedelta(seconds=lease_seconds),
+                QueuedTask.heartbeat_at: now,
+                QueuedTask.started_at: now,
+                QueuedTask.attempts: QueuedTask.attempts + 1
+            }, synchronize_session=False)
+            self.db.commit()
+
+            if claimed:
+                return self.db.query(QueuedTask).filter(QueuedTask.id == candidate.id).first()
+
+    def heartbeat(self, task_id: int, worker_id: str, lease_seconds: Optional[float] = None) -> bool:
+        """
+        Extend the lease of a running task
+
+        Returns:
+            False if the worker no longer holds the lease (it expired and was re-queued)
+        """
+        lease_seconds = lease_seconds or default_lease_seconds()
+        now = datetime.utcnow()
+        renewed = self.db.query(QueuedTask).filter(
+            QueuedTask.id == task_id,
+            QueuedTask.status == 'leased',
+            QueuedTask.lease_owner == worker_id
+        ).update({
+            QueuedTask.lease_expires_at: now + timedelta(seconds=lease_seconds),
+            QueuedTask.heartbeat_at: now
+        }, synchronize_session=False)
+        self.db.commit()
+        return bool(renewed)
+
+    def complete(self, task_id: int, worker_id: str, result=None) -> bool:
+        """Mark a leased task completed (ignored if the lease was lost meanwhile)"""
+        return self._settle(task_id, worker_id, status='completed', result=json.dumps(result, default=str))
+
+    def fail(self, task_id: int, worker_id: str, error: str) -> bool:
+        """Mark a leased task failed (ignored if the lease was lost meanwhile)"""
+        return self._settle(task_id, worker_id, status='failed', error_message=error)
+
+    def _settle(self, task_id: int, worker_id: str, **fields) -> bool:
+        values = {getattr(QueuedTask, name): value for name, value in fields.items()}
+        values[QueuedTask.completed_at] = datetime.utcnow()
+        values[QueuedTask.lease_expires_at] = None
+        settled = self.db.query(QueuedTask).filter(
+            QueuedTask.id == task_id,
+            QueuedTask.status == 'leased',
+            QueuedTask.lease_owner == worker_id
+        ).update(values, synchronize_session=False)
+        self.db.commit()
+        return bool(settled)
+
+    def requeue_expired(self) -> int:
+        """
+        Re-queue tasks whose worker stopped heartbeating
+
+        The jobs they were working on are reset the way fix_stuck_job.py did
+        by hand: 'running' back to 'pending' and 'processing' users back to
+        'pending'. Tasks out of attempts are failed together with their jobs.
+
+        Returns:
+            Number of expired leases handled
+        """
+        now = datetime.utcnow()
+        expired = self.db.query(QueuedTask).filter(
+            QueuedTask.status == 'leased',
+            QueuedTask.lease_expires_at < now
+        ).all()
+
+        handled = 0
+        for task in expired:
+            exhausted = (task.attempts or 0) >= (task.max_attempts or 1)
+            reclaimed = self.db.query(QueuedTask).filter(
+                QueuedTask.id == task.id,
+                QueuedTask.status == 'leased',
+                QueuedTask.lease_expires_at < now
+            ).update({
+                QueuedTask.status: 'failed' if exhausted else 'queued',
+                QueuedTask.lease_owner: None,
+                QueuedTask.lease_expires_at: None,
+                QueuedTask.error_message: f"Lease of {task.lease_owner} expired (attempt {task.attempts})",
+                QueuedTask.completed_at: now if exhausted else None
+            }, synchronize_session=False)
+            if not reclaimed:
+                continue  # Another worker reclaimed it first
+
+            job_uuids = self._task_job_uuids(task)
+            if exhausted:
+                self._fail_jobs(job_uuids, f"Worker stopped after {task.attempts} attempts")
+                print(f"[JobQueue] Task {task.id} ({task.task_type}) failed: lease expired after {task.attempts} attempts")
+            else:
+                self._reset_jobs(job_uuids)
+                print(f"[JobQueue] Re-queued task {task.id} ({task.task_type}) after lease of {task.lease_owner} expired")
+
+            self.db.commit()
+            handled += 1
+
+        return handled
+
+    def _task_job_uuids(self, task: QueuedTask) -> List[str]:
+        if task.task_type in JOB_TASK_TYPES and task.task_key:
+            return [task.task_key]
+        payload = json.loads(task.payload) if task.payload else {}
+        # A sync-all run is itself stored as a job next to the jobs it runs
+        run_ids = [payload['run_id']] if payload.get('run_id') else []
+        return payload.get('job_uuids', []) + run_ids
+
+    def _reset_jobs(self, job_uuids: List[str]) -> None:
+        if not job_uuids:
+            return
+        self.db.query(BatchJob).filter(
+            BatchJob.job_uuid.in_(job_uuids),
+            BatchJob.status == 'running'
+        ).update({BatchJob.status: 'pending', BatchJob.started_at: None}, synchronize_session=False)
+        UserCacheService(self.db, None).reset_processing_users(job_uuids)
+
+    def _fail_jobs(self, job_uuids: List[str], error: str) -> None:
+        if not job_uuids:
+            return
+        self.db.query(BatchJob).filter(
+            BatchJob.job_uuid.in_(job_uuids),
+            BatchJob.status.in_(['pending', 'running'])
+        ).update({
+            BatchJob.status: 'failed',
+            BatchJob.error_message: error,
+            BatchJob.completed_at: datetime.utcnow()
+        }, synchronize_session=False)
+
+    def get_task_by_key(self, task_key: str) -> Optional[QueuedTask]:
+        """Get the most recent task for a job_uuid or run_id"""
+        return self.db.query(QueuedTask).filter(
+            QueuedTask.task_key == task_key
+        ).order_by(QueuedTask.id.desc()).first()
+
+    def get_stats(self) -> Dict:
+        """Get task counts per status and the active leases"""
+        counts = dict(self.db.query(QueuedTask.status, func.count(QueuedTask.id)).group_by(QueuedTask.status).all())
+        leased = self.db.query(QueuedTask).filter(QueuedTask.status == 'leased').all()
+        return {
+            'queued': counts.get('queued', 0),
+            'leased': counts.get('leased', 0),
+            'completed': counts.get('completed', 0),
+            'failed': counts.get('failed', 0),
+            'active_leases': [
+                {
+                    'task_id': task.id,
+                    'task_type': task.task_type,
+                    'task_key': task.task_key,
+                    'worker': task.lease_owner,
+                    'attempts': task.attempts,
+                    'lease_expires_at': task.lease_expires_at.isoformat() if task.lease_expires_at else None
+                }
+                for task in leased
+            ]
+        }
+
+
+class JobWorker:
+    """
+    Polls the queue and runs leased tasks, one at a time
+
+    The handler runs on its own thread while this loop renews the lease, so a
+    long task keeps its lease and a crashed worker loses it after
+    JOB_LEASE_SECONDS. Handlers are called with a cancel_event keyword
+    argument that is set when the lease is lost (or can no longer be
+    renewed); they check it with check_lease() between units of work.
+    """
+
+    def __init__(self, handlers: Dict[str, Callable], worker_id: Optional[str] = None,
+                 lease_seconds: Optional[float] = None, poll_seconds: Optional[float] = None):
+        """
+        Initialize worker
+
+        Args:
+            handlers: Task type -> function called with the task payload as keyword arguments
+            worker_id: Lease owner name; defaults to host:pid:thread
+            lease_seconds: Lease length; defaults to JOB_LEASE_SECONDS (60)
+            poll_seconds: Sleep between polls of an empty queue; defaults to JOB_QUEUE_POLL_SECONDS (1)
+        """
+        self.handlers = handlers
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        self.lease_seconds = lease_seconds or default_lease_seconds()
+        self.poll_seconds = poll_seconds or float(os.getenv("JOB_QUEUE_POLL_SECONDS", 1))
+        self._stop = threading.Event()
+
+    def stop(self) -> None:
+        """Stop claiming new tasks; the task in progress runs to completion"""
+        self._stop.set()
+
+    def start_in_thread(self) -> threading.Thread:
+        """Run the worker loop on a daemon thread (used by the API process)"""
+        thread = threading.Thread(target=self.run, name="job-worker", daemon=True)
+        thread.start()
+        return thread
+
+    def run(self) -> None:
+        """Claim and run tasks until stop() is called"""
+        print(f"[JobWorker] {self.worker_id} started (lease {self.lease_seconds:.0f}s)")
+        while not self._stop.is_set():
+            try:
+                self._with_queue(lambda queue: queue.requeue_expired())
+                task = self._with_queue(lambda queue: self._claim(queue))
+            except Exception as e:
+                print(f"[JobWorker] Queue poll failed: {str(e)}")
+                task = None
+
+            if task is None:
+                self._stop.wait(self.poll_seconds)
+                continue
+
+            self._execute(*task)
+
+        print(f"[JobWorker] {self.worker_id} stopped")
+
+    def _claim(self, queue: JobQueue):
+        task = queue.claim(self.worker_id, self.lease_seconds)
+        if task is None:
+            return None
+        # Copy what is needed before the session closes
+        return task.id, task.task_type, json.loads(task.payload) if task.payload else {}
+
+    def _execute(self, task_id: int, task_type: str, payload: Dict) -> None:
+        handler = self.handlers.get(task_type)
+        if handler is None:
+            self._with_queue(lambda queue: queue.fail(task_id, self.worker_id, f"Unknown task type: {task_type}"))
+            return
+
+        print(f"[JobWorker] {self.worker_id} running task {task_id} ({task_type})")
+        outcome = {}
+        cancel_event = threading.Event()
+
+        def target():
+            try:
+                outcome['result'] = handler(cancel_event=cancel_event, **payload)
+            except LeaseLost as e:
+                outcome['error'] = str(e)
+            except Exception as e:
+                traceback.print_exc()
+                outcome['error'] = str(e)
+
+        thread = threading.Thread(target=target, name=f"job-{task_id}", daemon=True)
+        thread.start()
+
+        heartbeat_interval = max(1.0, self.lease_seconds / 3)
+        last_renewed = time.monotonic()
+        while True:
+            thread.join(timeout=heartbeat_interval)
+            if not thread.is_alive():
+                break
+            if cancel_event.is_set():
+                continue  # Waiting for the handler to reach its next check_lease()
+            try:
+                if self._with_queue(lambda queue: queue.heartbeat(task_id, self.worker_id, self.lease_seconds)):
+                    last_renewed = time.monotonic()
+                else:
+                    print(f"[JobWorker] Lost lease on task {task_id}; stopping it so it is only retried elsewhere")
+                    cancel_event.set()
+            except Exception as e:
+                print(f"[JobWorker] Heartbeat for task {task_id} failed: {str(e)}")
+                if time.monotonic() - last_renewed >= self.lease_seconds:
+                    print(f"[JobWorker] Lease on task {task_id} has expired; stopping it")
+                    cancel_event.set()
+
+        if cancel_event.is_set():
+            # The task now belongs to whoever re-queued it; settling here would be ignored anyway
+            print(f"[JobWorker] Task {task_id} ({task_type}) stopped after losing its lease")
+            return
+
+        if 'error' in outcome:
+            self._with_queue(lambda queue: queue.fail(task_id, self.worker_id, outcome['error']))
+        else:
+            self._with_queue(lambda queue: queue.complete(task_id, self.worker_id, outcome.get('result')))
+        print(f"[JobWorker] Task {task_id} ({task_type}) finished")
+
+    @staticmethod
+    def _with_queue(operation: Callable[[JobQueue], object]):
+        # Short-lived session per queue operation, so no transaction spans a task
+        db = SessionLocal()
+        try:
+            return operation(JobQueue(db))
+        finally:
+            db.close()
+
+
+def enqueue_task(task_type: str, task_key: Optional[str] = None, **payload) -> int:
+    """
+    Enqueue a task with its own database session
+
+    Returns:
+        The task ID
+    """
+    db = SessionLocal()
+    try:
+        return JobQueue(db).enqueue(task_type, payload, task_key=task_key).id
+    finally:
+        db.close()
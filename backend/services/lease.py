@@ -0,0 +1,28 @@
+"""
+Task lease signalling for job handlers
+Kept free of other imports so any service a handler drives can stop on a lost lease
+"""
+import threading
+from typing import Optional
+
+
+class LeaseLost(Exception):
+    """Raised inside a task handler once its worker no longer holds the task's lease"""
+
+
+def check_lease(cancel_event: Optional[threading.Event]) -> None:
+    """
+    Stop a task handler between units of work if its worker lost the lease
+
+    Once the lease is lost the task is re-queued and its jobs reset, so
+    another worker may already be running it; carrying on would repeat
+    Google writes and double-count statuses.
+
+    Args:
+        cancel_event: The event JobWorker passes to every handler, or None outside the queue
+
+    Raises:
+        LeaseLost: If the event is set
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        raise LeaseLost("Lease lost; task stopped so the worker now holding it runs it alone")
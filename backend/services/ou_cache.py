@@ -0,0 +1,260 @@
+"""
+In-process cache of OU membership listings
+Shared by group syncs and attribute jobs so popular OUs are not re-downloaded on every run
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+
+from database.models import OUCacheInvalidation
+from database.session import SessionLocal
+
+
+class InvalidationFeed:
+    """
+    Carries OU cache invalidations between processes through the database
+
+    Each cache lives in one process (the API or a python -m worker), so an
+    invalidation is also written to ou_cache_invalidations and every other
+    process replays the rows it has not seen yet, checking at most once per
+    poll interval. Rows older than an hour are pruned: by then every cached
+    listing they could affect has expired.
+    """
+
+    RETENTION = timedelta(hours=1)
+
+    def __init__(self, poll_seconds: float = 5.0):
+        """
+        Initialize feed
+
+        Args:
+            poll_seconds: Minimum seconds between two checks for other processes' invalidations
+        """
+        self.poll_seconds = poll_seconds
+        self._last_id: Optional[int] = None
+        self._own_ids: Set[int] = set()
+        self._next_poll = 0.0
+        self._lock = threading.Lock()
+
+    def publish(self, ou_path: Optional[str]) -> None:
+        """Record an invalidation made in this process for the others"""
+        db = SessionLocal()
+        try:
+            row = OUCacheInvalidation(ou_path=ou_path)
+            db.add(row)
+            db.query(OUCacheInvalidation).filter(
+                OUCacheInvalidation.created_at < datetime.utcnow() - self.RETENTION
+            ).delete(synchronize_session=False)
+            db.commit()
+            with self._lock:
+                self._own_ids.add(row.id)
+        except Exception as e:
+            print(f"[OUCache] Could not publish invalidation of {ou_path or 'all OUs'}: {str(e)}")
+        finally:
+            db.close()
+
+    def poll(self) -> List[Optional[str]]:
+        """
+        Get the OU paths invalidated by other processes since the last poll
+
+        Returns:
+            Invalidated OU paths (None meaning everything); empty between poll intervals
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_poll:
+                return []
+            self._next_poll = now + self.poll_seconds
+
+            db = SessionLocal()
+            try:
+                if self._last_id is None:
+                    # Nothing was cached before this process started polling
+                    self._last_id = db.query(func.max(OUCacheInvalidation.id)).scalar() or 0
+                    return []
+
+                rows = db.query(OUCacheInvalidation.id, OUCacheInvalidation.ou_path).filter(
+                    OUCacheInvalidation.id > self._last_id
+                ).order_by(OUCacheInvalidation.id).all()
+            except Exception as e:
+                print(f"[OUCache] Could not read invalidations from other processes: {str(e)}")
+                return []
+            finally:
+                db.close()
+
+            paths = []
+            for row_id, ou_path in rows:
+                self._last_id = row_id
+                if row_id in self._own_ids:
+                    self._own_ids.discard(row_id)
+                else:
+                    paths.append(ou_path)
+            return paths
+
+
+class OUMembershipCache:
+    """
+    TTL-bounded and size-bounded LRU cache of (OU path, projection) -> user list
+
+    Lists are copied in and out, so callers may append to or filter what they
+    get back without changing the cached listing seen by other jobs. The
+    cache is per process; with an InvalidationFeed, invalidations made in
+    one process reach the caches of the others.
+    """
+
+    def __init__(self, ttl_seconds: float = 300.0, max_entries: int = 256,
+                 invalidation_feed: Optional[InvalidationFeed] = None):
+        """
+        Initialize cache
+
+        Args:
+            ttl_seconds: Seconds an OU listing stays valid
+            max_entries: Maximum number of OU listings kept; least recently used are evicted
+            invalidation_feed: Optional feed sharing invalidations with other processes
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.invalidation_feed = invalidation_feed
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, List[Dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, ou_path: str, projection: str) -> Optional[List[Dict]]:
+        """
+        Get a cached OU listing
+
+        Returns:
+            A copy of the cached user list, or None on miss or expiry
+        """
+        if self.invalidation_feed:
+            for changed_path in self.invalidation_feed.poll():
+                self.invalidate(changed_path, publish=False)
+
+        key = (ou_path, projection)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            stored_at, users = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(users)
+
+    def put(self, ou_path: str, projection: str, users: List[Dict]) -> None:
+        """Store a copy of an OU listing, evicting the least recently used entries beyond max_entries"""
+        key = (ou_path, projection)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), list(users))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_fetch(self, ou_path: str, projection: str, fetch: Callable[[], List[Dict]]) -> List[Dict]:
+        """
+        Get an OU listing from the cache, calling fetch() and caching its result on miss
+
+        Args:
+            ou_path: The OU path
+            projection: Projection / field set the listing was fetched with
+            fetch: Callable returning the user list from the API
+        """
+        users = self.get(ou_path, projection)
+        if users is None:
+            users = fetch()
+            self.put(ou_path, projection, users)
+        return users
+
+    def invalidate(self, ou_path: Optional[str] = None, publish: bool = True) -> int:
+        """
+        Drop cached listings affected by a change in an OU
+
+        A listing of an OU includes its sub-OUs, so entries for the OU itself,
+        its ancestors and its descendants are dropped.
+
+        Args:
+            ou_path: The OU whose users changed, or None to clear the whole cache
+            publish: Also pass the invalidation to other processes through the feed
+
+        Returns:
+            Number of entries removed (in this process)
+        """
+        if publish and self.invalidation_feed:
+            self.invalidation_feed.publish(ou_path)
+
+        with self._lock:
+            if ou_path is None:
+                keys = list(self._entries.keys())
+            else:
+                keys = [key for key in self._entries if self._paths_overlap(key[0], ou_path)]
+
+            for key in keys:
+                del self._entries[key]
+
+            self.invalidations += len(keys)
+            return len(keys)
+
+    @staticmethod
+    def _paths_overlap(cached_path: str, changed_path: str) -> bool:
+        """Check if one OU path equals, contains or is contained in the other"""
+        if cached_path == changed_path or cached_path == '/' or changed_path == '/':
+            return True
+        return (cached_path.startswith(changed_path.rstrip('/') + '/')
+                or changed_path.startswith(cached_path.rstrip('/') + '/'))
+
+    def get_stats(self) -> Dict:
+        """Get hit/miss counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
+
+
+_ou_cache: Optional[OUMembershipCache] = None
+_ou_cache_lock = threading.Lock()
+
+
+def get_ou_cache() -> OUMembershipCache:
+    """
+    Get the process-wide OU membership cache
+
+    Sized from OU_CACHE_TTL_SECONDS (default 300) and OU_CACHE_MAX_ENTRIES (default 256).
+    Invalidations from other processes are picked up within
+    OU_CACHE_INVALIDATION_POLL_SECONDS (default 5).
+    """
+    global _ou_cache
+
+    with _ou_cache_lock:
+        if _ou_cache is None:
+            _ou_cache = OUMembershipCache(
+                ttl_seconds=float(os.getenv("OU_CACHE_TTL_SECONDS", 300)),
+                max_entries=int(os.getenv("OU_CACHE_MAX_ENTRIES", 256)),
+                invalidation_feed=InvalidationFeed(float(os.getenv("OU_CACHE_INVALIDATION_POLL_SECONDS", 5)))
+            )
+        return _ou_cache
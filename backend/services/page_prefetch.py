@@ -0,0 +1,87 @@
+"""
+Pipelined pagination for Directory API list calls
+Fetches the next pages on a background thread while the caller processes the current one
+"""
+import os
+import queue
+import threading
+from typing import Callable, Iterator, List, Optional, Tuple
+
+# fetch_page(page_token) -> (items, next_page_token)
+PageFetcher = Callable[[Optional[str]], Tuple[List, Optional[str]]]
+
+_DONE = object()
+
+
+def iter_pages(fetch_page: PageFetcher, prefetch_depth: Optional[int] = None,
+               start_page_token: Optional[str] = None) -> Iterator[List]:
+    """
+    Iterate over the pages of a paginated list call with bounded read-ahead
+
+    A producer thread keeps up to prefetch_depth pages fetched ahead of the
+    consumer, so network latency of page N+1 overlaps processing of page N.
+    Errors raised while fetching are re-raised in the consumer at the point
+    the failing page would have been yielded. Closing the iterator early
+    stops the producer after its in-flight request.
+
+    Args:
+        fetch_page: Callable taking a page token (None for the first page) and
+            returning (items, next_page_token)
+        prefetch_depth: Pages fetched ahead of the consumer; defaults to
+            PAGE_PREFETCH_DEPTH (2). 0 fetches sequentially on the calling thread.
+        start_page_token: Token of the first page to fetch, to resume a listing
+            part way through; None starts from the first page
+
+    Yields:
+        Lists of items, one per page, in order
+    """
+    if prefetch_depth is None:
+        prefetch_depth = int(os.getenv("PAGE_PREFETCH_DEPTH", 2))
+
+    if prefetch_depth <= 0:
+        page_token = start_page_token
+        while True:
+            items, page_token = fetch_page(page_token)
+            yield items
+            if not page_token:
+                return
+
+    pages: "queue.Queue" = queue.Queue(maxsize=prefetch_depth)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        # Wait for room in the queue, giving up if the consumer went away
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        page_token = start_page_token
+        try:
+            while not stop.is_set():
+                items, page_token = fetch_page(page_token)
+                if not put((items, None)):
+                    return
+                if not page_token:
+                    break
+            put((_DONE, None))
+        except BaseException as error:
+            put((None, error))
+
+    producer = threading.Thread(target=produce, name="page-prefetch", daemon=True)
+    producer.start()
+
+    try:
+        while True:
+            items, error = pages.get()
+            if error is not None:
+                raise error
+            if items is _DONE:
+                return
+            yield items
+    finally:
+        stop.set()
@@ -0,0 +1,210 @@
+"""
+In-memory progress events for running jobs
+Processors publish from worker threads; Server-Sent Events streams subscribe on the event loop
+"""
+import os
+import json
+import asyncio
+import threading
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+class ProgressBroker:
+    """
+    Fan-out of job progress events to asyncio subscribers
+
+    publish() is cheap and never blocks the processor: events are handed to
+    each subscriber's event loop with call_soon_threadsafe. A subscriber that
+    falls behind drops its oldest queued events, since every event carries
+    the job's full progress and only the latest one matters.
+    """
+
+    QUEUE_SIZE = 100
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue, Optional[str]]] = []
+        self._latest: Dict[str, Dict] = {}
+
+    def publish(self, job_uuid: str, **progress) -> None:
+        """
+        Publish the current progress of a job
+
+        Args:
+            job_uuid: The job the event belongs to
+            **progress: Progress fields (status, processed_users, successful_users, ...)
+        """
+        event = {'job_uuid': job_uuid, 'timestamp': time.time(), **progress}
+        with self._lock:
+            self._latest[job_uuid] = event
+            subscribers = list(self._subscribers)
+
+        for loop, queue, job_filter in subscribers:
+            if job_filter is None or job_filter == job_uuid:
+                try:
+                    loop.call_soon_threadsafe(self._offer, queue, event)
+                except RuntimeError:
+                    pass  # Loop closed; the subscriber is going away
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, event: Dict) -> None:
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    def subscribe(self, job_uuid: Optional[str] = None) -> asyncio.Queue:
+        """
+        Subscribe the running event loop to progress events
+
+        Args:
+            job_uuid: Only receive events of this job; None receives every job
+
+        Returns:
+            Queue the events are delivered to; pass it to unsubscribe() when done
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.append((asyncio.get_running_loop(), queue, job_uuid))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        """Stop delivering events to a queue returned by subscribe()"""
+        with self._lock:
+            self._subscribers = [entry for entry in self._subscribers if entry[1] is not queue]
+
+    def get_latest(self, job_uuid: str) -> Optional[Dict]:
+        """Get the last event published for a job in this process"""
+        with self._lock:
+            return self._latest.get(job_uuid)
+
+    def forget(self, job_uuid: str) -> None:
+        """Drop the stored last event of a finished job"""
+        with self._lock:
+            self._latest.pop(job_uuid, None)
+
+
+JOB_PROGRESS_FIELDS = (
+    'status', 'total_users', 'processed_users', 'successful_users',
+    'failed_users', 'progress_percentage', 'error_message'
+)
+
+
+_progress_broker: Optional[ProgressBroker] = None
+_progress_broker_lock = threading.Lock()
+
+
+def get_progress_broker() -> ProgressBroker:
+    """Get the process-wide progress broker"""
+    global _progress_broker
+
+    with _progress_broker_lock:
+        if _progress_broker is None:
+            _progress_broker = ProgressBroker()
+        return _progress_broker
+
+
+def publish_job_progress(job) -> None:
+    """Publish the progress fields of a BatchJob row as they stand in the session"""
+    get_progress_broker().publish(job.job_uuid, **{field: getattr(job, field) for field in JOB_PROGRESS_FIELDS})
+
+
+TERMINAL_STATUSES = ('completed', 'failed')
+
+
+def _read_job_progress(job_uuid: Optional[str], tracked: List[str]) -> Dict[str, Dict]:
+    """Read committed progress of one job, or of active and tracked jobs when job_uuid is None"""
+    from database.session import SessionLocal
+    from database.models import BatchJob
+
+    db = SessionLocal()
+    try:
+        query = db.query(BatchJob)
+        if job_uuid is not None:
+            query = query.filter(BatchJob.job_uuid == job_uuid)
+        else:
+            query = query.filter(BatchJob.status.in_(('pending', 'running')) | BatchJob.job_uuid.in_(tracked))
+        return {
+            job.job_uuid: {'job_uuid': job.job_uuid, **{field: getattr(job, field) for field in JOB_PROGRESS_FIELDS}}
+            for job in query.all()
+        }
+    finally:
+        db.close()
+
+
+def _format_event(event: Dict) -> str:
+    return f"event: progress\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+async def stream_job_progress(
+    job_uuid: Optional[str] = None,
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None
+) -> AsyncIterator[str]:
+    """
+    Server-Sent Events stream of job progress
+
+    Starts with the current state of the job (or of every pending/running
+    job), then forwards events published in this process. Every
+    PROGRESS_STREAM_POLL_SECONDS (15) it also sends a keepalive comment and
+    re-reads the database, so jobs run by a separate `python -m worker`
+    process are reported at their commit interval. A single-job stream ends
+    once the job completes or fails.
+
+    Args:
+        job_uuid: Job to follow; None follows every job
+        is_disconnected: Request.is_disconnected, checked between events
+
+    Yields:
+        SSE-formatted "progress" events and keepalive comments
+    """
+    broker = get_progress_broker()
+    poll_interval = float(os.getenv("PROGRESS_STREAM_POLL_SECONDS", 15))
+    queue = broker.subscribe(job_uuid)
+    sent: Dict[str, Dict] = {}
+
+    def changed(event: Dict) -> bool:
+        previous = sent.get(event['job_uuid'])
+        return previous is None or any(previous.get(field) != event.get(field) for field in JOB_PROGRESS_FIELDS)
+
+    def finished() -> bool:
+        return job_uuid is not None and sent.get(job_uuid, {}).get('status') in TERMINAL_STATUSES
+
+    try:
+        snapshot = await asyncio.to_thread(_read_job_progress, job_uuid, [])
+        if job_uuid is not None and job_uuid not in snapshot:
+            yield f"event: error\ndata: {json.dumps({'job_uuid': job_uuid, 'detail': 'Job not found'})}\n\n"
+            return
+
+        for uuid, event in snapshot.items():
+            # The last in-memory event is fresher than the committed row while the job runs here
+            latest = broker.get_latest(uuid)
+            if latest is not None and event['status'] not in TERMINAL_STATUSES:
+                event = latest
+            sent[uuid] = event
+            yield _format_event(event)
+
+        while not finished():
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=poll_interval)
+                if changed(event):
+                    sent[event['job_uuid']] = event
+                    yield _format_event(event)
+                continue
+            except asyncio.TimeoutError:
+                pass
+
+            if is_disconnected is not None and await is_disconnected():
+                return
+            yield ": keepalive\n\n"
+
+            tracked = [uuid for uuid, event in sent.items() if event.get('status') not in TERMINAL_STATUSES]
+            for uuid, event in (await asyncio.to_thread(_read_job_progress, job_uuid, tracked)).items():
+                # Committed rows lag the in-memory events of a job running in this process
+                latest = broker.get_latest(uuid)
+                if latest is not None and latest.get('status') not in TERMINAL_STATUSES and event['status'] not in TERMINAL_STATUSES:
+                    continue
+                if changed(event):
+                    sent[uuid] = event
+                    yield _format_event(event)
+    finally:
+        broker.unsubscribe(queue)
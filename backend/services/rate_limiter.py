@@ -0,0 +1,233 @@
+"""
+Rate limiting for Google Admin SDK calls
+A single adaptive controller is shared by every processor so the tenant quota is respected globally
+"""
+import os
+import time
+import asyncio
+import threading
+from typing import Dict, Optional, Tuple
+
+
+class TokenBucket:
+    """Thread-safe token bucket rate limiter"""
+
+    def __init__(self, rate_per_second: float, capacity: Optional[float] = None):
+        """
+        Initialize token bucket
+
+        Args:
+            rate_per_second: Tokens added to the bucket per second
+            capacity: Maximum tokens the bucket can hold (burst size). Defaults to one second of tokens.
+        """
+        if rate_per_second <= 0:
+            raise ValueError("rate_per_second must be positive")
+
+        self.rate = float(rate_per_second)
+        self.capacity = float(capacity) if capacity else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate_per_second: float) -> None:
+        """Change the refill rate, keeping the burst size at one second of tokens"""
+        with self._lock:
+            self._refill()
+            self.rate = float(rate_per_second)
+            self.capacity = max(1.0, self.rate)
+            self._tokens = min(self._tokens, self.capacity)
+
+    def _refill(self) -> None:
+        """Add tokens for the time elapsed since the last refill (caller holds the lock)"""
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._last_refill = now
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """
+        Block until the requested tokens are available and consume them
+
+        Requests larger than the burst size are taken one bucket at a time, so
+        they are charged in full and wait for the tokens beyond the first bucket.
+
+        Args:
+            tokens: Number of tokens to consume (e.g. sub-requests in an HTTP batch)
+
+        Returns:
+            Total seconds spent waiting
+        """
+        waited = 0.0
+
+        while True:
+            taken, wait = self._try_consume(tokens)
+            tokens -= taken
+            if tokens <= 0:
+                return waited
+            if wait:
+                time.sleep(wait)
+                waited += wait
+
+    async def acquire_async(self, tokens: float = 1.0) -> float:
+        """Same as acquire(), but waits with asyncio.sleep so the event loop keeps running"""
+        waited = 0.0
+
+        while True:
+            taken, wait = self._try_consume(tokens)
+            tokens -= taken
+            if tokens <= 0:
+                return waited
+            if wait:
+                await asyncio.sleep(wait)
+                waited += wait
+
+    def _try_consume(self, tokens: float) -> Tuple[float, float]:
+        """
+        Consume up to one bucket of the requested tokens
+
+        Returns:
+            (tokens consumed, seconds until the next piece will be available)
+        """
+        with self._lock:
+            self._refill()
+            piece = min(tokens, self.capacity)
+            if self._tokens >= piece:
+                self._tokens -= piece
+                return piece, 0.0
+            return 0.0, (piece - self._tokens) / self.rate
+
+
+class AdaptiveRateController:
+    """
+    AIMD (additive increase, multiplicative decrease) rate controller
+
+    Raises the allowed call rate by a fixed step while calls succeed and cuts it
+    by a factor when Google signals throttling (429 / 403 rateLimitExceeded).
+    Callers block in acquire() instead of sleeping a fixed delay per call.
+    """
+
+    def __init__(
+        self,
+        initial_rate: float,
+        min_rate: float = 1.0,
+        max_rate: float = 40.0,
+        increase_step: float = 1.0,
+        decrease_factor: float = 0.5,
+        adjust_interval: float = 1.0
+    ):
+        """
+        Initialize rate controller
+
+        Args:
+            initial_rate: Starting rate in calls per second
+            min_rate: Lower bound for the rate
+            max_rate: Upper bound for the rate (the tenant quota)
+            increase_step: Calls per second added after each interval of successes
+            decrease_factor: Multiplier applied to the rate on a throttling signal
+            adjust_interval: Minimum seconds between two adjustments in the same direction,
+                so a burst of concurrent 429s only halves the rate once
+        """
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.adjust_interval = adjust_interval
+
+        self._bucket = TokenBucket(max(min_rate, min(initial_rate, max_rate)))
+        self._lock = threading.Lock()
+        self._last_increase = time.monotonic()
+        self._last_decrease = 0.0
+        self._successes = 0
+        self._throttles = 0
+        self._wait_seconds = 0.0
+
+    @property
+    def current_rate(self) -> float:
+        """Currently allowed calls per second"""
+        return self._bucket.rate
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """
+        Block until the controller allows the given number of calls
+
+        Returns:
+            Seconds spent waiting
+        """
+        waited = self._bucket.acquire(tokens)
+        if waited:
+            with self._lock:
+                self._wait_seconds += waited
+        return waited
+
+    async def acquire_async(self, tokens: float = 1.0) -> float:
+        """Wait without blocking the event loop until the controller allows the calls"""
+        waited = await self._bucket.acquire_async(tokens)
+        if waited:
+            with self._lock:
+                self._wait_seconds += waited
+        return waited
+
+    def on_success(self) -> None:
+        """Record a successful call - additive increase at most once per interval"""
+        with self._lock:
+            self._successes += 1
+            now = time.monotonic()
+            if now - self._last_increase < self.adjust_interval:
+                return
+            self._last_increase = now
+            new_rate = min(self.max_rate, self._bucket.rate + self.increase_step)
+            # Applied under the lock so a concurrent decrease can't be overwritten by a stale increase
+            if new_rate != self._bucket.rate:
+                self._bucket.set_rate(new_rate)
+
+    def on_throttle(self) -> None:
+        """Record a throttling signal - multiplicative decrease"""
+        with self._lock:
+            self._throttles += 1
+            now = time.monotonic()
+            if now - self._last_decrease < self.adjust_interval:
+                return
+            self._last_decrease = now
+            # Restart the increase window so we don't immediately climb back up
+            self._last_increase = now
+            new_rate = max(self.min_rate, self._bucket.rate * self.decrease_factor)
+            self._bucket.set_rate(new_rate)
+
+        print(f"[RateController] Throttling signal received, reducing rate to {new_rate:.1f} calls/sec")
+
+    def get_stats(self) -> Dict:
+        """Get controller metrics for monitoring"""
+        with self._lock:
+            return {
+                'current_rate': round(self._bucket.rate, 2),
+                'min_rate': self.min_rate,
+                'max_rate': self.max_rate,
+                'successes': self._successes,
+                'throttles': self._throttles,
+                'total_wait_seconds': round(self._wait_seconds, 2)
+            }
+
+
+_rate_controller: Optional[AdaptiveRateController] = None
+_rate_controller_lock = threading.Lock()
+
+
+def get_rate_controller() -> AdaptiveRateController:
+    """
+    Get the process-wide rate controller for Directory API calls
+
+    The ceiling comes from ADMIN_SDK_QUOTA_PER_MINUTE (default 2400, the Admin SDK
+    per-user quota) and the starting rate from ADMIN_SDK_INITIAL_RATE (default 30
+    calls/sec, the previous fixed 33ms delay).
+    """
+    global _rate_controller
+
+    with _rate_controller_lock:
+        if _rate_controller is None:
+            max_rate = float(os.getenv("ADMIN_SDK_QUOTA_PER_MINUTE", 2400)) / 60.0
+            _rate_controller = AdaptiveRateController(
+                initial_rate=float(os.getenv("ADMIN_SDK_INITIAL_RATE", 30)),
+                min_rate=float(os.getenv("ADMIN_SDK_MIN_RATE", 1)),
+                max_rate=max_rate
+            )
+        return _rate_controller
@@ -0,0 +1,226 @@
+"""
+Sharded parallel tenant scan for alias extraction
+Splits users().list into email-prefix query ranges, pages them concurrently and merges one CSV
+"""
+import os
+import csv
+import time
+import string
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from typing import Callable, Dict, Optional
+
+from services.google_workspace import GoogleWorkspaceService, ALIAS_USER_FIELDS
+
+# Every character a Google Workspace username may start with
+DEFAULT_SHARD_PREFIXES = string.ascii_lowercase + string.digits + "-_'"
+
+
+class ShardedAliasExtractor:
+    """
+    Extracts aliases with one users().list stream per email prefix
+
+    Each shard pages "email:<prefix>*". By default the prefixes cover every
+    legal leading character of a username, so together the shards list the
+    whole tenant without any shard paging all of it. That search also
+    matches alias addresses, so a user can show up in several shards. A user
+    is only written by the shard owning the first character of its primary
+    email; users whose primary email starts outside a narrowed prefix set
+    (ALIAS_SCAN_SHARD_PREFIXES) are written once, by the first shard that
+    finds them through an alias, deduplicated by user id.
+    """
+
+    def __init__(
+        self,
+        google_service: GoogleWorkspaceService,
+        shard_prefixes: Optional[str] = None,
+        max_workers: Optional[int] = None
+    ):
+        """
+        Initialize extractor
+
+        Args:
+            google_service: Authenticated service used by every shard
+            shard_prefixes: Characters to shard on, one shard each; defaults to
+                ALIAS_SCAN_SHARD_PREFIXES (a-z, 0-9, '-', '_' and "'")
+            max_workers: Shards paged concurrently; defaults to ALIAS_SCAN_WORKERS (8)
+        """
+        self.google_service = google_service
+        prefixes = (shard_prefixes or os.getenv("ALIAS_SCAN_SHARD_PREFIXES", DEFAULT_SHARD_PREFIXES)).lower()
+        self.shard_prefixes = list(dict.fromkeys(prefixes))  # Unique, order kept
+        self.max_workers = max(1, max_workers or int(os.getenv("ALIAS_SCAN_WORKERS", 8)))
+
+        self._prefix_set = set(self.shard_prefixes)
+
+        self._lock = threading.Lock()
+        self._unowned_ids = set()  # Users outside every prefix already written by some shard
+        self._stop = threading.Event()  # Set when a shard fails so the others stop after their current page
+        self.shard_progress: Dict[str, Dict] = {
+            shard: {'status': 'pending', 'scanned': 0, 'owned_users': 0, 'users_with_aliases': 0}
+            for shard in self.shard_prefixes
+        }
+
+    def extract(self, file_path: str, progress_callback: Optional[Callable] = None, layout: Optional[str] = None) -> Dict:
+        """
+        Scan all shards concurrently and write the merged alias CSV
+
+        Progress is reported from the calling thread only, so the callback can
+        safely use a database session owned by the caller.
+
+        Args:
+            file_path: Path where CSV should be written
+            progress_callback: Optional callback function(total, processed, users_with_aliases)
+            layout: 'wide' or 'long'; defaults to ALIAS_EXPORT_LAYOUT (wide)
+
+        Returns:
+            Dict with extraction stats, including per-shard progress
+        """
+        if not self.google_service.is_authenticated():
+            raise Exception("Not authenticated")
+
+        layout = (layout or os.getenv("ALIAS_EXPORT_LAYOUT", "wide")).lower()
+        if layout not in ('wide', 'long'):
+            raise Exception(f"Unknown alias export layout: {layout}")
+
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        spill_paths = {shard: f"{file_path}.shard-{index}.partial" for index, shard in enumerate(self.shard_prefixes)}
+
+        print(f"[ShardedAliasExtractor] Scanning {len(self.shard_prefixes)} shards with {self.max_workers} workers...")
+        start = time.monotonic()
+        self._stop.clear()
+        self._unowned_ids.clear()
+        pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="alias-shard")
+
+        try:
+            futures = {
+                pool.submit(self._scan_shard, shard, spill_paths[shard]): shard
+                for shard in self.shard_prefixes
+            }
+
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=1.0, return_when=FIRST_EXCEPTION)
+                for future in done:
+                    error = future.exception()
+                    if error is not None:
+                        raise Exception(f"Shard '{futures[future]}' failed: {error}")
+
+                if progress_callback:
+                    totals = self._totals()
+                    progress_callback(totals['owned_users'], totals['owned_users'], totals['users_with_aliases'])
+
+            totals = self._totals()
+            self._merge(spill_paths, file_path, layout, totals['max_aliases'])
+
+        finally:
+            # On failure: drop queued shards and stop running ones after their current page
+            self._stop.set()
+            pool.shutdown(wait=True, cancel_futures=True)
+            for spill_path in spill_paths.values():
+                if os.path.exists(spill_path):
+                    os.remove(spill_path)
+
+        elapsed = time.monotonic() - start
+        print(f"[ShardedAliasExtractor] {totals['owned_users']} users, {totals['users_with_aliases']} with aliases "
+              f"in {elapsed:.1f}s ({totals['scanned']} scanned across shards)")
+
+        return {
+            'file_path': file_path,
+            'total_users': totals['owned_users'],
+            'users_with_aliases': totals['users_with_aliases'],
+            'max_aliases': totals['max_aliases'],
+            'layout': layout,
+            'shards': self.get_shard_progress()
+        }
+
+    def _owns(self, shard: str, user: Dict) -> bool:
+        """Decide whether this shard writes the user (exactly one shard does)"""
+        first = user.get('primaryEmail', '')[:1].lower()
+        if first in self._prefix_set:
+            return first == shard
+
+        with self._lock:
+            if user.get('id') in self._unowned_ids:
+                return False
+            self._unowned_ids.add(user.get('id'))
+            return True
+
+    @staticmethod
+    def _query(shard: str) -> str:
+        """users().list search for primary emails and aliases starting with the shard prefix"""
+        return "email:" + shard.replace('\\', '\\\\').replace("'", "\\'") + "*"
+
+    def _scan_shard(self, shard: str, spill_path: str) -> None:
+        """Page one shard, writing the users it owns to its spill file"""
+        progress = self.shard_progress[shard]
+        progress['status'] = 'running'
+        max_aliases = 0
+
+        pages = self.google_service.iter_user_pages(
+            user_fields=f'id,{ALIAS_USER_FIELDS}',
+            query=self._query(shard)
+        )
+
+        with open(spill_path, 'w', newline='', encoding='utf-8') as spillfile:
+            writer = csv.writer(spillfile)
+
+            for page_users in pages:
+                if self._stop.is_set():
+                    pages.close()  # Stops the prefetch thread
+                    with self._lock:
+                        progress['status'] = 'cancelled'
+                    return
+
+                owned = 0
+                with_aliases = 0
+                for user in page_users:
+                    if not self._owns(shard, user):
+                        continue
+                    primary_email = user.get('primaryEmail', '')
+
+                    owned += 1
+                    aliases = user.get('aliases', [])
+                    if aliases:
+                        with_aliases += 1
+                        max_aliases = max(max_aliases, len(aliases))
+                        writer.writerow([primary_email] + aliases)
+
+                with self._lock:
+                    progress['scanned'] += len(page_users)
+                    progress['owned_users'] += owned
+                    progress['users_with_aliases'] += with_aliases
+
+        with self._lock:
+            progress['max_aliases'] = max_aliases
+            progress['status'] = 'completed'
+
+    def _merge(self, spill_paths: Dict[str, str], file_path: str, layout: str, max_aliases: int) -> None:
+        """Concatenate the shard spill files into the final CSV, in shard order"""
+        with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            if layout == 'long':
+                writer.writerow(['Current Email', 'Alias'])
+            else:
+                writer.writerow(['Current Email'] + [f'Alias {i+1}' for i in range(max_aliases)])
+
+            for shard in self.shard_prefixes:
+                with open(spill_paths[shard], 'r', newline='', encoding='utf-8') as spillfile:
+                    for row in csv.reader(spillfile):
+                        if layout == 'long':
+                            writer.writerows([row[0], alias] for alias in row[1:])
+                        else:
+                            writer.writerow(row + [''] * (max_aliases + 1 - len(row)))
+
+    def _totals(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'scanned': sum(p['scanned'] for p in self.shard_progress.values()),
+                'owned_users': sum(p['owned_users'] for p in self.shard_progress.values()),
+                'users_with_aliases': sum(p['users_with_aliases'] for p in self.shard_progress.values()),
+                'max_aliases': max((p.get('max_aliases', 0) for p in self.shard_progress.values()), default=0)
+            }
+
+    def get_shard_progress(self) -> Dict[str, Dict]:
+        """Get a copy of the per-shard counters"""
+        with self._lock:
+            return {shard: dict(progress) for shard, progress in self.shard_progress.items()}
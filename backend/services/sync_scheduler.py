@@ -0,0 +1,278 @@
+"""Scheduler for running many group sync configurations concurrently"""
+import os
+import json
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import List, Dict, Optional
+from sqlalchemy.orm import Session
+
+from database.models import BatchJob
+from database.session import SessionLocal
+from services.google_workspace import GoogleWorkspaceService
+from services.directory_mirror import DirectoryMirror
+from services.group_sync_processor import GroupSyncProcessor
+from services.lease import LeaseLost, check_lease
+from services.progress_events import publish_job_progress
+
+
+class DirectorySnapshot:
+    """
+    OU membership listing shared by every config in a sync-all run
+
+    The first config that needs an OU lists it; configs referencing the same
+    OU (concurrently or later in the run) reuse that result.
+    """
+
+    def __init__(self, google_service: GoogleWorkspaceService, cancel_event: Optional[threading.Event] = None):
+        self.google_service = google_service
+        self.cancel_event = cancel_event  # Passed to mirror refreshes so a lost lease stops them too
+        self._users_by_ou: Dict[str, List[Dict]] = {}
+        self._ou_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.ous_listed = 0
+        self.reuse_count = 0
+
+    def get_users_in_ou(self, ou_path: str) -> List[Dict]:
+        """
+        Get users in an OU, listing it from the API only once per run
+
+        Args:
+            ou_path: Path to the organizational unit
+
+        Returns:
+            List of user dicts as returned by GoogleWorkspaceService.get_users_in_ou
+        """
+        with self._lock:
+            ou_lock = self._ou_locks.setdefault(ou_path, threading.Lock())
+
+        # Per-OU lock: concurrent configs wait for the first listing instead of repeating it
+        with ou_lock:
+            if ou_path in self._users_by_ou:
+                with self._lock:
+                    self.reuse_count += 1
+                return self._users_by_ou[ou_path]
+
+            users = self._list_ou(ou_path)
+            with self._lock:
+                self._users_by_ou[ou_path] = users
+                self.ous_listed += 1
+            return users
+
+    def _list_ou(self, ou_path: str) -> List[Dict]:
+        """List an OU from the directory mirror when enabled, otherwise from the API"""
+        if not DirectoryMirror.is_enabled():
+            return self.google_service.get_users_in_ou(ou_path)
+
+        db = SessionLocal()
+        try:
+            mirror = DirectoryMirror(db, self.google_service, cancel_event=self.cancel_event)
+            mirror.ensure_fresh()
+            return mirror.get_users_in_ou(ou_path)
+        finally:
+            db.close()
+
+
+class SyncAllScheduler:
+    """
+    Runs group sync jobs for many configurations with a bounded worker pool
+
+    Each run is stored as a BatchJob of type 'sync_all' keyed by its run ID,
+    so the API sees its progress from any process and after a restart. Its
+    counters count configs rather than users, and the value column holds
+    the member job UUIDs and the final run statistics as JSON.
+    """
+
+    JOB_TYPE = 'sync_all'
+
+    def __init__(self, google_service: GoogleWorkspaceService, max_workers: Optional[int] = None,
+                 cancel_event: Optional[threading.Event] = None):
+        self.google_service = google_service
+        self.max_workers = max(1, max_workers or int(os.getenv("SYNC_ALL_WORKERS", 4)))
+        # Set by JobWorker when the run's lease is lost; every job of the run checks it
+        self.cancel_event = cancel_event
+
+    @classmethod
+    def new_run(cls, db: Session, job_uuids: List[str], run_id: Optional[str] = None) -> str:
+        """
+        Register a new sync-all run
+
+        Args:
+            db: Database session
+            job_uuids: Group sync job UUIDs that belong to the run
+            run_id: ID to register the run under; a new one is generated if omitted
+
+        Returns:
+            The run ID
+        """
+        run_id = run_id or str(uuid.uuid4())
+        db.add(BatchJob(
+            job_uuid=run_id,
+            job_type=cls.JOB_TYPE,
+            status='pending',
+            value=json.dumps({'job_uuids': job_uuids}),
+            total_users=len(job_uuids),
+            processed_users=0,
+            successful_users=0,
+            failed_users=0,
+            progress_percentage=0.0
+        ))
+        db.commit()
+        return run_id
+
+    @classmethod
+    def get_run(cls, db: Session, run_id: str) -> Optional[Dict]:
+        """Get the stats of a sync-all run"""
+        job = db.query(BatchJob).filter(
+            BatchJob.job_uuid == run_id,
+            BatchJob.job_type == cls.JOB_TYPE
+        ).first()
+        return cls.format_run(job) if job else None
+
+    @staticmethod
+    def format_run(job: BatchJob) -> Dict:
+        """Build the stats dict of a loaded sync-all run"""
+        run = {
+            'run_id': job.job_uuid,
+            'status': job.status,
+            'total_configs': job.total_users,
+            'completed_configs': job.successful_users,
+            'failed_configs': job.failed_users,
+            'created_at': job.created_at.isoformat() if job.created_at else None,
+            'started_at': job.started_at.isoformat() if job.started_at else None,
+            'completed_at': job.completed_at.isoformat() if job.completed_at else None,
+            'error_message': job.error_message
+        }
+        run.update(json.loads(job.value) if job.value else {})
+        return run
+
+    def run(self, run_id: str) -> Dict:
+        """
+        Process all jobs of a run concurrently, sharing one directory snapshot
+
+        Args:
+            run_id: The run ID returned by new_run()
+
+        Returns:
+            Dict with aggregate run statistics
+        """
+        db = SessionLocal()
+        try:
+            run = self.get_run(db, run_id)
+            if not run:
+                raise Exception(f"Sync-all run {run_id} not found")
+
+            # A retried run only starts the jobs its previous attempt did not finish
+            job_uuids = run['job_uuids']
+            statuses = dict(db.query(BatchJob.job_uuid, BatchJob.status).filter(BatchJob.job_uuid.in_(job_uuids)).all())
+        finally:
+            db.close()
+
+        to_run = [job_uuid for job_uuid in job_uuids if statuses.get(job_uuid) == 'pending']
+        completed = sum(1 for job_uuid in job_uuids if statuses.get(job_uuid) == 'completed')
+        failed = len(job_uuids) - len(to_run) - completed
+
+        snapshot = DirectorySnapshot(self.google_service, cancel_event=self.cancel_event)
+        self._update_run(run_id, status='running', started_at=datetime.utcnow(),
+                         completed_configs=completed, failed_configs=failed)
+
+        print(f"[SyncAllScheduler] Run {run_id}: syncing {len(to_run)} configs with {self.max_workers} workers")
+        start = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="sync-all") as pool:
+            futures = {
+                pool.submit(self._run_job, job_uuid, snapshot): job_uuid
+                for job_uuid in to_run
+            }
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    completed += 1
+                except LeaseLost:
+                    continue  # Re-raised below once every job of the run has stopped
+                except Exception as e:
+                    failed += 1
+                    print(f"[SyncAllScheduler] Job {futures[future]} failed: {str(e)}")
+
+                self._update_run(run_id, completed_configs=completed, failed_configs=failed)
+
+        check_lease(self.cancel_event)
+        elapsed = time.monotonic() - start
+        totals = self._job_totals(job_uuids)
+
+        stats = {
+            'total_operations': totals['processed'],
+            'successful_operations': totals['successful'],
+            'failed_operations': totals['failed'],
+            'elapsed_seconds': round(elapsed, 2),
+            'operations_per_second': round(totals['processed'] / elapsed, 2) if elapsed > 0 else 0.0,
+            'ous_listed': snapshot.ous_listed,
+            'ou_listings_reused': snapshot.reuse_count
+        }
+        self._update_run(run_id, status='completed', completed_at=datetime.utcnow(),
+                         completed_configs=completed, failed_configs=failed, stats=stats)
+
+        print(f"[SyncAllScheduler] Run {run_id} finished in {elapsed:.1f}s: "
+              f"{completed} configs completed, {failed} failed, "
+              f"{stats['operations_per_second']} ops/sec, {snapshot.ous_listed} OUs listed "
+              f"({snapshot.reuse_count} listings reused)")
+        db = SessionLocal()
+        try:
+            return self.get_run(db, run_id)
+        finally:
+            db.close()
+
+    def _run_job(self, job_uuid: str, snapshot: DirectorySnapshot) -> Dict:
+        """Run one group sync job on a worker thread with its own database session"""
+        db = SessionLocal()
+        try:
+            processor = GroupSyncProcessor(
+                db, self.google_service, directory_snapshot=snapshot, cancel_event=self.cancel_event
+            )
+            return processor.process_job(job_uuid)
+        finally:
+            db.close()
+
+    def _job_totals(self, job_uuids: List[str]) -> Dict[str, int]:
+        """Sum the operation counters of all jobs in the run"""
+        db = SessionLocal()
+        try:
+            jobs = db.query(BatchJob).filter(BatchJob.job_uuid.in_(job_uuids)).all()
+            return {
+                'processed': sum(job.processed_users or 0 for job in jobs),
+                'successful': sum(job.successful_users or 0 for job in jobs),
+                'failed': sum(job.failed_users or 0 for job in jobs)
+            }
+        finally:
+            db.close()
+
+    @classmethod
+    def _update_run(cls, run_id: str, status: Optional[str] = None, started_at: Optional[datetime] = None,
+                    completed_at: Optional[datetime] = None, completed_configs: Optional[int] = None,
+                    failed_configs: Optional[int] = None, stats: Optional[Dict] = None) -> None:
+        """Write run progress to its BatchJob row, with a short-lived session of its own"""
+        db = SessionLocal()
+        try:
+            job = db.query(BatchJob).filter(BatchJob.job_uuid == run_id).first()
+            if not job:
+                return
+            if status is not None:
+                job.status = status
+            if started_at is not None:
+                job.started_at = started_at
+            if completed_at is not None:
+                job.completed_at = completed_at
+            if completed_configs is not None:
+                job.successful_users = completed_configs
+            if failed_configs is not None:
+                job.failed_users = failed_configs
+            job.processed_users = (job.successful_users or 0) + (job.failed_users or 0)
+            job.progress_percentage = (job.processed_users / job.total_users * 100) if job.total_users else 100.0
+            if stats is not None:
+                job.value = json.dumps({**(json.loads(job.value) if job.value else {}), **stats})
+            db.commit()
+            publish_job_progress(job)
+        finally:
+            db.close()
@@ -1,14 +1,87 @@
 """Service for caching users from organizational units before batch processing"""
+import os
 import json
+import time
+from collections import Counter
+from datetime import datetime
 from typing import List, Dict, Optional
+from sqlalchemy import bindparam, case, func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
-from database.models import CachedUser, BatchJob
+from database.bulk import copy_insert_ignoring_conflicts
+from database.models import CachedUser, BatchJob, JobStatusCount
 from services.google_workspace import GoogleWorkspaceService
+from services.progress_events import get_progress_broker
+from services.user_index import TenantUserIndex
+
+
+def _dialect_insert(db: Session, model):
+    """INSERT construct with ON CONFLICT support for the session's database, or None"""
+    dialect = db.get_bind().dialect.name
+    if dialect == 'sqlite':
+        return sqlite_insert(model)
+    if dialect == 'postgresql':
+        return postgresql_insert(model)
+    return None
+
+
+def apply_status_deltas(db: Session, job_uuid: str, deltas: Dict[str, int]) -> None:
+    """
+    Add per-status deltas to a job's job_status_counts rows
+
+    Runs in the caller's transaction, so the counters commit (or roll back)
+    together with the cached_users change they describe.
+    """
+    for status, delta in deltas.items():
+        if not delta:
+            continue
+
+        statement = _dialect_insert(db, JobStatusCount)
+        if statement is not None:
+            statement = statement.values(job_uuid=job_uuid, status=status, count=delta)
+            db.execute(statement.on_conflict_do_update(
+                index_elements=['job_uuid', 'status'],
+                set_={'count': JobStatusCount.count + statement.excluded['count']}
+            ))
+            continue
+
+        updated = db.execute(
+            update(JobStatusCount).where(
+                JobStatusCount.job_uuid == job_uuid,
+                JobStatusCount.status == status
+            ).values(count=JobStatusCount.count + delta).execution_options(synchronize_session=False)
+        ).rowcount
+        if not updated:
+            db.add(JobStatusCount(job_uuid=job_uuid, status=status, count=delta))
+            db.flush()
+
+
+def apply_status_transitions(db: Session, job_uuid: str, new_status_by_id: Dict[int, str]) -> None:
+    """
+    Update the counters for cached users about to move to new statuses
+
+    Must be called before the rows are updated: their current statuses are
+    read (one small GROUP BY over the given IDs) to know what to decrement.
+    """
+    deltas = Counter(new_status_by_id.values())
+    user_ids = list(new_status_by_id)
+    for start in range(0, len(user_ids), 500):
+        current = db.query(CachedUser.status, func.count(CachedUser.id)).filter(
+            CachedUser.id.in_(user_ids[start:start + 500])
+        ).group_by(CachedUser.status).all()
+        for status, count in current:
+            deltas[status] -= count
+
+    apply_status_deltas(db, job_uuid, deltas)
 
 
 class UserCacheService:
     """Handles user caching from Google Workspace OUs"""
 
+    # Fields kept in CachedUser.user_data; batch jobs only need identity and OU
+    CACHED_USER_FIELDS = 'id,primaryEmail,name/fullName,orgUnitPath'
+
     def __init__(self, db: Session, google_service: GoogleWorkspaceService):
         self.db = db
         self.google_service = google_service
@@ -27,44 +100,37 @@ class UserCacheService:
         if not self.google_service.is_authenticated():
             raise Exception("Google Workspace service not authenticated")
 
-        cached_count = 0
         errors = []
-        user_emails_seen = set()  # Deduplicate users
+        user_index = self._build_user_index(ou_paths)
+        chunk_size = max(1, int(os.getenv("CACHE_INSERT_CHUNK_SIZE", 1000)))
 
         try:
+            # Fetch users from all OUs (resolved in memory when the tenant was indexed)
+            if user_index is not None:
+                users_by_ou = {ou_path: user_index.users_in_ou(ou_path) for ou_path in ou_paths}
+            else:
+                users_by_ou = self._fetch_users_from_ous(ou_paths, errors)
+
+            # Users in several selected OUs are kept once, by the unique (job_uuid, email) index
+            rows = []
             for ou_path in ou_paths:
-                try:
-                    # Fetch users from this OU
-                    users = self._fetch_users_from_ou(ou_path)
-
-                    # Cache each user
-                    for user in users:
-                        user_email = user.get('primaryEmail')
-
-                        # Skip if already cached (avoid duplicates)
-                        if user_email in user_emails_seen:
-                            continue
-
-                        user_emails_seen.add(user_email)
-
-                        # Create cached user record
-                        cached_user = CachedUser(
-                            job_uuid=job_uuid,
-                            email=user_email,
-                            ou_path=user.get('orgUnitPath', ou_path),
-                            user_data=json.dumps(user),  # Store full user profile
-                            status='pending'
-                        )
-                        self.db.add(cached_user)
-                        cached_count += 1
-
-                    # Commit after each OU to avoid losing progress
-                    self.db.commit()
-
-                except Exception as e:
-                    error_msg = f"Error fetching users from {ou_path}: {str(e)}"
-                    errors.append(error_msg)
-                    print(f"⚠️  {error_msg}")
+                for user in users_by_ou.get(ou_path, []):
+                    rows.append({
+                        'job_uuid': job_uuid,
+                        'email': user.get('primaryEmail'),
+                        'ou_path': user.get('orgUnitPath', ou_path),
+                        'user_data': json.dumps(user, separators=(',', ':')),  # Store the fetched user fields
+                        'status': 'pending'
+                    })
+
+                    if len(rows) >= chunk_size:
+                        self._insert_cached_users(job_uuid, rows)
+                        rows = []
+
+            if rows:
+                self._insert_cached_users(job_uuid, rows)
+
+            cached_count = self.get_user_count(job_uuid)['total']
 
             return {
                 'total_users': cached_count,
@@ -76,84 +142,90 @@ class UserCacheService:
             self.db.rollback()
             raise Exception(f"Failed to cache users: {str(e)}")
 
-    def _fetch_users_from_ou(self, ou_path: str) -> List[Dict]:
+    def _insert_cached_users(self, job_uuid: str, rows: List[Dict]) -> None:
         """
-        Fetch all users from a specific organizational unit
+        Insert a chunk of CachedUser rows in one executemany, skipping duplicates
+
+        Bypasses the ORM unit of work: no CachedUser objects are created or
+        tracked. Rows already present for the same (job_uuid, email) are
+        skipped by the database; only the rows actually inserted are added
+        to the job's pending counter. On PostgreSQL the chunk is streamed
+        with COPY instead of an executemany.
+        """
+        statement = _dialect_insert(self.db, CachedUser)
+        if self.db.get_bind().dialect.name == 'postgresql':
+            inserted = copy_insert_ignoring_conflicts(self.db, CachedUser.__table__, rows, ['job_uuid', 'email'])
+        elif statement is not None:
+            statement = statement.on_conflict_do_nothing(index_elements=['job_uuid', 'email'])
+            inserted = len(self.db.execute(statement.returning(CachedUser.id), rows).all())
+        else:
+            self.db.execute(insert(CachedUser), rows)
+            inserted = len(rows)
+
+        apply_status_deltas(self.db, job_uuid, {'pending': inserted})
+        # Commit per chunk to avoid losing progress
+        self.db.commit()
+
+    def _build_user_index(self, ou_paths: List[str]) -> Optional[TenantUserIndex]:
+        """
+        Index the whole tenant in one sweep when enough OUs are selected
+
+        Below USER_INDEX_MIN_OUS (default 3) selected OUs, per-OU queries are
+        cheaper than listing every user, so no index is built.
 
         Args:
-            ou_path: The OU path to fetch users from
+            ou_paths: List of organizational unit paths being cached
 
         Returns:
-            List of user dictionaries
+            TenantUserIndex, or None to fall back to per-OU queries
         """
-        users = []
-        page_token = None
+        if len(set(ou_paths)) < int(os.getenv("USER_INDEX_MIN_OUS", 3)):
+            return None
 
         try:
-            while True:
-                # Try query-based filtering first (more efficient)
-                params = {
-                    'customer': 'my_customer',
-                    'maxResults': 500,  # Max allowed by API
-                    'projection': 'full',
-                    'query': f'orgUnitPath={ou_path}'
-                }
-
-                if page_token:
-                    params['pageToken'] = page_token
-
-                results = self.google_service.service.users().list(**params).execute()
-
-                batch_users = results.get('users', [])
-                users.extend(batch_users)
-
-                page_token = results.get('nextPageToken')
-                if not page_token:
-                    break
-
+            user_index = self.google_service.build_user_index(user_fields=self.CACHED_USER_FIELDS)
+            print(f"Indexed {user_index.total_users} users for {len(ou_paths)} OUs in one sweep")
+            return user_index
         except Exception as e:
-            # Fallback: fetch all users and filter client-side
-            print(f"Query filtering failed for {ou_path}, using client-side filtering")
-            users = self._fetch_users_client_side_filter(ou_path)
-
-        return users
+            print(f"⚠️  Tenant user index failed, fetching OUs one by one: {str(e)}")
+            return None
 
-    def _fetch_users_client_side_filter(self, ou_path: str) -> List[Dict]:
+    def _fetch_users_from_ous(self, ou_paths: List[str], errors: List[str]) -> Dict[str, List[Dict]]:
         """
-        Fallback method: fetch all users and filter by OU client-side
+        Fetch all users from several organizational units
+
+        OUs whose orgUnitPath query fails are resolved together by a single
+        client-side filtered sweep of the tenant.
 
         Args:
-            ou_path: The OU path to filter by
+            ou_paths: The OU paths to fetch users from
+            errors: List that fetch errors are appended to
 
         Returns:
-            List of user dictionaries
+            Dict mapping each successfully fetched OU path to its user dictionaries
         """
-        users = []
-        page_token = None
-
-        while True:
-            params = {
-                'customer': 'my_customer',
-                'maxResults': 500,
-                'projection': 'full'
-            }
-
-            if page_token:
-                params['pageToken'] = page_token
-
-            results = self.google_service.service.users().list(**params).execute()
-
-            # Filter users by OU path (include sub-OUs)
-            for user in results.get('users', []):
-                user_ou = user.get('orgUnitPath', '')
-                if user_ou == ou_path or user_ou.startswith(ou_path + '/'):
-                    users.append(user)
-
-            page_token = results.get('nextPageToken')
-            if not page_token:
-                break
+        users_by_ou = {}
+        fallback_ous = []
+
+        for ou_path in ou_paths:
+            try:
+                # Query-based filtering (more efficient), shared through the OU cache
+                users_by_ou[ou_path] = self.google_service.list_users_in_ou(ou_path, user_fields=self.CACHED_USER_FIELDS)
+            except Exception as e:
+                print(f"Query filtering failed for {ou_path}, using client-side filtering")
+                fallback_ous.append(ou_path)
+
+        if fallback_ous:
+            try:
+                # Fallback: fetch all users once and filter client-side for every failing OU
+                users_by_ou.update(self.google_service.list_users_in_ous_client_side(fallback_ous, user_fields=self.CACHED_USER_FIELDS))
+            except Exception as e:
+                for ou_path in fallback_ous:
+                    error_msg = f"Error fetching users from {ou_path}: {str(e)}"
+                    errors.append(error_msg)
+                    print(f"⚠️  {error_msg}")
 
-        return users
+        return users_by_ou
 
     def get_cached_users(self, job_uuid: str, status: Optional[str] = None) -> List[CachedUser]:
         """
@@ -183,24 +255,55 @@ class UserCacheService:
         """
         Update the status of a cached user
 
+        For many users, record them in a CachedUserStatusBuffer instead.
+
         Args:
             job_uuid: The batch job UUID
             email: User email
             status: New status (processing, success, failed)
             error_message: Optional error message for failed status
         """
-        from datetime import datetime
-
-        user = self.db.query(CachedUser).filter(
+        user_id = self.db.query(CachedUser.id).filter(
             CachedUser.job_uuid == job_uuid,
             CachedUser.email == email
-        ).first()
+        ).scalar()
+        if user_id is None:
+            return
+
+        apply_status_transitions(self.db, job_uuid, {user_id: status})
+        self.db.execute(
+            update(CachedUser).where(CachedUser.id == user_id).values(
+                status=status,
+                error_message=error_message,
+                processed_at=datetime.utcnow()
+            ).execution_options(synchronize_session=False)
+        )
+        self.db.commit()
+
+    def reset_processing_users(self, job_uuids: List[str]) -> int:
+        """
+        Put users left 'processing' by an interrupted run back to 'pending'
 
-        if user:
-            user.status = status
-            user.error_message = error_message
-            user.processed_at = datetime.utcnow()
-            self.db.commit()
+        Does not commit; the caller commits with its other job changes.
+
+        Returns:
+            Number of users reset
+        """
+        reset = 0
+        for job_uuid in job_uuids:
+            count = self.db.execute(
+                update(CachedUser).where(
+                    CachedUser.job_uuid == job_uuid,
+                    CachedUser.status == 'processing'
+                ).values(status='pending').execution_options(synchronize_session=False)
+            ).rowcount
+            apply_status_deltas(self.db, job_uuid, {'processing': -count, 'pending': count})
+            reset += count
+        return reset
+
+    def status_buffer(self, job_uuid: str) -> "CachedUserStatusBuffer":
+        """Get a write buffer for the per-user results of a job"""
+        return CachedUserStatusBuffer(self.db, job_uuid)
 
     def get_user_count(self, job_uuid: str) -> Dict[str, int]:
         """
@@ -212,27 +315,241 @@ class UserCacheService:
         Returns:
             Dict with counts: total, pending, processing, success, failed
         """
-        from sqlalchemy import func
+        return self.get_user_counts([job_uuid])[job_uuid]
 
-        counts = self.db.query(
-            CachedUser.status,
-            func.count(CachedUser.id)
-        ).filter(
-            CachedUser.job_uuid == job_uuid
-        ).group_by(
-            CachedUser.status
-        ).all()
+    def get_user_counts(self, job_uuids: List[str]) -> Dict[str, Dict[str, int]]:
+        """
+        Get counts of users by status for several jobs
 
+        Reads the maintained job_status_counts rows (a handful per job)
+        instead of scanning cached_users.
+
+        Args:
+            job_uuids: The batch job UUIDs
+
+        Returns:
+            Dict mapping each job UUID to its counts (total, pending, processing, success, failed)
+        """
         result = {
-            'total': 0,
-            'pending': 0,
-            'processing': 0,
-            'success': 0,
-            'failed': 0
+            job_uuid: {'total': 0, 'pending': 0, 'processing': 0, 'success': 0, 'failed': 0}
+            for job_uuid in job_uuids
         }
+        if not job_uuids:
+            return result
 
-        for status, count in counts:
-            result[status] = count
-            result['total'] += count
+        counts = self.db.query(
+            JobStatusCount.job_uuid,
+            JobStatusCount.status,
+            JobStatusCount.count
+        ).filter(
+            JobStatusCount.job_uuid.in_(job_uuids)
+        ).all()
+
+        for job_uuid, status, count in counts:
+            result[job_uuid][status] = count
+            result[job_uuid]['total'] += count
 
         return result
+
+    def rebuild_status_counts(self, job_uuids: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Check job_status_counts against cached_users and correct any drift
+
+        Args:
+            job_uuids: Jobs to check; defaults to every job with cached users or counters
+
+        Returns:
+            One dict per corrected (job_uuid, status): the stored and actual counts
+        """
+        if job_uuids is None:
+            job_uuids = [row[0] for row in self.db.query(CachedUser.job_uuid).distinct()]
+            job_uuids += [row[0] for row in self.db.query(JobStatusCount.job_uuid).distinct() if row[0] not in job_uuids]
+
+        stored = self.get_user_counts(job_uuids)
+        actual = {job_uuid: Counter() for job_uuid in job_uuids}
+        for start in range(0, len(job_uuids), 500):
+            rows = self.db.query(CachedUser.job_uuid, CachedUser.status, func.count(CachedUser.id)).filter(
+                CachedUser.job_uuid.in_(job_uuids[start:start + 500])
+            ).group_by(CachedUser.job_uuid, CachedUser.status).all()
+            for job_uuid, status, count in rows:
+                actual[job_uuid][status] = count
+
+        corrections = []
+        for job_uuid in job_uuids:
+            statuses = set(actual[job_uuid]) | {status for status in stored[job_uuid] if status != 'total'}
+            deltas = {}
+            for status in statuses:
+                delta = actual[job_uuid][status] - stored[job_uuid].get(status, 0)
+                if delta:
+                    deltas[status] = delta
+                    corrections.append({
+                        'job_uuid': job_uuid,
+                        'status': status,
+                        'stored': stored[job_uuid].get(status, 0),
+                        'actual': actual[job_uuid][status]
+                    })
+            apply_status_deltas(self.db, job_uuid, deltas)
+
+        self.db.commit()
+        return corrections
+
+    def backfill_status_counts(self) -> int:
+        """
+        Build counters for jobs cached before job_status_counts existed
+
+        Returns:
+            Number of jobs backfilled
+        """
+        counted = self.db.query(JobStatusCount.job_uuid).distinct()
+        job_uuids = [row[0] for row in self.db.query(CachedUser.job_uuid).filter(
+            CachedUser.job_uuid.notin_(counted)
+        ).distinct()]
+        if job_uuids:
+            self.rebuild_status_counts(job_uuids)
+        return len(job_uuids)
+
+
+class CachedUserStatusBuffer:
+    """
+    Accumulates per-user results of a batch job and writes them in bulk
+
+    Each flush is one executemany UPDATE of the buffered CachedUser rows, the
+    matching job_status_counts adjustments, and one UPDATE copying those
+    counters onto the job, so database writes happen per interval rather
+    than per user API call. Live progress is published from in-memory counts
+    to the progress broker, so the flush interval only bounds how much work
+    a crash can lose.
+    """
+
+    def __init__(self, db: Session, job_uuid: str, flush_interval: Optional[float] = None,
+                 max_pending: Optional[int] = None):
+        """
+        Initialize buffer
+
+        Args:
+            db: Session the updates are executed on
+            job_uuid: The batch job the users belong to
+            flush_interval: Seconds between flushes; defaults to STATUS_FLUSH_INTERVAL_SECONDS (5)
+            max_pending: Results that force a flush regardless of time; defaults to
+                STATUS_FLUSH_MAX_PENDING (500)
+        """
+        self.db = db
+        self.job_uuid = job_uuid
+        self.flush_interval = flush_interval if flush_interval is not None else float(os.getenv("STATUS_FLUSH_INTERVAL_SECONDS", 5))
+        self.max_pending = max_pending or int(os.getenv("STATUS_FLUSH_MAX_PENDING", 500))
+        self.event_interval = float(os.getenv("PROGRESS_EVENT_INTERVAL_SECONDS", 0.5))
+        self._pending: List[Dict] = []
+        self._last_flush = time.monotonic()
+        self._last_event = 0.0
+        self._totals: Optional[Dict[str, int]] = None
+
+    def mark_processing(self, user_ids: List[int]) -> None:
+        """Mark users as in flight with one statement (committed with the next flush)"""
+        if user_ids:
+            apply_status_transitions(self.db, self.job_uuid, {user_id: 'processing' for user_id in user_ids})
+            self.db.execute(
+                update(CachedUser).where(CachedUser.id.in_(user_ids)).values(
+                    status='processing'
+                ).execution_options(synchronize_session=False)
+            )
+
+    def record(self, user_id: int, status: str, error_message: Optional[str] = None) -> None:
+        """Buffer the result of one user, flushing if the interval has passed"""
+        self._pending.append({
+            'b_id': user_id,
+            'b_status': status,
+            'b_error_message': error_message,
+            'b_processed_at': datetime.utcnow()
+        })
+
+        totals = self._load_totals()
+        totals['successful' if status == 'success' else 'failed'] += 1
+        if time.monotonic() - self._last_event >= self.event_interval:
+            self.publish()
+
+        if len(self._pending) >= self.max_pending or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _load_totals(self) -> Dict[str, int]:
+        """Read the job's committed counters once; record() keeps them current in memory"""
+        if self._totals is None:
+            counts = dict(self.db.query(JobStatusCount.status, JobStatusCount.count).filter(
+                JobStatusCount.job_uuid == self.job_uuid
+            ).all())
+            total_users = self.db.query(BatchJob.total_users).filter(
+                BatchJob.job_uuid == self.job_uuid
+            ).scalar()
+            self._totals = {
+                'total': total_users or 0,
+                'successful': counts.get('success', 0),
+                'failed': counts.get('failed', 0)
+            }
+        return self._totals
+
+    def publish(self) -> None:
+        """Publish the in-memory progress of the job to stream subscribers"""
+        totals = self._load_totals()
+        processed = totals['successful'] + totals['failed']
+        get_progress_broker().publish(
+            self.job_uuid,
+            status='running',
+            total_users=totals['total'],
+            processed_users=processed,
+            successful_users=totals['successful'],
+            failed_users=totals['failed'],
+            progress_percentage=(processed * 100.0 / totals['total']) if totals['total'] > 0 else 0.0
+        )
+        self._last_event = time.monotonic()
+
+    def flush(self) -> int:
+        """
+        Write buffered results and refresh the job counters
+
+        Returns:
+            Number of user results written
+        """
+        # A user recorded twice since the last flush keeps its latest result
+        pending = list({row['b_id']: row for row in self._pending}.values())
+        written = len(pending)
+        if pending:
+            apply_status_transitions(self.db, self.job_uuid, {row['b_id']: row['b_status'] for row in pending})
+            self.db.execute(
+                update(CachedUser.__table__).where(
+                    CachedUser.__table__.c.id == bindparam('b_id')
+                ).values(
+                    status=bindparam('b_status'),
+                    error_message=bindparam('b_error_message'),
+                    processed_at=bindparam('b_processed_at')
+                ),
+                pending
+            )
+            self._pending = []
+
+        self._update_job_counters()
+        self.db.commit()
+        self._last_flush = time.monotonic()
+        if written:
+            self.publish()
+        return written
+
+    def _update_job_counters(self) -> None:
+        """Copy successful/failed/processed counts and progress from job_status_counts onto the job in one statement"""
+        totals = select(
+            JobStatusCount.job_uuid,
+            func.sum(case((JobStatusCount.status == 'success', JobStatusCount.count), else_=0)).label('successful'),
+            func.sum(case((JobStatusCount.status == 'failed', JobStatusCount.count), else_=0)).label('failed')
+        ).where(JobStatusCount.job_uuid == self.job_uuid).group_by(JobStatusCount.job_uuid).subquery()
+        processed = totals.c.successful + totals.c.failed
+
+        # UPDATE ... FROM the aggregate, joined on job_uuid
+        self.db.execute(
+            update(BatchJob).where(BatchJob.job_uuid == totals.c.job_uuid).values(
+                successful_users=totals.c.successful,
+                failed_users=totals.c.failed,
+                processed_users=processed,
+                progress_percentage=case(
+                    (BatchJob.total_users > 0, processed * 100.0 / BatchJob.total_users),
+                    else_=0.0
+                )
+            ).execution_options(synchronize_session=False)
+        )
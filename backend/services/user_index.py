@@ -0,0 +1,83 @@
+"""
+Tenant-wide user index bucketed by organizational unit
+Built from one paged users().list sweep so any number of OU selections resolve in memory
+"""
+from typing import Dict, Iterable, List, Optional
+
+
+class _OUNode:
+    """Trie node for one OU path segment, holding the users placed directly in that OU"""
+
+    __slots__ = ('children', 'users')
+
+    def __init__(self):
+        self.children: Dict[str, "_OUNode"] = {}
+        self.users: List[Dict] = []
+
+
+class TenantUserIndex:
+    """
+    Users of a whole tenant keyed by orgUnitPath
+
+    OU paths are stored in a prefix trie (one node per path segment), so the
+    users of an OU and all of its sub-OUs are found by walking a single subtree.
+    """
+
+    def __init__(self, projection: str = 'basic'):
+        """
+        Initialize an empty index
+
+        Args:
+            projection: Directory API projection the indexed users were fetched with
+        """
+        self.projection = projection
+        self._root = _OUNode()
+        self.total_users = 0
+
+    @staticmethod
+    def _segments(ou_path: str) -> List[str]:
+        """Split an OU path into its segments ('/' is the root and has none)"""
+        return [segment for segment in (ou_path or '/').split('/') if segment]
+
+    def add(self, user: Dict) -> None:
+        """Add a user resource under its orgUnitPath"""
+        node = self._root
+        for segment in self._segments(user.get('orgUnitPath', '/')):
+            node = node.children.setdefault(segment, _OUNode())
+        node.users.append(user)
+        self.total_users += 1
+
+    def add_all(self, users: Iterable[Dict]) -> None:
+        """Add a page of user resources"""
+        for user in users:
+            self.add(user)
+
+    def _find(self, ou_path: str) -> Optional[_OUNode]:
+        node = self._root
+        for segment in self._segments(ou_path):
+            node = node.children.get(segment)
+            if node is None:
+                return None
+        return node
+
+    def users_in_ou(self, ou_path: str) -> List[Dict]:
+        """
+        Get the users of an OU and its sub-OUs
+
+        Args:
+            ou_path: Path to the organizational unit (e.g., /Sales)
+
+        Returns:
+            List of user resources, empty if the OU holds no users
+        """
+        node = self._find(ou_path)
+        if node is None:
+            return []
+
+        users = []
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            users.extend(current.users)
+            stack.extend(current.children.values())
+        return users
@@ -0,0 +1,33 @@
+"""
+Shared test setup
+
+Points the app at a scratch SQLite database before database.session is
+imported; set DATABASE_URL to run the database tests against PostgreSQL.
+"""
+import os
+import tempfile
+
+if not os.getenv('DATABASE_URL'):
+    os.environ['DATABASE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='dea-tests-'), 'test.db')
+os.environ.setdefault('ENCRYPTION_KEY', 'test-encryption-key-not-for-production')
+os.environ.setdefault('DISCOVERY_CACHE_DIR', tempfile.mkdtemp(prefix='dea-tests-discovery-'))
+
+import pytest
+
+
+@pytest.fixture
+def db():
+    """Session on the test database, with every table created and emptied afterwards"""
+    from database.session import SessionLocal, init_db
+    from database.models import Base
+
+    init_db()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        for table in reversed(Base.metadata.sorted_tables):
+            session.execute(table.delete())
+        session.commit()
+        session.close()
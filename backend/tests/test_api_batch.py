@@ -0,0 +1,134 @@
+"""Tests for batched Directory API execution"""
+import httplib2
+from googleapiclient.errors import HttpError
+
+from services.api_batch import BatchRequestExecutor
+from services.api_retry import APIRetryHandler
+
+
+def http_error(status):
+    return HttpError(httplib2.Response({'status': status}), b'{}')
+
+
+class FakeBatch:
+    """BatchHttpRequest stand-in answering each sub-request from a queue of outcomes"""
+
+    def __init__(self, callback, outcomes, sent):
+        self.callback = callback
+        self.outcomes = outcomes
+        self.sent = sent
+        self.request_ids = []
+
+    def add(self, request, request_id):
+        self.request_ids.append(request_id)
+
+    def execute(self):
+        self.sent.append(list(self.request_ids))
+        for request_id in self.request_ids:
+            outcome = self.outcomes[request_id].pop(0)
+            if isinstance(outcome, Exception):
+                self.callback(request_id, None, outcome)
+            else:
+                self.callback(request_id, outcome, None)
+
+
+def run(outcomes, batch_size=2):
+    sent = []
+    executor = BatchRequestExecutor(
+        batch_factory=lambda callback: FakeBatch(callback, outcomes, sent),
+        retry_handler=APIRetryHandler(max_retries=2, base_delay=0),
+        batch_size=batch_size
+    )
+    results = executor.execute([(request_id, lambda: None) for request_id in outcomes])
+    return results, sent
+
+
+def test_requests_are_split_into_batches_and_only_transient_failures_retried():
+    outcomes = {
+        'a': [{'id': 'a'}],
+        'b': [http_error(503), {'id': 'b'}],
+        'c': [http_error(404)],
+        'd': [{'id': 'd'}],
+        'e': [{'id': 'e'}],
+    }
+
+    results, sent = run(outcomes)
+
+    assert sent == [['a', 'b'], ['c', 'd'], ['e'], ['b']]
+    assert results['a'] == {'response': {'id': 'a'}, 'error': None}
+    assert results['b'] == {'response': {'id': 'b'}, 'error': None}
+    assert results['c']['response'] is None
+    assert results['c']['error'].resp.status == 404
+    assert results['e'] == {'response': {'id': 'e'}, 'error': None}
+
+
+def test_transient_failures_give_up_after_max_retries():
+    results, sent = run({'a': [http_error(503)] * 3, 'b': [{'id': 'b'}]})
+
+    assert sent == [['a', 'b'], ['a'], ['a']]
+    assert results['a']['error'].resp.status == 503
+    assert results['b']['error'] is None
+
+
+def test_a_failed_batch_call_fails_every_sub_request_of_that_batch():
+    sent = []
+
+    class FailingBatch(FakeBatch):
+        def execute(self):
+            if 'c' in self.request_ids:
+                raise ValueError("connection reset")
+            super().execute()
+
+    executor = BatchRequestExecutor(
+        batch_factory=lambda callback: FailingBatch(callback, {'a': [{'id': 'a'}], 'b': [{'id': 'b'}]}, sent),
+        retry_handler=APIRetryHandler(max_retries=2, base_delay=0),
+        batch_size=2
+    )
+    results = executor.execute([(request_id, lambda: None) for request_id in 'abcd'])
+
+    assert results['a'] == {'response': {'id': 'a'}, 'error': None}
+    assert results['b'] == {'response': {'id': 'b'}, 'error': None}
+    assert str(results['c']['error']) == "connection reset"
+    assert str(results['d']['error']) == "connection reset"
+
+
+class CountingController:
+    def __init__(self):
+        self.successes = 0
+        self.tokens = 0
+
+    def acquire(self, tokens=1.0):
+        self.tokens += tokens
+        return 0.0
+
+    def on_success(self):
+        self.successes += 1
+
+    def on_throttle(self):
+        pass
+
+
+def test_a_failed_batch_call_is_retried_once_per_attempt_with_one_outcome_per_item():
+    sent = []
+    controller = CountingController()
+    failures = [http_error(503)]
+
+    class FlakyBatch(FakeBatch):
+        def execute(self):
+            if failures:
+                sent.append(list(self.request_ids))
+                raise failures.pop()
+            super().execute()
+
+    executor = BatchRequestExecutor(
+        batch_factory=lambda callback: FlakyBatch(callback, {'a': [{'id': 'a'}], 'b': [{'id': 'b'}], 'c': [{'id': 'c'}]}, sent),
+        retry_handler=APIRetryHandler(max_retries=2, base_delay=0, rate_controller=controller),
+        batch_size=2,
+        rate_controller=controller
+    )
+    results = executor.execute([(request_id, lambda: None) for request_id in 'abc'])
+
+    assert sent == [['a', 'b'], ['c'], ['a', 'b']]  # Only the failed batch's items are re-sent
+    assert all(result['error'] is None for result in results.values())
+    assert controller.successes == 3
+    assert controller.tokens == 5
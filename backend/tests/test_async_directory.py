@@ -0,0 +1,59 @@
+"""Tests for the asyncio Directory client"""
+import asyncio
+import csv
+
+import pytest
+
+import services.async_directory as async_directory
+from services.async_directory import AsyncDirectoryClient
+from services.google_workspace import GoogleWorkspaceService
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(async_directory, 'new_alias_export_path', lambda: str(tmp_path / 'aliases.csv'))
+    service = GoogleWorkspaceService.__new__(GoogleWorkspaceService)
+    service.is_authenticated = lambda: True
+    return AsyncDirectoryClient(service)
+
+
+def test_alias_export_writes_pages_while_the_listing_continues(client, tmp_path):
+    pages_written = []
+    extract = client.google_service.extract_aliases_streaming
+
+    def counting_extract(file_path, progress_callback, user_pages, layout):
+        def counted():
+            for page in user_pages:
+                yield page
+                pages_written.append(page)
+        return extract(file_path, progress_callback, counted(), layout)
+
+    async def user_pages(**kwargs):
+        for page in range(20):
+            yield [{'primaryEmail': f'user{page}@example.com', 'aliases': [f'alias{page}@example.com']},
+                   {'primaryEmail': f'plain{page}@example.com'}]
+            # The writer keeps up: the listing never runs more than the queue depth ahead of it
+            await asyncio.sleep(0.01)
+            assert page + 1 - len(pages_written) <= 4
+
+    client.google_service.extract_aliases_streaming = counting_extract
+    client.iter_user_pages = user_pages
+    result = asyncio.run(client.extract_aliases_to_csv())
+
+    assert (result['total_users'], result['users_with_aliases']) == (40, 20)
+    with open(tmp_path / 'aliases.csv', newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ['Current Email', 'Alias 1']
+    assert rows[1:] == [[f'user{page}@example.com', f'alias{page}@example.com'] for page in range(20)]
+
+
+def test_alias_export_listing_failure_removes_the_partial_output(client, tmp_path):
+    async def user_pages(**kwargs):
+        yield [{'primaryEmail': 'user@example.com', 'aliases': ['alias@example.com']}]
+        raise ValueError("connection reset")
+
+    client.iter_user_pages = user_pages
+    with pytest.raises(ValueError, match="connection reset"):
+        asyncio.run(client.extract_aliases_to_csv())
+
+    assert not list(tmp_path.iterdir())
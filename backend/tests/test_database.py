@@ -0,0 +1,31 @@
+"""Tests for schema upgrades of existing databases"""
+from sqlalchemy import inspect, text
+
+from database.models import BatchJob, CachedUser, JobStatusCount
+from database.session import engine, init_db
+from services.user_cache_service import UserCacheService
+
+
+def test_duplicate_cached_users_are_removed_before_the_unique_index(db):
+    # A database cached before ix_cached_users_job_email existed
+    db.execute(text("DROP INDEX ix_cached_users_job_email"))
+    db.add(BatchJob(job_uuid='job-1', job_type='attribute_injection', status='completed'))
+    db.add_all([
+        CachedUser(job_uuid='job-1', email='a@example.com', ou_path='/', status='success'),
+        CachedUser(job_uuid='job-1', email='a@example.com', ou_path='/', status='pending'),
+        CachedUser(job_uuid='job-1', email='b@example.com', ou_path='/', status='failed'),
+    ])
+    db.add(JobStatusCount(job_uuid='job-1', status='success', count=1))
+    db.add(JobStatusCount(job_uuid='job-1', status='pending', count=1))
+    db.commit()
+
+    init_db()
+
+    assert 'ix_cached_users_job_email' in {index['name'] for index in inspect(engine).get_indexes('cached_users')}
+    rows = db.query(CachedUser.email, CachedUser.status).order_by(CachedUser.email).all()
+    assert rows == [('a@example.com', 'success'), ('b@example.com', 'failed')]
+
+    # Stale counters were dropped so the startup backfill rebuilds them
+    assert db.query(JobStatusCount).count() == 0
+    UserCacheService(db, None).backfill_status_counts()
+    assert UserCacheService(db, None).get_user_count('job-1')['total'] == 2
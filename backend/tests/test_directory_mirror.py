@@ -0,0 +1,63 @@
+"""Tests for the local directory mirror, against an in-memory fake directory"""
+import threading
+
+import pytest
+from sqlalchemy import event
+
+from database.models import DirectoryUser
+from services.directory_mirror import DirectoryMirror
+from services.lease import LeaseLost
+
+
+class FakeDirectory:
+    """Answers the users().list and batched users().get calls the mirror makes"""
+
+    def __init__(self, users):
+        self.users = {user['id']: user for user in users}
+        self.fetched = []
+
+    def iter_user_pages(self, user_fields=None, order_by='email'):
+        users = list(self.users.values())
+        for offset in range(0, len(users), 2):
+            yield [{'id': user['id'], 'etag': user['etag']} if user_fields == DirectoryMirror.ETAG_FIELDS else dict(user)
+                   for user in users[offset:offset + 2]]
+
+    def get_users_batch(self, user_ids, user_fields=None):
+        self.fetched.extend(user_ids)
+        return {user_id: {'response': dict(self.users[user_id]), 'error': None} for user_id in user_ids}
+
+
+def user(user_id, etag='v1', ou='/Sales'):
+    return {'id': user_id, 'etag': etag, 'primaryEmail': f'{user_id}@example.com', 'orgUnitPath': ou}
+
+
+def test_delta_refresh_loads_and_fetches_only_changed_users(db):
+    directory = FakeDirectory([user(f'u{index}') for index in range(6)])
+    mirror = DirectoryMirror(db, directory)
+    assert mirror.full_sync()['added'] == 6
+
+    directory.users['u1'] = user('u1', etag='v2', ou='/Engineering')
+    del directory.users['u2']
+    directory.users['u9'] = user('u9')
+    loaded = []
+    listener = lambda row, context: loaded.append(row.user_id)
+    event.listen(DirectoryUser, 'load', listener)
+    try:
+        db.expunge_all()
+        stats = mirror.refresh()
+    finally:
+        event.remove(DirectoryUser, 'load', listener)
+
+    assert stats == {'added': 1, 'updated': 1, 'removed': 1, 'unchanged': 4}
+    assert directory.fetched == ['u1', 'u9']
+    assert loaded == ['u1']  # Unchanged users are compared by etag without loading their rows
+    assert sorted(user_id for (user_id,) in db.query(DirectoryUser.user_id)) == ['u0', 'u1', 'u3', 'u4', 'u5', 'u9']
+    assert [u['email'] for u in mirror.get_users_in_ou('/Engineering')] == ['u1@example.com']
+
+
+def test_refresh_stops_when_the_lease_is_lost(db):
+    cancel_event = threading.Event()
+    cancel_event.set()
+
+    with pytest.raises(LeaseLost):
+        DirectoryMirror(db, FakeDirectory([user('u0')]), cancel_event=cancel_event).full_sync()
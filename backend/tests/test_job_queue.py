@@ -0,0 +1,110 @@
+"""Tests for the durable job queue and its workers"""
+import threading
+import time
+
+import pytest
+
+import job_tasks
+from database.models import BatchJob, QueuedTask
+from database.session import SessionLocal
+from services.google_workspace import GoogleWorkspaceService
+from services.job_queue import JobQueue, JobWorker
+from services.lease import LeaseLost, check_lease
+
+
+def test_handler_stops_when_the_lease_is_lost(db):
+    queue = JobQueue(db)
+    queue.enqueue('slow', task_key='job-1')
+    steps = []
+
+    def slow(cancel_event=None):
+        for step in range(200):
+            if step == 0:
+                # Another worker re-queued and took over the task
+                db.query(QueuedTask).update({QueuedTask.lease_owner: 'other-worker'})
+                db.commit()
+            check_lease(cancel_event)
+            steps.append(step)
+            time.sleep(0.05)
+
+    worker = JobWorker({'slow': slow}, worker_id='worker-1', lease_seconds=3)
+    task = worker._with_queue(worker._claim)
+    started = time.monotonic()
+    worker._execute(*task)
+
+    assert time.monotonic() - started < 5
+    assert len(steps) < 200
+    db.expire_all()
+    task = db.query(QueuedTask).one()
+    assert (task.status, task.lease_owner) == ('leased', 'other-worker')  # Not settled by the old worker
+
+
+def test_check_lease_outside_the_queue_is_a_no_op():
+    check_lease(None)
+
+
+def test_handler_failure_fails_the_task_and_the_job(db, monkeypatch):
+    monkeypatch.setattr(job_tasks.ServiceManager, 'get_service', classmethod(lambda cls: None))
+    db.add(BatchJob(job_uuid='job-2', job_type='attribute_injection', status='pending', total_users=0))
+    db.commit()
+    JobQueue(db).enqueue('batch_job', {'job_uuid': 'job-2'}, task_key='job-2')
+
+    worker = JobWorker(job_tasks.TASK_HANDLERS, worker_id='worker-1')
+    worker._execute(*worker._with_queue(worker._claim))
+
+    db.expire_all()
+    task = db.query(QueuedTask).one()
+    job = db.query(BatchJob).filter(BatchJob.job_uuid == 'job-2').one()
+    assert task.status == 'failed'
+    assert 'not authenticated' in task.error_message
+    assert job.status == 'failed'
+
+
+def test_concurrent_claims_lease_each_task_once(db):
+    queue = JobQueue(db)
+    for index in range(20):
+        queue.enqueue('noop', task_key=f'job-{index}')
+
+    claimed = []
+
+    def claim_all(worker_id):
+        session = SessionLocal()
+        try:
+            while True:
+                task = JobQueue(session).claim(worker_id)
+                if task is None:
+                    return
+                claimed.append(task.id)
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=claim_all, args=(f'worker-{index}',)) for index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(claimed) == sorted(task_id for (task_id,) in db.query(QueuedTask.id))
+    assert db.query(QueuedTask).filter(QueuedTask.status != 'leased').count() == 0
+
+
+def test_lease_lost_during_alias_extraction_leaves_the_job_to_the_new_owner(db, monkeypatch, tmp_path):
+    cancel_event = threading.Event()
+
+    def user_pages(**kwargs):
+        for page in range(3):
+            yield [{'primaryEmail': f'user{page}-{index}@example.com'} for index in range(100)], f'token-{page}'
+            cancel_event.set()  # Lost while the first page was being written
+
+    service = GoogleWorkspaceService.__new__(GoogleWorkspaceService)
+    service.is_authenticated = lambda: True
+    service.iter_user_pages = user_pages
+    monkeypatch.setattr(job_tasks.ServiceManager, 'get_service', classmethod(lambda cls: service))
+    db.add(BatchJob(job_uuid='job-3', job_type='alias_extraction', status='pending', file_path=str(tmp_path / 'aliases.csv')))
+    db.commit()
+
+    with pytest.raises(LeaseLost):
+        job_tasks.process_alias_extraction_job('job-3', cancel_event=cancel_event)
+
+    db.expire_all()
+    assert db.query(BatchJob.status).filter(BatchJob.job_uuid == 'job-3').scalar() == 'running'
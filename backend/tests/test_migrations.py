@@ -0,0 +1,106 @@
+"""
+Tests for the migration scripts
+
+Each script is run (twice, to check it is idempotent) in a subprocess
+against a database holding the schema from before the migrations: a
+scratch SQLite file by default, a scratch schema on the PostgreSQL server
+when DATABASE_URL is set.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+import pytest
+from sqlalchemy import MetaData, Table, inspect, text
+from sqlalchemy.engine import make_url
+
+from database.models import BatchJob, GroupSyncConfig, GroupSyncOperation
+from database.session import create_database_engine
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Columns the migrations add, and the batch_jobs columns that used to be NOT NULL
+ADDED_COLUMNS = {
+    'batch_jobs': {'group_name_pattern', 'group_description', 'created_groups'},
+    'group_sync_configs': {'is_first_sync', 'last_sync_stats', 'total_syncs', 'imported_from_file', 'import_date'},
+}
+FORMERLY_NOT_NULL = {'ou_paths', 'attribute', 'value', 'file_path'}
+
+MIGRATIONS = [
+    ['migrate_batch_jobs.py'],
+    ['migrate_group_sync.py'],
+    ['database/migrate_smart_sync.py'],
+]
+
+
+@pytest.fixture
+def old_database():
+    """Environment pointing the scripts at a database with the pre-migration schema"""
+    env = dict(os.environ)
+    database_url = env.pop('DATABASE_URL', None)
+
+    if database_url:
+        schema = f"migration_test_{uuid.uuid4().hex[:8]}"
+        admin_engine = create_database_engine(database_url)
+        with admin_engine.begin() as connection:
+            connection.execute(text(f"CREATE SCHEMA {schema}"))
+        env['DATABASE_URL'] = make_url(database_url).update_query_dict(
+            {'options': f"-csearch_path={schema}"}
+        ).render_as_string(hide_password=False)
+        engine = create_database_engine(env['DATABASE_URL'])
+    else:
+        env['DATABASE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='dea-tests-migrations-'), 'old.db')
+        engine = create_database_engine(f"sqlite:///{env['DATABASE_PATH']}")
+
+    old_schema = MetaData()
+    for table in (BatchJob.__table__, GroupSyncConfig.__table__):
+        columns = []
+        for column in table.columns:
+            if column.name in ADDED_COLUMNS[table.name]:
+                continue
+            column = column._copy()
+            if column.name in FORMERLY_NOT_NULL:
+                column.nullable = False
+            columns.append(column)
+        Table(table.name, old_schema, *columns)
+    old_schema.create_all(engine)
+
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO batch_jobs (job_uuid, job_type, status, ou_paths, attribute, value, file_path) "
+            "VALUES ('job-1', 'attribute_injection', 'completed', '[]', 'department', 'Sales', '')"
+        ))
+
+    try:
+        yield env, engine
+    finally:
+        engine.dispose()
+        if database_url:
+            with admin_engine.begin() as connection:
+                connection.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+            admin_engine.dispose()
+
+
+def test_migrations_bring_an_old_schema_up_to_date(old_database):
+    env, engine = old_database
+    assert not any(column['nullable'] for column in inspect(engine).get_columns('batch_jobs') if column['name'] in FORMERLY_NOT_NULL)
+
+    for _ in range(2):
+        for script in MIGRATIONS:
+            result = subprocess.run(
+                [sys.executable, *script], cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+            )
+            assert result.returncode == 0, result.stdout + result.stderr
+
+    inspector = inspect(engine)
+    batch_jobs = {column['name']: column for column in inspector.get_columns('batch_jobs')}
+    assert ADDED_COLUMNS['batch_jobs'] <= set(batch_jobs)
+    assert all(batch_jobs[name]['nullable'] for name in FORMERLY_NOT_NULL)
+    assert ADDED_COLUMNS['group_sync_configs'] <= {column['name'] for column in inspector.get_columns('group_sync_configs')}
+    assert inspector.has_table(GroupSyncOperation.__tablename__)
+
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT job_uuid, value FROM batch_jobs")).all() == [('job-1', 'Sales')]
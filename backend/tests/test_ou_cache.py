@@ -0,0 +1,30 @@
+"""Tests for the OU membership cache"""
+from services.ou_cache import InvalidationFeed, OUMembershipCache
+
+
+def test_callers_cannot_change_cached_listings():
+    cache = OUMembershipCache()
+    fetched = [{'primaryEmail': 'a@example.com'}]
+
+    users = cache.get_or_fetch('/Sales', 'basic', lambda: fetched)
+    users.append({'primaryEmail': 'b@example.com'})
+    fetched.append({'primaryEmail': 'c@example.com'})
+    cache.get('/Sales', 'basic').clear()
+
+    assert cache.get('/Sales', 'basic') == [{'primaryEmail': 'a@example.com'}]
+
+
+def test_invalidations_reach_caches_of_other_processes(db):
+    api_cache = OUMembershipCache(invalidation_feed=InvalidationFeed(poll_seconds=0))
+    worker_cache = OUMembershipCache(invalidation_feed=InvalidationFeed(poll_seconds=0))
+    for cache in (api_cache, worker_cache):
+        cache.put('/Sales/EMEA', 'basic', [{'primaryEmail': 'a@example.com'}])
+        cache.put('/Engineering', 'basic', [{'primaryEmail': 'b@example.com'}])
+        cache.get('/Engineering', 'basic')  # First poll: starts following the feed
+
+    assert api_cache.invalidate('/Sales') == 1
+
+    assert worker_cache.get('/Sales/EMEA', 'basic') is None
+    assert worker_cache.get('/Engineering', 'basic') == [{'primaryEmail': 'b@example.com'}]
+    assert api_cache.get('/Engineering', 'basic') is not None  # Its own invalidation isn't replayed
+    assert (api_cache.invalidations, worker_cache.invalidations) == (1, 1)
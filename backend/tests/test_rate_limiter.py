@@ -0,0 +1,19 @@
+"""Tests for the Directory API rate limiting"""
+import time
+
+from services.rate_limiter import TokenBucket
+
+
+def test_acquire_larger_than_the_burst_is_charged_in_full():
+    bucket = TokenBucket(40)
+
+    started = time.monotonic()
+    waited = bucket.acquire(100)  # 40 from the full bucket, then 60 more at 40/s
+    elapsed = time.monotonic() - started
+
+    assert 1.4 <= waited <= 1.7
+    assert 1.4 <= elapsed <= 1.9
+
+
+def test_acquire_within_the_burst_does_not_wait():
+    assert TokenBucket(40).acquire(40) == 0.0
@@ -0,0 +1,93 @@
+"""Tests for the sharded alias scan, against an in-memory fake directory"""
+import csv
+import time
+import threading
+
+import pytest
+
+from services.sharded_alias_scan import ShardedAliasExtractor
+
+
+class FakeDirectory:
+    """Answers iter_user_pages like users().list, matching email:<prefix>* on primary emails and aliases"""
+
+    def __init__(self, users, fail_query='', page_size=2, page_latency=0.0):
+        self.users = users
+        self.fail_query = fail_query
+        self.page_size = page_size
+        self.page_latency = page_latency
+        self.pages_served = {}
+        self._lock = threading.Lock()
+
+    def is_authenticated(self):
+        return True
+
+    def iter_user_pages(self, user_fields=None, query=None):
+        prefix = query[len('email:'):-1].replace("\\'", "'")
+        matches = [user for user in self.users
+                   if any(email.startswith(prefix) for email in [user['primaryEmail']] + user.get('aliases', []))]
+
+        for offset in range(0, max(len(matches), 1), self.page_size):
+            time.sleep(self.page_latency)
+            if query == self.fail_query:
+                raise Exception("backend error")
+            with self._lock:
+                self.pages_served[query] = self.pages_served.get(query, 0) + 1
+            yield matches[offset:offset + self.page_size]
+
+
+def read_rows(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.reader(f))
+
+
+def test_default_prefixes_cover_every_user_without_a_full_scan(tmp_path):
+    users = [
+        {'id': '1', 'primaryEmail': 'alice@example.com', 'aliases': ['bob.alias@example.com']},  # Matches shards a and b
+        {'id': '2', 'primaryEmail': 'bob@example.com', 'aliases': []},
+        {'id': '3', 'primaryEmail': '_svc@example.com', 'aliases': ['svc@example.com']},
+        {'id': '4', 'primaryEmail': "'ops@example.com", 'aliases': []},
+        {'id': '5', 'primaryEmail': '9lives@example.com', 'aliases': ['cat@example.com', 'kit@example.com']},
+    ]
+    directory = FakeDirectory(users)
+    output = tmp_path / 'aliases.csv'
+
+    result = ShardedAliasExtractor(directory, max_workers=3).extract(str(output))
+
+    assert result['total_users'] == 5
+    assert result['users_with_aliases'] == 3
+    assert None not in directory.pages_served
+    assert sorted(read_rows(output)[1:]) == [
+        ['9lives@example.com', 'cat@example.com', 'kit@example.com'],
+        ['_svc@example.com', 'svc@example.com', ''],
+        ['alice@example.com', 'bob.alias@example.com', ''],
+    ]
+    assert not list(tmp_path.glob('*.partial'))
+
+
+def test_users_outside_narrowed_prefixes_are_written_once_by_id(tmp_path):
+    users = [
+        {'id': '1', 'primaryEmail': '_svc@example.com', 'aliases': ['alpha@example.com', 'beta@example.com']},
+        {'id': '2', 'primaryEmail': 'amy@example.com', 'aliases': []},
+    ]
+    output = tmp_path / 'aliases.csv'
+
+    result = ShardedAliasExtractor(FakeDirectory(users), shard_prefixes='ab', max_workers=2).extract(str(output))
+
+    assert result['total_users'] == 2
+    assert read_rows(output) == [
+        ['Current Email', 'Alias 1', 'Alias 2'],
+        ['_svc@example.com', 'alpha@example.com', 'beta@example.com'],
+    ]
+
+
+def test_shard_failure_stops_the_other_shards(tmp_path):
+    users = [{'primaryEmail': f'a{i}@example.com', 'aliases': []} for i in range(200)]
+    directory = FakeDirectory(users, fail_query='email:b*', page_size=1, page_latency=0.005)
+
+    with pytest.raises(Exception, match="Shard 'b' failed"):
+        ShardedAliasExtractor(directory, shard_prefixes='ab', max_workers=3).extract(str(tmp_path / 'aliases.csv'))
+
+    # The 200-page shards stopped early instead of running to completion
+    assert directory.pages_served.get('email:a*', 0) < 200
+    assert not list(tmp_path.glob('*'))
@@ -0,0 +1,79 @@
+"""Tests for sync-all runs"""
+from database.models import BatchJob
+from database.session import SessionLocal
+from services import sync_scheduler
+from services.sync_scheduler import SyncAllScheduler
+
+
+class FakeGroupSyncProcessor:
+    """Completes every job except 'job-bad', without calling Google"""
+
+    def __init__(self, db, google_service, directory_snapshot=None, cancel_event=None):
+        self.db = db
+
+    def process_job(self, job_uuid):
+        if job_uuid == 'job-bad':
+            raise Exception("group not found")
+        job = self.db.query(BatchJob).filter(BatchJob.job_uuid == job_uuid).one()
+        job.status = 'completed'
+        job.processed_users = job.successful_users = 2
+        self.db.commit()
+
+
+def test_run_state_is_stored_in_the_job_table(db, monkeypatch):
+    monkeypatch.setattr(sync_scheduler, 'GroupSyncProcessor', FakeGroupSyncProcessor)
+    job_uuids = ['job-a', 'job-b', 'job-bad', 'job-done']
+    for job_uuid in job_uuids:
+        db.add(BatchJob(job_uuid=job_uuid, job_type='group_sync',
+                        status='completed' if job_uuid == 'job-done' else 'pending'))
+    db.commit()
+
+    run_id = SyncAllScheduler.new_run(db, job_uuids)
+    SyncAllScheduler(google_service=None, max_workers=2).run(run_id)
+
+    # Read back through a new session, as another process or a restarted API would
+    other = SessionLocal()
+    try:
+        run = SyncAllScheduler.get_run(other, run_id)
+    finally:
+        other.close()
+
+    assert run['status'] == 'completed'
+    assert run['job_uuids'] == job_uuids
+    assert (run['total_configs'], run['completed_configs'], run['failed_configs']) == (4, 3, 1)
+    assert run['total_operations'] == 4
+    assert SyncAllScheduler.get_run(db, 'job-a') is None  # Member jobs are not runs
+
+
+class AuthenticatedService:
+    def is_authenticated(self):
+        return True
+
+
+def test_sync_all_runs_cannot_be_restarted_as_batch_jobs(db, monkeypatch):
+    import main
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(main.ServiceManager, 'get_service', classmethod(lambda cls: AuthenticatedService()))
+    run_id = SyncAllScheduler.new_run(db, ['job-a'])
+    db.query(BatchJob).filter(BatchJob.job_uuid == run_id).update({BatchJob.status: 'failed'})
+    db.commit()
+
+    response = TestClient(main.app).post(f"/api/batch/jobs/{run_id}/restart")
+
+    assert response.status_code == 400
+    assert main.JobQueue(db).get_task_by_key(run_id) is None
+
+
+def test_sync_all_without_jobs_queues_no_run(db, monkeypatch):
+    import main
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(main.ServiceManager, 'get_service', classmethod(lambda cls: AuthenticatedService()))
+    monkeypatch.setattr(main.GroupSyncProcessor, 'get_all_configs', lambda self: [{'config_uuid': 'config-1'}])
+    monkeypatch.setattr(main.GroupSyncProcessor, 'create_sync_job', lambda self, config_uuid: 1 / 0)
+
+    response = TestClient(main.app).post("/api/group-sync/configs/sync-all")
+
+    assert response.json()['run_id'] is None
+    assert db.query(BatchJob).filter(BatchJob.job_type == SyncAllScheduler.JOB_TYPE).count() == 0
@@ -0,0 +1,46 @@
+"""
+Tests for caching users of a job
+
+Run against the test database: SQLite by default, PostgreSQL (COPY path)
+when DATABASE_URL is set.
+"""
+import pytest
+
+from database.bulk import copy_insert_ignoring_conflicts
+from database.models import BatchJob, CachedUser
+from database.session import engine
+from services.user_cache_service import UserCacheService
+
+requires_postgresql = pytest.mark.skipif(engine.dialect.name != 'postgresql', reason="needs DATABASE_URL to a PostgreSQL server")
+
+
+def cached_user_row(email):
+    return {'job_uuid': 'job-1', 'email': email, 'ou_path': '/Sales', 'user_data': '{}', 'status': 'pending'}
+
+
+@pytest.fixture
+def job(db):
+    db.add(BatchJob(job_uuid='job-1', job_type='attribute_injection', status='pending'))
+    db.commit()
+    return 'job-1'
+
+
+def test_insert_skips_users_already_cached_and_counts_only_new_ones(db, job):
+    service = UserCacheService(db, None)
+
+    service._insert_cached_users(job, [cached_user_row('a@example.com'), cached_user_row('b@example.com')])
+    service._insert_cached_users(job, [cached_user_row('b@example.com'), cached_user_row('c@example.com')])
+
+    assert sorted(email for (email,) in db.query(CachedUser.email)) == ['a@example.com', 'b@example.com', 'c@example.com']
+    assert service.get_user_count(job)['pending'] == 3
+
+
+@requires_postgresql
+def test_copy_fills_in_python_side_defaults(db, job):
+    rows = [{'job_uuid': job, 'email': 'a@example.com', 'ou_path': '/Sales'}]  # No status: defaults to 'pending'
+
+    assert copy_insert_ignoring_conflicts(db, CachedUser.__table__, rows, ['job_uuid', 'email']) == 1
+    assert copy_insert_ignoring_conflicts(db, CachedUser.__table__, rows, ['job_uuid', 'email']) == 0
+    db.commit()
+
+    assert db.query(CachedUser.status).one() == ('pending',)
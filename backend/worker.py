@@ -0,0 +1,68 @@
+"""
+Job worker entry point
+Runs queued jobs outside the API process: python -m worker [--processes N]
+
+Set EMBEDDED_JOB_WORKER=false on the API when dedicated workers are running.
+"""
+import os
+import signal
+import argparse
+import multiprocessing
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def run_worker():
+    """Run one worker loop in this process until SIGTERM/SIGINT"""
+    from database.session import init_db
+    from services.discovery import load_discovery_document
+    from services.job_queue import JobWorker
+    from job_tasks import TASK_HANDLERS
+
+    init_db()
+    load_discovery_document()
+
+    worker = JobWorker(TASK_HANDLERS)
+
+    def handle_signal(signum, frame):
+        print(f"[worker] Signal {signum} received, finishing current task...")
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    worker.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run DEA Toolbox job workers")
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=int(os.getenv("JOB_WORKER_PROCESSES", 1)),
+        help="Worker processes to run (default: JOB_WORKER_PROCESSES or 1)"
+    )
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        run_worker()
+        return
+
+    processes = [
+        multiprocessing.Process(target=run_worker, name=f"job-worker-{index}")
+        for index in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    print(f"[worker] Started {len(processes)} worker processes")
+
+    # Children get the same signals from the terminal / container runtime; just wait for them
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: [p.terminate() for p in processes if p.is_alive()])
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,7 @@ Options:
 """
 
 import asyncio
+import json
 import sys
 from pathlib import Path
 from typing import Optional
@@ -21,7 +22,7 @@ import httpx
 from rich.console import RenderableType
 from rich.panel import Panel
 from rich.table import Table
-from textual import on
+from textual import on, work
 from textual.app import App, ComposeResult
 from textual.binding import Binding
 from textual.containers import Container, Horizontal, Vertical, VerticalScroll
@@ -77,6 +78,21 @@ class APIClient:
         response.raise_for_status()
         return response.json()
 
+    async def stream_events(self, endpoint: str):
+        """Yield the data of each Server-Sent Event from an API stream"""
+        url = f"{self.base_url}{endpoint}"
+        # The server sends a keepalive at least every 15s, so a silent connection is a dead one
+        timeout = httpx.Timeout(API_TIMEOUT, read=API_TIMEOUT * 2)
+        async with self.client.stream("GET", url, timeout=timeout) as response:
+            response.raise_for_status()
+            data_lines = []
+            async for line in response.aiter_lines():
+                if line.startswith("data:"):
+                    data_lines.append(line[5:].strip())
+                elif not line and data_lines:
+                    yield json.loads("\n".join(data_lines))
+                    data_lines = []
+
     async def health_check(self) -> bool:
         """Check if backend is reachable"""
         try:
@@ -651,12 +667,17 @@ class BatchMonitorScreen(Screen):
         yield Footer()
 
     async def on_mount(self) -> None:
-        """Initialize table and load jobs"""
+        """Initialize table, load jobs and follow their progress"""
         table = self.query_one("#jobs-table", DataTable)
-        table.add_columns("ID", "Tool", "Status", "Progress", "Created")
+        table.add_column("ID", key="id")
+        table.add_column("Tool", key="tool")
+        table.add_column("Status", key="status")
+        table.add_column("Progress", key="progress")
+        table.add_column("Created", key="created")
         table.cursor_type = "row"
 
         await self.load_jobs()
+        self.follow_progress()
 
     async def load_jobs(self):
         """Load batch jobs from API"""
@@ -668,24 +689,53 @@ class BatchMonitorScreen(Screen):
             table.clear()
 
             result = await self.app.api_client.get("/api/batch/jobs")
+            jobs = result.get("jobs", [])
+
+            for job in jobs:
+                table.add_row(
+                    job["job_uuid"][:8],
+                    job.get("job_type", ""),
+                    job.get("status", ""),
+                    self._format_progress(job),
+                    (job.get("created_at") or "")[:19],
+                    key=job["job_uuid"]
+                )
 
-            if isinstance(result, list):
-                for job in result:
-                    table.add_row(
-                        str(job.get("id", "")),
-                        job.get("tool_name", ""),
-                        job.get("status", ""),
-                        f"{job.get('progress_percentage', 0):.1f}%",
-                        job.get("created_at", "")[:19]
-                    )
-
-                status.update(f"✅ Loaded {len(result)} jobs")
-            else:
-                status.update("❌ Failed to load jobs")
+            status.update(f"✅ Loaded {len(jobs)} jobs")
 
         except Exception as e:
             status.update(f"❌ Error: {str(e)}")
 
+    @staticmethod
+    def _format_progress(job: dict) -> str:
+        progress = f"{job.get('progress_percentage') or 0:.1f}%"
+        if job.get("total_users"):
+            progress += f" ({job.get('processed_users') or 0}/{job['total_users']})"
+        return progress
+
+    @work(exclusive=True, group="progress")
+    async def follow_progress(self):
+        """Update job rows in place from the backend progress stream, reconnecting if it drops"""
+        status = self.query_one("#status", Label)
+        table = self.query_one("#jobs-table", DataTable)
+
+        while True:
+            try:
+                async for event in self.app.api_client.stream_events("/api/batch/events"):
+                    job_uuid = event["job_uuid"]
+                    if job_uuid in table.rows:
+                        table.update_cell(job_uuid, "status", event.get("status", ""))
+                        table.update_cell(job_uuid, "progress", self._format_progress(event))
+                    else:
+                        # Started after the list was loaded; the full row comes with the next refresh
+                        table.add_row(
+                            job_uuid[:8], "", event.get("status", ""), self._format_progress(event), "",
+                            key=job_uuid
+                        )
+            except Exception as e:
+                status.update(f"⚠️ Progress stream lost ({str(e)}), reconnecting...")
+            await asyncio.sleep(5)
+
     @on(Button.Pressed, "#refresh-btn")
     async def refresh_jobs(self):
         """Refresh jobs list"""